@@ -1,128 +1,265 @@
-import os
-import re
-import csv
-import pytesseract
-import fitz  # PyMuPDF
-from PIL import Image
-import tempfile
-import subprocess
-from docx import Document
-
-pytesseract.pytesseract.tesseract_cmd = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
-
-pdf_folder = r"D:\Ussicamm\AI\pdfs"
-output_folder = r"D:\Ussicamm\AI\results_word"
-os.makedirs(output_folder, exist_ok=True)
-
-MAX_CHARS = 2000
-RESPONSES_CSV = r"D:\Ussicamm\AI\responses.csv"
-
-def clean_text(text):
-    text = re.sub(r'\s+', ' ', text)
-    text = re.sub(r'[^\x00-\x7F\u00C0-\u017F]+', ' ', text)
-    return text.strip()
-
-def extract_text_from_pdf(pdf_path):
-    text = ""
-    pdf_doc = fitz.open(pdf_path)
-
-    for page_num in range(len(pdf_doc)):
-        page = pdf_doc.load_page(page_num)
-
-        page_text = page.get_text()
-        if page_text.strip():
-            text += page_text + "\n"
-        else:
-            pix = page.get_pixmap()
-            with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as tmp_img:
-                tmp_img.write(pix.tobytes())
-                tmp_img_path = tmp_img.name
-            ocr_text = pytesseract.image_to_string(Image.open(tmp_img_path), lang="spa")
-            text += ocr_text + "\n"
-            os.remove(tmp_img_path)
-
-    pdf_doc.close()
-    return clean_text(text)
-
-def split_into_blocks(text, max_chars=MAX_CHARS):
-    return [text[i:i+max_chars] for i in range(0, len(text), max_chars)]
-
-def query_ollama(prompt, model="deepseek-llm:7b"):
-    process = subprocess.Popen(
-        ["ollama", "run", model],
-        stdin=subprocess.PIPE,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.DEVNULL
-    )
-    output_bytes, _ = process.communicate(input=prompt.encode('utf-8'))
-    output = output_bytes.decode('utf-8', errors='ignore')
-    return output.strip()
-
-def save_results_to_word(pdf_name, analysis_results):
-    doc = Document()
-    doc.add_heading(f"Requisitos extraídos de la convocatoria: {pdf_name}", level=1)
-    doc.add_paragraph(analysis_results)
-    output_path = os.path.join(output_folder, pdf_name.replace(".pdf", ".docx"))
-    doc.save(output_path)
-    print(f"✅ Resultado guardado en: {output_path}")
-
-def save_response_csv(question, answer):
-    try:
-        exists = os.path.exists(RESPONSES_CSV)
-        with open(RESPONSES_CSV, "a", newline="", encoding="utf-8") as f:
-            writer = csv.writer(f)
-            if not exists:
-                writer.writerow(["question", "answer"])
-            writer.writerow([question, answer])
-        print(f"✔ Guardado Q: {question[:30]}...")
-    except Exception as e:
-        print(f"❌ Error guardando CSV: {e}")
-
-def parse_faq_response(text):
-    if "||" in text:
-        parts = text.split("||", 1)
-        return parts[0].strip(), parts[1].strip()
-    lines = [l.strip() for l in text.split("\n") if l.strip()]
-    if len(lines) >= 2:
-        return lines[0], " ".join(lines[1:])
-    return None, None
-
-def main():
-    for pdf_file in os.listdir(pdf_folder):
-        if not pdf_file.lower().endswith(".pdf"):
-            continue
-        pdf_path = os.path.join(pdf_folder, pdf_file)
-        print(f"\n📄 Procesando {pdf_file}...")
-        text = extract_text_from_pdf(pdf_path)
-        blocks = split_into_blocks(text)
-
-        full_analysis = ""
-        for block in blocks:
-            prompt = (
-                "Extrae únicamente los requisitos de la convocatoria en el siguiente texto. "
-                "No agregues encabezados, numeraciones, ni menciones a bloques. "
-                "Devuélvelo en un listado limpio y claro:\n\n"
-                + block
-            )
-            result = query_ollama(prompt)
-            full_analysis += result + "\n\n"
-
-            faq_prompt = (
-                "Genera una pregunta frecuente relacionada a los requisitos que aparecen en este texto, "
-                "y la respuesta clara y breve a esa pregunta. "
-                "Devuelve solo la pregunta y respuesta separadas por '||':\n\n"
-                + block
-            )
-            faq_result = query_ollama(faq_prompt)
-            print(f"📋 FAQ generado: {faq_result}")
-
-            q, a = parse_faq_response(faq_result)
-            if q and a:
-                save_response_csv(q, a)
-            else:
-                print("⚠ No se pudo extraer pregunta y respuesta del texto del LLM.")
-
-        save_results_to_word(pdf_file, full_analysis)
-
-if __name__ == "__main__":
-    main()
+import os
+import re
+import csv
+import json
+import threading
+import pytesseract
+import requests
+from answer_cache import AnswerCache, topics_for
+from chunker import CHUNKER_VERSION, chunk_pages, estimate_tokens
+from doc_batch import Batch, BlocksFailed, batch_parser
+from doc_pipeline import DocxStreamWriter, map_ordered, staged
+from faq_db import FAQDatabase
+from faq_store import load_responses, normalize_question
+from ollama_client import OllamaClient, OllamaError
+from pdf_extract import OCR_SIGNATURE, count_pages, iter_pages
+from pipeline_cache import digest, file_digest
+
+pytesseract.pytesseract.tesseract_cmd = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
+
+# Carpetas por omisión (se cambian con --input y --output)
+pdf_folder = r"D:\Ussicamm\AI\pdfs"
+output_folder = r"D:\Ussicamm\AI\results_word"
+
+# Documentos en proceso al mismo tiempo y procesos para extraer y hacer OCR,
+# compartidos por todos los documentos
+DOCUMENT_WORKERS = 2
+EXTRACT_WORKERS = os.cpu_count() or 1
+
+# Tamaño de cada bloque en tokens del modelo y cuánto se repite del bloque
+# anterior. deepseek-llm:7b tiene 4096 tokens de contexto: el bloque, el
+# prompt y la respuesta deben caber juntos
+CHUNK_TOKENS = 1500
+CHUNK_OVERLAP_TOKENS = 0
+MODEL_CONTEXT = 4096
+
+MODEL = "deepseek-llm:7b"
+OLLAMA_URL = "http://localhost:11434"
+# Solicitudes simultáneas al modelo (ajustar junto con OLLAMA_NUM_PARALLEL)
+OLLAMA_CONCURRENCY = 2
+OLLAMA_TIMEOUT = (5, 600)
+ollama = OllamaClient(OLLAMA_URL, model=MODEL, timeout=OLLAMA_TIMEOUT, pool_size=OLLAMA_CONCURRENCY)
+# Bloques pendientes por documento por cada consulta simultánea
+BLOCKS_PER_LLM_WORKER = 2
+
+# Una sola consulta por bloque: el modelo responde en JSON (format="json")
+# con los requisitos y FAQS_PER_BLOCK preguntas frecuentes
+FAQS_PER_BLOCK = 3
+ANALYSIS_PROMPT = (
+    "Del siguiente texto de una convocatoria, extrae únicamente los requisitos, sin encabezados, "
+    "numeraciones ni menciones a bloques, y genera hasta {faqs} preguntas frecuentes distintas "
+    "sobre esos requisitos, cada una con una respuesta clara y breve. "
+    'Responde solo con un objeto JSON de la forma {{"requisitos": ["..."], '
+    '"faq": [{{"pregunta": "...", "respuesta": "..."}}]}}:\n\n'
+)
+# Límites para aceptar una pregunta generada
+FAQ_MIN_QUESTION_WORDS = 2
+FAQ_MAX_QUESTION_CHARS = 300
+FAQ_MAX_ANSWER_CHARS = 2000
+RESPONSES_CSV = r"D:\Ussicamm\AI\responses.csv"
+# "sqlite" escribe en la misma base que usa el chat; "csv" en RESPONSES_CSV
+FAQ_BACKEND = "sqlite"
+FAQ_DB = r"D:\Ussicamm\AI\faq.db"
+
+# Se abre en main()
+faq_db = None
+
+def open_faq_db():
+    database = FAQDatabase(FAQ_DB)
+    if len(database) == 0 and os.path.exists(RESPONSES_CSV):
+        database.import_csv(RESPONSES_CSV)
+    return database
+
+# Respuestas que el chat generó con el modelo (las de app.py): al procesar
+# una convocatoria se borran las de sus temas, porque pueden haber quedado
+# desactualizadas. Se abre en main()
+ANSWER_CACHE_DB = FAQ_DB
+answer_cache = None
+
+def clean_text(text):
+    text = re.sub(r'\s+', ' ', text)
+    text = re.sub(r'[^\x00-\x7F\u00C0-\u017F]+', ' ', text)
+    return text.strip()
+
+def extract_pages_from_pdf(batch, pdf_path):
+    # Genera el texto página por página; el bloque se arma sin juntar antes
+    # todo el documento. Cada página se clasifica antes: las páginas en
+    # blanco se saltan y en las mixtas solo se pasa por OCR lo escaneado
+    return iter_pages(pdf_path, workers=batch.args.ocr_workers, pool=batch.ocr_pool)
+
+def split_into_blocks(pages):
+    # Bloques que respetan títulos, listas y párrafos del PDF
+    return chunk_pages(pages, CHUNK_TOKENS, CHUNK_OVERLAP_TOKENS, clean=clean_text)
+
+def query_ollama(prompt, model=MODEL, format=None):
+    # None si el modelo falló o no respondió nada
+    try:
+        return ollama.generate(prompt, model, options={"num_ctx": MODEL_CONTEXT}, format=format).strip() or None
+    except (OllamaError, requests.RequestException) as e:
+        print(f"❌ Error al consultar Ollama: {e}")
+        return None
+
+def word_path(pdf_name):
+    return os.path.join(output_folder, pdf_name.replace(".pdf", ".docx"))
+
+def save_results_to_word(pdf_name, analysis_results):
+    # Cada resultado se escribe en cuanto llega, en el orden del documento
+    output_path = word_path(pdf_name)
+    with DocxStreamWriter(output_path, f"Requisitos extraídos de la convocatoria: {pdf_name}") as writer:
+        for result in analysis_results:
+            writer.add_paragraph(result)
+    print(f"✅ Resultado guardado en: {output_path}")
+
+# Varios documentos guardan preguntas al mismo tiempo
+csv_lock = threading.Lock()
+
+def save_faqs_csv(pairs):
+    # Se omiten las preguntas que ya están en el CSV (misma pregunta
+    # normalizada) y las nuevas se escriben de una vez
+    with csv_lock:
+        existing = {normalize_question(q) for q, _ in load_responses(RESPONSES_CSV)}
+        new = [(q, a) for q, a in pairs if normalize_question(q) not in existing]
+        with open(RESPONSES_CSV, "a", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            if f.tell() == 0:
+                writer.writerow(["question", "answer"])
+            writer.writerows(new)
+    return len(new)
+
+def save_faqs(pairs):
+    if not pairs:
+        return
+    try:
+        if FAQ_BACKEND == "sqlite":
+            # Una sola transacción; las preguntas repetidas no se insertan
+            inserted = faq_db.add_many(pairs)
+        else:
+            inserted = save_faqs_csv(pairs)
+        print(f"✔ {inserted} pregunta(s) frecuente(s) nuevas, {len(pairs) - inserted} ya existían")
+    except Exception as e:
+        print(f"❌ Error guardando preguntas frecuentes: {e}")
+
+def _text(value):
+    return value.strip() if isinstance(value, str) else ""
+
+def valid_faq(question, answer):
+    words = normalize_question(question).split()
+    return (
+        len(words) >= FAQ_MIN_QUESTION_WORDS and len(question) <= FAQ_MAX_QUESTION_CHARS
+        and 0 < len(answer) <= FAQ_MAX_ANSWER_CHARS
+    )
+
+def parse_analysis(text):
+    # Devuelve (requisitos en texto, [(pregunta, respuesta)]); lo que no
+    # tenga la forma esperada se descarta
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return "", []
+    if not isinstance(data, dict):
+        return "", []
+    requirements = data.get("requisitos")
+    if isinstance(requirements, str):
+        requirements = requirements.splitlines()
+    if not isinstance(requirements, list):
+        requirements = []
+    items = data.get("faq")
+    if not isinstance(items, list):
+        items = []
+
+    pairs = []
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        question, answer = _text(item.get("pregunta")), _text(item.get("respuesta"))
+        if valid_faq(question, answer):
+            pairs.append((question, answer))
+    result = "\n".join(f"- {r}" for r in map(_text, requirements) if r)
+    return result, pairs[:FAQS_PER_BLOCK]
+
+def analyze_block(block):
+    prompt = ANALYSIS_PROMPT.format(faqs=FAQS_PER_BLOCK) + block
+    response = query_ollama(prompt, format="json")
+    if response is None:
+        return None, [], estimate_tokens(prompt)
+    result, pairs = parse_analysis(response)
+    return result, pairs, estimate_tokens(prompt) + estimate_tokens(response)
+
+def requirements_and_faqs(results, counts, topics, faqs):
+    # Las preguntas se juntan por documento (sin repetir la misma pregunta
+    # normalizada) y se guardan al final, todas juntas
+    for result, pairs, tokens in results:
+        counts["blocks"] += 1
+        counts["tokens"] += tokens
+        if result is None:
+            counts["failed"] += 1
+            print("❌ Un bloque se quedó sin respuesta del modelo.")
+            continue
+        topics.update(topics_for(result))
+        if not result and not pairs:
+            print("⚠ La respuesta del modelo no trajo requisitos ni preguntas válidas.")
+        for question, answer in pairs:
+            print(f"📋 FAQ generado: {question}")
+            faqs.setdefault(normalize_question(question), (question, answer))
+        yield result
+
+def document_key(pdf_path):
+    return digest(
+        file_digest(pdf_path), OCR_SIGNATURE, CHUNKER_VERSION, CHUNK_TOKENS, CHUNK_OVERLAP_TOKENS,
+        MODEL, ANALYSIS_PROMPT, FAQS_PER_BLOCK,
+    )
+
+def invalidate_answers(pdf_file, topics):
+    # Sin un tema reconocido no se borra nada: borrar todas las respuestas
+    # por cada convocatoria sin tema dejaría la caché siempre vacía
+    if not topics:
+        print(f"ℹ {pdf_file} no corresponde a ningún tema conocido; las respuestas del chat se conservan.")
+        return 0
+    removed = answer_cache.invalidate(sorted(topics))
+    if removed:
+        print(f"🧹 {removed} respuesta(s) del chat borradas por {pdf_file} ({', '.join(sorted(topics))})")
+    return removed
+
+def process_document(batch, pdf_path):
+    pdf_file = os.path.basename(pdf_path)
+    counts = {"pages": count_pages(pdf_path), "blocks": 0, "tokens": 0, "failed": 0}
+    print(f"\n📄 Procesando {pdf_file}...")
+    pages = staged(extract_pages_from_pdf(batch, pdf_path), "extract")
+    blocks = staged(split_into_blocks(pages), "chunk", inner=pages)
+
+    # Varios bloques van al modelo a la vez y los resultados se escriben en
+    # el orden del documento conforme llegan; con todos los lugares
+    # ocupados no se leen más páginas
+    results = staged(map_ordered(
+        batch.llm_pool, analyze_block, blocks,
+        batch.args.llm_workers * BLOCKS_PER_LLM_WORKER, check=batch.check,
+    ), "generate", inner=blocks)
+    topics = set(topics_for(os.path.splitext(pdf_file)[0].replace("_", " ")))
+    faqs = {}
+    save_results_to_word(pdf_file, requirements_and_faqs(results, counts, topics, faqs))
+    save_faqs(list(faqs.values()))
+    invalidate_answers(pdf_file, topics)
+    failed = counts.pop("failed")
+    if failed:
+        raise BlocksFailed(failed, counts["blocks"])
+    return counts
+
+def main(argv=None):
+    global pdf_folder, output_folder, ollama, faq_db, answer_cache
+    args = batch_parser(
+        "Extrae requisitos y preguntas frecuentes de las convocatorias en PDF",
+        pdf_folder, output_folder, DOCUMENT_WORKERS, EXTRACT_WORKERS, OLLAMA_CONCURRENCY,
+    ).parse_args(argv)
+    pdf_folder, output_folder = args.input, args.output
+    if args.llm_workers != OLLAMA_CONCURRENCY:
+        # Una conexión al servidor por consulta simultánea
+        ollama = OllamaClient(OLLAMA_URL, model=MODEL, timeout=OLLAMA_TIMEOUT, pool_size=args.llm_workers)
+    if FAQ_BACKEND == "sqlite":
+        faq_db = open_faq_db()
+    answer_cache = AnswerCache(ANSWER_CACHE_DB)
+
+    with Batch(args) as batch:
+        batch.run(process_document, document_key, lambda pdf_file: os.path.exists(word_path(pdf_file)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+import os
+import threading
+import time
+import metrics
+import sqlite_util
+
+ADMISSIONS = metrics.counter("llm_admissions_total", "Solicitudes que necesitaban el modelo, por resultado")
+QUEUE_SECONDS = metrics.histogram("llm_queue_seconds", "Espera en la cola por un lugar en el modelo")
+
+class RateLimiter:
+    # Cubeta de fichas por cliente: `rate` fichas por segundo hasta `burst`.
+    # Solo se guardan los clientes recientes; una cubeta que ya se llenó de
+    # nuevo es igual a una nueva y se puede descartar.
+    def __init__(self, rate, burst, max_clients=10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def allow(self, key):
+        # Devuelve 0 si se admite o los segundos que faltan para la
+        # siguiente ficha
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                if len(self._buckets) > self.max_clients:
+                    self._prune(now)
+                return 0.0
+            self._buckets[key] = (tokens, now)
+            return (1 - tokens) / self.rate
+
+    def _prune(self, now):
+        full = self.burst / self.rate
+        for key, (tokens, last) in list(self._buckets.items()):
+            if now - last >= full:
+                del self._buckets[key]
+
+class RateLimited(Exception):
+    def __init__(self, retry_after):
+        super().__init__(retry_after)
+        self.retry_after = retry_after
+
+class Busy(Exception):
+    pass
+
+class AdmissionGate:
+    # Límite de generaciones simultáneas con una cola de espera acotada:
+    # con `limit` en curso, hasta `max_waiting` solicitudes esperan a lo más
+    # `timeout` segundos y las demás se rechazan de inmediato (Busy).
+    def __init__(self, limit, max_waiting, timeout):
+        self.limit = limit
+        self.max_waiting = max_waiting
+        self.timeout = timeout
+        self._running = 0
+        self._waiting = 0
+        self._cond = threading.Condition()
+
+    @property
+    def running(self):
+        return self._running
+
+    def acquire(self):
+        # Devuelve el lugar que hay que pasar a release()
+        start = time.monotonic()
+        with self._cond:
+            if self._running < self.limit and not self._waiting:
+                self._running += 1
+                ADMISSIONS.inc(result="admitted")
+                return None
+            if self._waiting >= self.max_waiting:
+                ADMISSIONS.inc(result="busy")
+                raise Busy()
+            self._waiting += 1
+            try:
+                admitted = self._cond.wait_for(lambda: self._running < self.limit, self.timeout)
+                if admitted:
+                    self._running += 1
+            finally:
+                self._waiting -= 1
+        QUEUE_SECONDS.observe(time.monotonic() - start)
+        ADMISSIONS.inc(result="queued" if admitted else "timeout")
+        if not admitted:
+            raise Busy()
+        return None
+
+    def release(self, slot=None):
+        with self._cond:
+            self._running -= 1
+            self._cond.notify()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS llm_slots (
+    id INTEGER PRIMARY KEY,
+    pid INTEGER NOT NULL,
+    running INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS rate_buckets (
+    key TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    last REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS rate_buckets_last ON rate_buckets(last);
+"""
+
+def pid_alive(pid):
+    # Solo POSIX (gunicorn): en Windows os.kill terminaría el proceso
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+class _Shared:
+    def __init__(self, path, timeout=30.0):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        self._conn().executescript(SCHEMA)
+
+    def _conn(self):
+        return sqlite_util.connection(self._local, self.path, self.timeout)
+
+class SharedAdmissionGate(_Shared):
+    # Igual que AdmissionGate, pero los lugares y la cola se cuentan en una
+    # base SQLite compartida por todos los workers de gunicorn: el límite es
+    # del servidor completo y no de cada proceso. Quien espera revisa su
+    # turno cada `poll` segundos, en orden de llegada. Los lugares de un
+    # worker que murió se liberan en cuanto otro proceso pide uno.
+    def __init__(self, path, limit, max_waiting, timeout, poll=0.05):
+        super().__init__(path)
+        self.limit = limit
+        self.max_waiting = max_waiting
+        self.timeout = timeout
+        self.poll = poll
+
+    @property
+    def running(self):
+        return self._conn().execute("SELECT count(*) FROM llm_slots WHERE running = 1").fetchone()[0]
+
+    def _reap(self, conn):
+        pids = [pid for (pid,) in conn.execute("SELECT DISTINCT pid FROM llm_slots")]
+        for pid in pids:
+            if pid != os.getpid() and not pid_alive(pid):
+                conn.execute("DELETE FROM llm_slots WHERE pid = ?", (pid,))
+
+    def acquire(self):
+        start = time.monotonic()
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            self._reap(conn)
+            running, waiting = conn.execute(
+                "SELECT coalesce(sum(running), 0), count(*) - coalesce(sum(running), 0) FROM llm_slots"
+            ).fetchone()
+            if running < self.limit and not waiting:
+                ADMISSIONS.inc(result="admitted")
+                return conn.execute(
+                    "INSERT INTO llm_slots (pid, running) VALUES (?, 1)", (os.getpid(),)
+                ).lastrowid
+            if waiting >= self.max_waiting:
+                ADMISSIONS.inc(result="busy")
+                raise Busy()
+            slot = conn.execute(
+                "INSERT INTO llm_slots (pid, running) VALUES (?, 0)", (os.getpid(),)
+            ).lastrowid
+        admitted = False
+        try:
+            while not admitted:
+                if time.monotonic() - start >= self.timeout:
+                    break
+                time.sleep(self.poll)
+                admitted = self._take_turn(conn, slot)
+        finally:
+            if not admitted:
+                self.release(slot)
+        QUEUE_SECONDS.observe(time.monotonic() - start)
+        ADMISSIONS.inc(result="queued" if admitted else "timeout")
+        if not admitted:
+            raise Busy()
+        return slot
+
+    def _take_turn(self, conn, slot):
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            self._reap(conn)
+            first = conn.execute("SELECT min(id) FROM llm_slots WHERE running = 0").fetchone()[0]
+            running = conn.execute("SELECT count(*) FROM llm_slots WHERE running = 1").fetchone()[0]
+            if first != slot or running >= self.limit:
+                return False
+            conn.execute("UPDATE llm_slots SET running = 1 WHERE id = ?", (slot,))
+            return True
+
+    def release(self, slot=None):
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM llm_slots WHERE id = ?", (slot,))
+
+    def reset(self):
+        # Al arrancar el servidor no hay generaciones en curso
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM llm_slots")
+
+class SharedRateLimiter(_Shared):
+    # Igual que RateLimiter, con las cubetas en la base compartida para que
+    # un cliente tenga el mismo límite sin importar qué worker lo atienda
+    def __init__(self, path, rate, burst, max_clients=10000):
+        super().__init__(path)
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+
+    def allow(self, key):
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT tokens, last FROM rate_buckets WHERE key = ?", (key,)).fetchone()
+            tokens, last = row if row else (self.burst, now)
+            tokens = min(self.burst, tokens + max(0.0, now - last) * self.rate)
+            retry_after = 0.0 if tokens >= 1 else (1 - tokens) / self.rate
+            if not retry_after:
+                tokens -= 1
+            conn.execute(
+                "INSERT INTO rate_buckets (key, tokens, last) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, last = excluded.last",
+                (key, tokens, now),
+            )
+            if row is None:
+                self._prune(conn, now)
+            return retry_after
+
+    def _prune(self, conn, now):
+        # Una cubeta que ya se llenó de nuevo es igual a una nueva
+        if conn.execute("SELECT count(*) FROM rate_buckets").fetchone()[0] > self.max_clients:
+            conn.execute("DELETE FROM rate_buckets WHERE last <= ?", (now - self.burst / self.rate,))
@@ -0,0 +1,195 @@
+import argparse
+import sqlite3
+import threading
+import time
+import sqlite_util
+from faq_db import FAQ_DB, fts_search, renormalize
+from faq_store import WORD_RE, normalize_question
+from prohibited_filter import fold_text
+
+# Respuestas generadas por el modelo en el chat. Viven aparte de las
+# preguntas frecuentes curadas (las de Doc.py y responses.csv): caducan a
+# los ANSWER_TTL segundos, no pasan de ANSWER_MAX_ENTRIES (se descartan las
+# menos usadas) y se pueden borrar por tema cuando llega una convocatoria
+# nueva. Así la búsqueda nunca recorre más de ANSWER_MAX_ENTRIES preguntas.
+ANSWER_TTL = 7 * 24 * 3600
+ANSWER_MAX_ENTRIES = 5000
+# El último uso de una respuesta se actualiza a lo más una vez por este
+# intervalo, para que los aciertos no escriban en la base cada vez. Si la
+# base está ocupada (p. ej. Doc.py borrando temas) se espera a lo más
+# TOUCH_TIMEOUT segundos y, si no, se deja para el siguiente acierto
+TOUCH_INTERVAL = 60.0
+TOUCH_TIMEOUT = 0.05
+
+# Temas -> palabras o frases (sin acentos) que los identifican en una
+# pregunta o en el texto de una convocatoria
+TOPICS = {
+    "admision": ("admision", "nuevo ingreso", "ingreso al servicio"),
+    "promocion_vertical": ("promocion vertical", "director", "subdirector", "supervisor", "jefe de sector"),
+    "promocion_horizontal": ("promocion horizontal", "niveles de incentivo"),
+    "horas_adicionales": ("horas adicionales",),
+    "reconocimiento": ("reconocimiento",),
+    "tutoria": ("tutoria", "tutor"),
+    "asesoria": ("asesor tecnico", "asesoria"),
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS answers (
+    id INTEGER PRIMARY KEY,
+    question TEXT NOT NULL,
+    norm_question TEXT NOT NULL UNIQUE,
+    answer TEXT NOT NULL,
+    topics TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    expires_at REAL NOT NULL,
+    used_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS answers_expires ON answers(expires_at);
+CREATE INDEX IF NOT EXISTS answers_used ON answers(used_at);
+CREATE VIRTUAL TABLE IF NOT EXISTS answers_fts USING fts5(
+    question, content='answers', content_rowid='id',
+    tokenize="unicode61 remove_diacritics 0"
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS answers_vocab USING fts5vocab(answers_fts, 'row');
+CREATE TRIGGER IF NOT EXISTS answers_ai AFTER INSERT ON answers BEGIN
+    INSERT INTO answers_fts(rowid, question) VALUES (new.id, new.question);
+END;
+CREATE TRIGGER IF NOT EXISTS answers_ad AFTER DELETE ON answers BEGIN
+    INSERT INTO answers_fts(answers_fts, rowid, question) VALUES ('delete', old.id, old.question);
+END;
+CREATE TRIGGER IF NOT EXISTS answers_au AFTER UPDATE OF question ON answers BEGIN
+    INSERT INTO answers_fts(answers_fts, rowid, question) VALUES ('delete', old.id, old.question);
+    INSERT INTO answers_fts(rowid, question) VALUES (new.id, new.question);
+END;
+"""
+
+def topics_for(text, topics=TOPICS):
+    words = " " + " ".join(WORD_RE.findall(fold_text(text, fold_accents=True))) + " "
+    return sorted(name for name, keys in topics.items() if any(f" {key} " in words for key in keys))
+
+def is_cacheable(answer):
+    # Una respuesta vacía o un mensaje de error nunca se guarda
+    text = (answer or "").strip()
+    return bool(text) and not text.startswith("Error:")
+
+class AnswerCache:
+    def __init__(self, path=FAQ_DB, ttl=ANSWER_TTL, max_entries=ANSWER_MAX_ENTRIES,
+                 topics=TOPICS, timeout=30.0):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.topics = topics
+        self.timeout = timeout
+        self._local = threading.local()
+        conn = self._conn()
+        conn.executescript(SCHEMA)
+        renormalize(conn, "answers")
+
+    def _conn(self):
+        return sqlite_util.connection(self._local, self.path, self.timeout)
+
+    def __len__(self):
+        return self._conn().execute(
+            "SELECT count(*) FROM answers WHERE expires_at > ?", (time.time(),)
+        ).fetchone()[0]
+
+    def find_similar(self, question, threshold):
+        conn = self._conn()
+        now = time.time()
+        match = fts_search(conn, "answers", question, threshold, " AND answers.expires_at > ?", (now,))
+        if match is None:
+            return None
+        row = match[0]
+        used = conn.execute("SELECT used_at FROM answers WHERE id = ?", (row[0],)).fetchone()
+        if used is not None and used[0] < now - TOUCH_INTERVAL:
+            self._touch(conn, row[0], now)
+        return row[2]
+
+    def _touch(self, conn, row_id, now):
+        conn.execute(f"PRAGMA busy_timeout = {int(TOUCH_TIMEOUT * 1000)}")
+        try:
+            conn.execute("UPDATE answers SET used_at = ? WHERE id = ?", (now, row_id))
+        except sqlite3.OperationalError:
+            pass
+        finally:
+            conn.execute(f"PRAGMA busy_timeout = {int(self.timeout * 1000)}")
+
+    def add(self, question, answer):
+        if not is_cacheable(answer):
+            return False
+        conn = self._conn()
+        now = time.time()
+        topics = "," + ",".join(topics_for(question, self.topics)) + ","
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "INSERT INTO answers (question, norm_question, answer, topics, created_at, expires_at, used_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT(norm_question) DO UPDATE SET "
+                "question = excluded.question, answer = excluded.answer, topics = excluded.topics, "
+                "created_at = excluded.created_at, expires_at = excluded.expires_at, used_at = excluded.used_at",
+                (question, normalize_question(question), answer, topics, now, now + self.ttl, now),
+            )
+            self._evict(conn, now)
+        return True
+
+    def _evict(self, conn, now):
+        conn.execute("DELETE FROM answers WHERE expires_at <= ?", (now,))
+        extra = conn.execute("SELECT count(*) FROM answers").fetchone()[0] - self.max_entries
+        if extra > 0:
+            conn.execute(
+                "DELETE FROM answers WHERE id IN (SELECT id FROM answers ORDER BY used_at, id LIMIT ?)",
+                (extra,),
+            )
+
+    def invalidate(self, topics=None):
+        # Sin temas se borran todas las respuestas generadas
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            if topics is None:
+                return conn.execute("DELETE FROM answers").rowcount
+            removed = 0
+            for topic in topics:
+                removed += conn.execute(
+                    "DELETE FROM answers WHERE topics LIKE ?", (f"%,{topic},%",)
+                ).rowcount
+            return removed
+
+    def purge(self):
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            return conn.execute("DELETE FROM answers WHERE expires_at <= ?", (time.time(),)).rowcount
+
+    def stats(self):
+        by_topic = {}
+        rows = self._conn().execute("SELECT topics FROM answers WHERE expires_at > ?", (time.time(),))
+        for (topics,) in rows:
+            for topic in [t for t in topics.split(",") if t] or ["(sin tema)"]:
+                by_topic[topic] = by_topic.get(topic, 0) + 1
+        return by_topic
+
+def main():
+    parser = argparse.ArgumentParser(description="Respuestas generadas por el modelo guardadas para el chat")
+    parser.add_argument("--db", default=FAQ_DB)
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("stats", help="Muestra cuántas respuestas hay por tema")
+    invalidate = sub.add_parser("invalidate", help="Borra las respuestas de los temas indicados")
+    invalidate.add_argument("topics", nargs="*", help=f"Temas ({', '.join(TOPICS)}); sin temas se borran todas")
+    sub.add_parser("purge", help="Borra las respuestas caducadas")
+    args = parser.parse_args()
+
+    cache = AnswerCache(args.db)
+    if args.command == "invalidate":
+        removed = cache.invalidate(args.topics or None)
+        print(f"🧹 {removed} respuesta(s) borradas")
+    elif args.command == "purge":
+        print(f"🧹 {cache.purge()} respuesta(s) caducadas borradas")
+    else:
+        by_topic = cache.stats()
+        print(f"📋 {len(cache)} respuesta(s) vigentes en {args.db}")
+        for topic, count in sorted(by_topic.items()):
+            print(f"   {topic}: {count}")
+
+if __name__ == "__main__":
+    main()
@@ -1,97 +1,341 @@
-from flask import Flask, render_template, request, jsonify
-import requests
-import csv
-import os
-import re
-
-app = Flask(__name__)
-
-OLLAMA_API = "http://localhost:11434/api/chat"
-RESPONSES_CSV = "responses.csv"
-PROHIBIDAS_CSV = "prohibidas.csv"
-SIMILARITY_THRESHOLD = 0.6
-
-SYSTEM_PROMPT = {
-    "role": "system",
-    "content": (
-        "Gobi, el asistente virtual oficial de la USICAMM. "
-        "Responde con precisión y amabilidad las dudas relacionadas con la USICAMM."
-    )
-}
-
-def load_prohibited_words():
-    if not os.path.exists(PROHIBIDAS_CSV):
-        return []
-    with open(PROHIBIDAS_CSV, newline='', encoding='utf-8') as f:
-        return [row[0].lower() for row in csv.reader(f)]
-
-def contains_prohibited_word(text, prohibited_words):
-    text_lower = text.lower()
-    return any(palabra in text_lower for palabra in prohibited_words)
-
-def load_responses():
-    if not os.path.exists(RESPONSES_CSV):
-        return []
-    with open(RESPONSES_CSV, newline='', encoding='utf-8') as f:
-        return list(csv.reader(f))
-
-def save_response(question, answer):
-    exists = os.path.exists(RESPONSES_CSV)
-    with open(RESPONSES_CSV, 'a', newline='', encoding='utf-8') as f:
-        writer = csv.writer(f)
-        if not exists:
-            writer.writerow(["question", "answer"])
-        writer.writerow([question, answer])
-
-def simple_similarity(a, b):
-    a_words = set(re.findall(r'\w+', a.lower()))
-    b_words = set(re.findall(r'\w+', b.lower()))
-    if not a_words or not b_words:
-        return 0.0
-    inter = a_words.intersection(b_words)
-    return len(inter) / max(len(a_words), len(b_words))
-
-def find_similar_answer(question, responses):
-    for q, a in responses:
-        if simple_similarity(q, question) >= SIMILARITY_THRESHOLD:
-            return a
-    return None
-
-def chat_with_ollama(user_prompt):
-    payload = {
-        "model": "deepseek-llm:7b",
-        "messages": [
-            SYSTEM_PROMPT,
-            {"role": "user", "content": user_prompt}
-        ],
-        "stream": False
-    }
-
-    response = requests.post(OLLAMA_API, json=payload)
-    if response.status_code == 200:
-        return response.json().get("message", {}).get("content", "")
-    else:
-        return f"Error: {response.status_code} - {response.text}"
-
-@app.route("/")
-def index():
-    return render_template("index.html")
-
-@app.route("/chat", methods=["POST"])
-def chat():
-    user_input = request.json.get("message")
-    prohibited_words = load_prohibited_words()
-    responses = load_responses()
-
-    if contains_prohibited_word(user_input, prohibited_words):
-        return jsonify({"answer": "Lo siento, no puedo responder esa pregunta."})
-
-    answer = find_similar_answer(user_input, responses)
-    if not answer:
-        answer = chat_with_ollama(user_input)
-        save_response(user_input, answer)
-
-    return jsonify({"answer": answer})
-
-if __name__ == "__main__":
-    app.run(debug=True)
+from flask import Flask, Response, render_template, request, jsonify, stream_with_context
+from werkzeug.middleware.proxy_fix import ProxyFix
+import json
+import os
+import threading
+import time
+import requests
+import metrics
+from admission import AdmissionGate, Busy, RateLimited, RateLimiter, SharedAdmissionGate, SharedRateLimiter
+from answer_cache import AnswerCache
+from faq_db import SQLiteFAQStore
+from faq_store import FAQStore
+from ollama_client import OllamaClient, OllamaError
+from singleflight import FlightError, SingleFlight
+
+app = Flask(__name__)
+
+OLLAMA_URL = "http://localhost:11434"
+OLLAMA_MODEL = "deepseek-llm:7b"
+# Segundos para conectar y para esperar la respuesta (o cada fragmento al
+# hacer streaming), reintentos ante fallas de conexión y conexiones abiertas
+OLLAMA_TIMEOUT = (5, 300)
+OLLAMA_RETRIES = 2
+OLLAMA_POOL_SIZE = 10
+# Generaciones simultáneas en Ollama sumando todos los procesos del servidor
+# (ajustar junto con OLLAMA_NUM_PARALLEL)
+OLLAMA_CONCURRENCY = 4
+# Con todos los lugares ocupados, cuántas preguntas nuevas pueden esperar
+# turno (y cuántos segundos); las demás reciben "ocupado" al instante
+LLM_QUEUE_SIZE = 8
+LLM_QUEUE_TIMEOUT = 15
+# Preguntas que van al modelo por cliente: RATE_LIMIT por segundo con
+# ráfagas de hasta RATE_BURST (0 = sin límite). Las respuestas guardadas no
+# cuentan y se sirven siempre, aunque el modelo esté saturado
+RATE_LIMIT = 0.2
+RATE_BURST = 5
+# Con varios workers de gunicorn, los lugares, la cola y los límites por
+# cliente se llevan en esta base SQLite, compartida por todos los procesos
+ADMISSION_DB = "admission.db"
+# Proxies inversos delante del servidor (p. ej. nginx): con 1 o más, la IP
+# del cliente se toma de X-Forwarded-For
+PROXY_HOPS = 0
+# Al apagar, segundos que se esperan las generaciones en curso para que su
+# respuesta alcance a guardarse
+SHUTDOWN_TIMEOUT = 30
+RESPONSES_CSV = "responses.csv"
+PROHIBIDAS_CSV = "prohibidas.csv"
+
+# "sqlite" guarda las preguntas en FAQ_DB (seguro con varios procesos e
+# importa RESPONSES_CSV la primera vez); "csv" usa solo RESPONSES_CSV
+FAQ_BACKEND = "sqlite"
+FAQ_DB = "faq.db"
+
+# Las respuestas del modelo se guardan aparte de las preguntas curadas, en
+# ANSWER_CACHE_DB: caducan a los ANSWER_TTL segundos y se conservan a lo más
+# ANSWER_MAX_ENTRIES (las menos usadas se descartan primero)
+ANSWER_CACHE_DB = FAQ_DB
+ANSWER_TTL = 7 * 24 * 3600
+ANSWER_MAX_ENTRIES = 5000
+
+# Búsqueda semántica opcional (requiere numpy): si ninguna pregunta comparte
+# suficientes palabras, se compara el embedding de la pregunta contra los de
+# las preguntas guardadas (similitud coseno)
+SEMANTIC_SEARCH = False
+EMBED_MODEL = "nomic-embed-text"
+SEMANTIC_INDEX = "faq_embeddings"
+SEMANTIC_THRESHOLD = 0.85
+SEMANTIC_TOP_K = 5
+
+SIMILARITY_THRESHOLD = 0.6
+REFUSAL_ANSWER = "Lo siento, no puedo responder esa pregunta."
+RATE_LIMITED_ANSWER = "Estás enviando preguntas muy rápido. Espera unos segundos e inténtalo de nuevo."
+BUSY_ANSWER = "Gobi está atendiendo muchas preguntas en este momento. Inténtalo de nuevo en unos segundos."
+
+# Filtro de palabras prohibidas: coincidir solo con palabras completas y
+# comparar sin acentos ni mayúsculas
+PROHIBITED_WHOLE_WORD = False
+PROHIBITED_FOLD_ACCENTS = True
+
+SYSTEM_PROMPT = {
+    "role": "system",
+    "content": (
+        "Gobi, el asistente virtual oficial de la USICAMM. "
+        "Responde con precisión y amabilidad las dudas relacionadas con la USICAMM."
+    )
+}
+
+if FAQ_BACKEND == "sqlite":
+    faq_store = SQLiteFAQStore(
+        FAQ_DB, PROHIBIDAS_CSV, import_from=RESPONSES_CSV,
+        whole_word=PROHIBITED_WHOLE_WORD,
+        fold_accents=PROHIBITED_FOLD_ACCENTS,
+    )
+else:
+    faq_store = FAQStore(
+        RESPONSES_CSV, PROHIBIDAS_CSV,
+        whole_word=PROHIBITED_WHOLE_WORD,
+        fold_accents=PROHIBITED_FOLD_ACCENTS,
+    )
+
+answer_cache = AnswerCache(ANSWER_CACHE_DB, ttl=ANSWER_TTL, max_entries=ANSWER_MAX_ENTRIES)
+
+def ollama_client():
+    return OllamaClient(
+        OLLAMA_URL, model=OLLAMA_MODEL, timeout=OLLAMA_TIMEOUT,
+        retries=OLLAMA_RETRIES, pool_size=OLLAMA_POOL_SIZE,
+    )
+
+ollama = ollama_client()
+
+def admission(shared=False):
+    # En un solo proceso basta con llevar la cuenta en memoria; con varios
+    # (shared=True) los límites valen para el servidor completo
+    if shared:
+        gate = SharedAdmissionGate(ADMISSION_DB, OLLAMA_CONCURRENCY, LLM_QUEUE_SIZE, LLM_QUEUE_TIMEOUT)
+    else:
+        gate = AdmissionGate(OLLAMA_CONCURRENCY, LLM_QUEUE_SIZE, LLM_QUEUE_TIMEOUT)
+    limiter = None
+    if RATE_LIMIT > 0:
+        limiter = (SharedRateLimiter(ADMISSION_DB, RATE_LIMIT, RATE_BURST) if shared
+                   else RateLimiter(RATE_LIMIT, RATE_BURST))
+    return gate, limiter
+
+llm_gate, rate_limiter = admission()
+
+# Preguntas que ya se están generando; las repetidas esperan esa respuesta
+inflight = SingleFlight(similarity_threshold=SIMILARITY_THRESHOLD)
+generations = set()
+generations_lock = threading.Lock()
+
+# Métricas en /metrics (formato de Prometheus). Con gunicorn_chat.py cada
+# worker lleva sus propios contadores y /metrics muestra los del worker que
+# atendió la solicitud
+STAGE_SECONDS = metrics.histogram("chat_stage_seconds", "Tiempo de cada etapa de una pregunta")
+FAQ_LOOKUPS = metrics.counter("faq_lookups_total", "Búsquedas en las preguntas guardadas por resultado")
+CHAT_ANSWERS = metrics.counter("chat_answers_total", "Respuestas por ruta y origen")
+GENERATIONS = metrics.counter("chat_generations_total", "Preguntas que van al modelo: nuevas o unidas a una en curso")
+
+def contains_prohibited_word(text):
+    with STAGE_SECONDS.time(stage="filter"):
+        return faq_store.prohibited_matcher().search(text) is not None
+
+semantic_index = None
+if SEMANTIC_SEARCH:
+    from semantic_index import SemanticIndex
+    semantic_index = SemanticIndex(
+        SEMANTIC_INDEX, lambda texts: ollama.embed(texts, model=EMBED_MODEL), EMBED_MODEL
+    )
+    # Lo que se agregue o corrija después (Doc.py, responses.csv) llega por
+    # la suscripción; sync() solo calcula lo que falta al arrancar
+    faq_store.subscribe(semantic_index.add_many)
+    semantic_index.sync(faq_store.responses())
+
+def save_response(question, answer):
+    # Solo se guardan respuestas completas; las vacías o de error no
+    return answer_cache.add(question, answer)
+
+def find_similar_answer(question):
+    with STAGE_SECONDS.time(stage="faq_lookup"):
+        # Primero las preguntas curadas y después las respuestas generadas
+        answer = faq_store.find_similar(question, SIMILARITY_THRESHOLD)
+        result = "hit"
+        if answer is None:
+            answer = answer_cache.find_similar(question, SIMILARITY_THRESHOLD)
+            result = "cache_hit"
+        if answer is None and semantic_index is not None:
+            answer = semantic_index.find_similar(question, SEMANTIC_THRESHOLD, k=SEMANTIC_TOP_K)
+            result = "semantic_hit"
+    FAQ_LOOKUPS.inc(result=result if answer else "miss")
+    return answer
+
+def build_messages(user_prompt):
+    return [
+        SYSTEM_PROMPT,
+        {"role": "user", "content": user_prompt}
+    ]
+
+def chat_with_ollama(flight, slot):
+    # Corre en su propio hilo: la generación termina y se guarda una sola vez
+    # aunque el cliente que la inició se desconecte.
+    error = None
+    try:
+        # Otra solicitud pudo haber guardado la respuesta mientras tanto; se
+        # busca directo para no contar otra vez la misma pregunta en métricas
+        answer = (faq_store.find_similar(flight.question, SIMILARITY_THRESHOLD)
+                  or answer_cache.find_similar(flight.question, SIMILARITY_THRESHOLD))
+        if answer:
+            flight.publish(answer)
+        else:
+            with STAGE_SECONDS.time(stage="llm"):
+                for token in ollama.chat_stream(build_messages(flight.question)):
+                    flight.publish(token)
+            save_response(flight.question, flight.text())
+    except (OllamaError, requests.RequestException) as e:
+        error = f"Error: {e}"
+    except Exception as e:
+        error = f"Error: {e}"
+        raise
+    finally:
+        llm_gate.release(slot)
+        inflight.land(flight, error)
+        with generations_lock:
+            generations.discard(threading.current_thread())
+
+def ask_ollama(user_prompt):
+    # Las preguntas que se unen a una generación en curso no ocupan lugar;
+    # una nueva espera turno en llm_gate o falla con Busy
+    flight, leader = inflight.join_or_lead(user_prompt)
+    GENERATIONS.inc(role="leader" if leader else "follower")
+    if leader:
+        try:
+            slot = llm_gate.acquire()
+        except Busy:
+            inflight.land(flight, BUSY_ANSWER)
+            raise
+        thread = threading.Thread(target=chat_with_ollama, args=(flight, slot), daemon=True)
+        with generations_lock:
+            generations.add(thread)
+        thread.start()
+    return flight
+
+def check_rate_limit():
+    if rate_limiter is None:
+        return
+    retry_after = rate_limiter.allow(request.remote_addr or "?")
+    if retry_after:
+        raise RateLimited(retry_after)
+
+def after_fork(workers):
+    # Para gunicorn con preload_app (ver gunicorn_chat.py): el índice de
+    # preguntas y el filtro se cargaron antes del fork y se comparten; cada
+    # worker abre sus propias conexiones a Ollama y, si hay más de uno,
+    # respeta los límites junto con los demás a través de ADMISSION_DB
+    global ollama, llm_gate, rate_limiter
+    ollama = ollama_client()
+    llm_gate, rate_limiter = admission(shared=workers > 1)
+
+def reset_admission():
+    # Los lugares que quedaron de una ejecución anterior ya no están en uso
+    SharedAdmissionGate(ADMISSION_DB, OLLAMA_CONCURRENCY, LLM_QUEUE_SIZE, LLM_QUEUE_TIMEOUT).reset()
+
+def shutdown(timeout=SHUTDOWN_TIMEOUT):
+    # Las generaciones siguen aunque el cliente se haya ido: se espera a que
+    # terminen (y se guarden) antes de cerrar las conexiones
+    deadline = time.monotonic() + timeout
+    with generations_lock:
+        pending = list(generations)
+    for thread in pending:
+        thread.join(max(0.0, deadline - time.monotonic()))
+    ollama.close()
+
+def sse_event(data):
+    return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def stream_flight(flight):
+    try:
+        for token in flight.follow():
+            yield sse_event({"token": token})
+    except FlightError as e:
+        yield sse_event({"error": str(e)})
+        return
+    yield sse_event({"done": True})
+
+def stream_answer(answer):
+    yield sse_event({"token": answer})
+    yield sse_event({"done": True})
+
+@app.route("/")
+def index():
+    return render_template("index.html")
+
+@app.route("/chat", methods=["POST"])
+def chat():
+    user_input = request.json.get("message")
+
+    if contains_prohibited_word(user_input):
+        CHAT_ANSWERS.inc(route="chat", source="refused")
+        return jsonify({"answer": REFUSAL_ANSWER})
+
+    answer = find_similar_answer(user_input)
+    source = "faq"
+    if not answer:
+        source = "llm"
+        check_rate_limit()
+        try:
+            answer = ask_ollama(user_input).result()
+        except FlightError as e:
+            answer = str(e)
+            source = "error"
+
+    CHAT_ANSWERS.inc(route="chat", source=source)
+    return jsonify({"answer": answer})
+
+@app.route("/chat/stream", methods=["POST"])
+def chat_stream():
+    user_input = request.json.get("message")
+
+    if contains_prohibited_word(user_input):
+        source, events = "refused", stream_answer(REFUSAL_ANSWER)
+    else:
+        answer = find_similar_answer(user_input)
+        if answer:
+            source, events = "faq", stream_answer(answer)
+        else:
+            check_rate_limit()
+            source, events = "llm", stream_flight(ask_ollama(user_input))
+    CHAT_ANSWERS.inc(route="chat_stream", source=source)
+
+    return Response(
+        stream_with_context(events),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+def refuse(source, answer, status, retry_after):
+    # Respuesta inmediata en lugar de encolar otra generación
+    CHAT_ANSWERS.inc(route=request.endpoint, source=source)
+    response = jsonify({"answer": answer})
+    response.status_code = status
+    response.headers["Retry-After"] = str(max(1, round(retry_after)))
+    return response
+
+@app.errorhandler(RateLimited)
+def rate_limited(e):
+    return refuse("rate_limited", RATE_LIMITED_ANSWER, 429, e.retry_after)
+
+@app.errorhandler(Busy)
+def busy(e):
+    return refuse("busy", BUSY_ANSWER, 503, LLM_QUEUE_TIMEOUT)
+
+@app.route("/metrics")
+def metrics_endpoint():
+    return Response(metrics.registry.render(), mimetype=metrics.PROMETHEUS_CONTENT_TYPE)
+
+if PROXY_HOPS:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=PROXY_HOPS)
+
+if __name__ == "__main__":
+    # Servidor de desarrollo (FLASK_DEBUG=1 activa el depurador y el
+    # recargador); en producción: gunicorn -c gunicorn_chat.py
+    app.run(debug=os.environ.get("FLASK_DEBUG") == "1")
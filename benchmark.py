@@ -0,0 +1,433 @@
+import argparse
+import csv
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import get_context
+
+# Benchmarks de las rutas críticas con datos sintéticos y un Ollama
+# simulado (fake_ollama.py). Cada caso corre en un proceso nuevo, así la
+# memoria máxima que reporta es solo la suya. Uso:
+#   python benchmark.py --out bench_results.json
+#   python benchmark.py --suite faq --faq-sizes 1000,1000000 --compare bench_results.json
+
+BENCH_SEED = 1234
+BENCH_RESULTS = "bench_results.json"
+FAQ_SIZES = (1000, 10000, 100000)
+FAQ_QUERIES = 2000
+# Backends de búsqueda: "csv" y "sqlite" son los que sirve app.py (FAQStore
+# y SQLiteFAQStore, ambos con el índice en memoria); "fts" es la búsqueda
+# directa en SQLite (FAQDatabase.find_similar, la de la línea de comandos)
+FAQ_BACKENDS = ("csv", "sqlite", "fts")
+# Preguntas que otro proceso agrega para medir cuánto tarda en verlas
+FAQ_UPDATE_ROWS = 100
+PROHIBITED_SIZES = (100, 10000)
+MESSAGE_LENGTHS = (80, 2000)
+FILTER_MESSAGES = 5000
+PDF_PAGES = 40
+CHAT_CONCURRENCY = (1, 8, 32)
+CHAT_REQUESTS = 200
+CHAT_CORPUS = 10000
+# Fracción de preguntas de /chat que ya están en las preguntas frecuentes
+CHAT_HIT_RATIO = 0.8
+OLLAMA_LATENCY = 0.2
+OLLAMA_TOKEN_RATE = 200.0
+OLLAMA_TOKENS = 40
+
+SUITES = ("faq", "filter", "pdf", "chat")
+
+SYLLABLES = (
+    "ca", "ma", "do", "cen", "te", "ri", "za", "ción", "pro", "fe", "sor", "es", "cue", "la", "ba",
+    "se", "con", "vo", "to", "ria", "re", "qui", "si", "tos", "pla", "ni", "vel", "pri", "cun",
+    "da", "ad", "mi", "sión", "mo", "ho", "ras", "tu", "lo",
+)
+COMMON_WORDS = (
+    "qué", "cómo", "cuándo", "dónde", "para", "la", "el", "de", "en", "los", "las", "una", "un",
+    "se", "por", "con", "del", "es", "puedo", "necesito", "debo",
+)
+
+def make_vocabulary(rng, size):
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+def make_questions(rng, count, vocabulary):
+    # Palabras con distribución tipo Zipf, como en preguntas reales
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+    cumulative = []
+    total = 0.0
+    for weight in weights:
+        total += weight
+        cumulative.append(total)
+    questions = []
+    for _ in range(count):
+        words = rng.sample(COMMON_WORDS, 2) + rng.choices(vocabulary, cum_weights=cumulative, k=rng.randint(5, 10))
+        questions.append("¿" + " ".join(words) + "?")
+    return questions
+
+def write_corpus(path, questions):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["question", "answer"])
+        for i, question in enumerate(questions):
+            writer.writerow([question, f"Respuesta sintética número {i}."])
+
+def make_queries(rng, questions, vocabulary, count, hit_ratio=0.5):
+    # Aciertos: preguntas guardadas con una palabra cambiada; fallos:
+    # preguntas nuevas
+    queries = []
+    for _ in range(count):
+        if rng.random() < hit_ratio:
+            words = rng.choice(questions).strip("¿?").split()
+            words[rng.randrange(len(words))] = rng.choice(vocabulary)
+            queries.append("¿" + " ".join(words) + "?")
+        else:
+            queries.append("¿" + " ".join(rng.choices(vocabulary, k=rng.randint(6, 10))) + "?")
+    return queries
+
+def make_pdf(path, pages, scanned, rng):
+    import fitz
+    text_doc = fitz.open()
+    vocabulary = make_vocabulary(rng, 2000)
+    for n in range(pages):
+        page = text_doc.new_page()
+        paragraphs = [
+            " ".join(rng.choices(vocabulary, k=rng.randint(30, 80))).capitalize() + "."
+            for _ in range(6)
+        ]
+        page.insert_textbox(fitz.Rect(60, 60, 540, 780), f"SECCIÓN {n + 1}\n\n" + "\n\n".join(paragraphs), fontsize=10)
+    if not scanned:
+        text_doc.save(path)
+        return
+    # Página escaneada: el texto se convierte en imagen a 200 dpi
+    scan_doc = fitz.open()
+    for page in text_doc:
+        pix = page.get_pixmap(dpi=200, colorspace=fitz.csGRAY)
+        scan_page = scan_doc.new_page(width=page.rect.width, height=page.rect.height)
+        scan_page.insert_image(scan_page.rect, stream=pix.tobytes("png"))
+    scan_doc.save(path)
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil
+            return round(psutil.Process().memory_info().peak_wset / (1024 * 1024), 1)
+        except (ImportError, AttributeError):
+            return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux lo da en KB y macOS en bytes
+    return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)
+
+def percentile(sorted_samples, q):
+    if not sorted_samples:
+        return None
+    index = min(len(sorted_samples) - 1, max(0, round(q * len(sorted_samples)) - 1))
+    return sorted_samples[index]
+
+def latency_stats(samples, elapsed):
+    samples = sorted(samples)
+    ms = lambda value: round(value * 1000, 3) if value is not None else None
+    return {
+        "ops": len(samples),
+        "seconds": round(elapsed, 3),
+        "throughput": round(len(samples) / elapsed, 1) if elapsed else None,
+        "p50_ms": ms(percentile(samples, 0.50)),
+        "p95_ms": ms(percentile(samples, 0.95)),
+        "p99_ms": ms(percentile(samples, 0.99)),
+        "max_ms": ms(samples[-1] if samples else None),
+    }
+
+def timed_calls(fn, inputs):
+    samples = []
+    started = time.perf_counter()
+    for item in inputs:
+        start = time.perf_counter()
+        fn(item)
+        samples.append(time.perf_counter() - start)
+    return latency_stats(samples, time.perf_counter() - started)
+
+def bench_faq(workdir, size, backend, queries=FAQ_QUERIES):
+    from faq_db import FAQDatabase, SQLiteFAQStore
+    from faq_store import FAQStore
+    rng = random.Random(BENCH_SEED)
+    vocabulary = make_vocabulary(rng, max(2000, size // 20))
+    questions = make_questions(rng, size, vocabulary)
+    corpus = os.path.join(workdir, "responses.csv")
+    write_corpus(corpus, questions)
+    lookups = make_queries(rng, questions, vocabulary, queries)
+    del questions
+
+    db_path = os.path.join(workdir, "faq.db")
+    prohibidas = os.path.join(workdir, "prohibidas.csv")
+    start = time.perf_counter()
+    if backend == "csv":
+        store = FAQStore(corpus, prohibidas)
+        find = store.find_similar
+    elif backend == "sqlite":
+        # Igual que app.py: importa el CSV la primera vez y arma el índice
+        store = SQLiteFAQStore(db_path, prohibidas, import_from=corpus)
+        find = store.find_similar
+    else:
+        database = FAQDatabase(db_path)
+        database.import_csv(corpus)
+        find = database.find_similar
+    load_seconds = time.perf_counter() - start
+
+    hits = sum(find(q, 0.6) is not None for q in lookups[:200])
+    result = timed_calls(lambda q: find(q, 0.6), lookups)
+    result.update(load_seconds=round(load_seconds, 3), hit_ratio=round(hits / 200, 2))
+    if backend == "sqlite":
+        # Otro proceso (p. ej. Doc.py) agrega preguntas: la siguiente
+        # búsqueda que revisa la base las incorpora al índice
+        new_rows = [(q, "Respuesta nueva.") for q in make_questions(rng, FAQ_UPDATE_ROWS, vocabulary)]
+        FAQDatabase(db_path).add_many(new_rows)
+        store._next_check = 0.0
+        start = time.perf_counter()
+        find(lookups[0], 0.6)
+        result.update(update_rows=len(new_rows), update_ms=round((time.perf_counter() - start) * 1000, 3))
+    return result
+
+def bench_filter(workdir, words, length, messages=FILTER_MESSAGES):
+    from prohibited_filter import ProhibitedMatcher
+    rng = random.Random(BENCH_SEED)
+    vocabulary = make_vocabulary(rng, words * 2)
+    prohibited = rng.sample(vocabulary, words)
+    start = time.perf_counter()
+    matcher = ProhibitedMatcher(prohibited, fold_accents=True)
+    build_seconds = time.perf_counter() - start
+
+    # Mensajes sin palabras prohibidas, el caso común: se recorren completos
+    excluded = set(prohibited)
+    allowed = [word for word in vocabulary if word not in excluded]
+    texts = []
+    for _ in range(min(messages, 500)):
+        text = ""
+        while len(text) < length:
+            text += rng.choice(COMMON_WORDS) + " " + rng.choice(allowed) + " "
+        texts.append(text[:length])
+    inputs = [texts[i % len(texts)] for i in range(messages)]
+    result = timed_calls(lambda text: matcher.search(text), inputs)
+    result.update(build_seconds=round(build_seconds, 3))
+    return result
+
+def bench_pdf(workdir, pages, scanned, workers):
+    import pytesseract
+    from pdf_extract import iter_pages
+    if scanned:
+        try:
+            pytesseract.get_tesseract_version()
+        except Exception as e:
+            return {"skipped": f"Tesseract no disponible: {e}"}
+    path = os.path.join(workdir, "scan.pdf" if scanned else "text.pdf")
+    make_pdf(path, pages, scanned, random.Random(BENCH_SEED))
+
+    samples = []
+    last = time.perf_counter()
+
+    def progress(start, stop, total):
+        nonlocal last
+        now = time.perf_counter()
+        # Con varios procesos llegan tramos: se reparte el tiempo por página
+        samples.extend([(now - last) / (stop - start)] * (stop - start))
+        last = now
+
+    started = time.perf_counter()
+    characters = sum(len(text) for text in iter_pages(path, workers=workers, progress=progress))
+    result = latency_stats(samples, time.perf_counter() - started)
+    result.update(characters=characters)
+    return result
+
+def bench_chat(workdir, concurrency, requests_count=CHAT_REQUESTS, hit_ratio=CHAT_HIT_RATIO,
+               corpus_size=CHAT_CORPUS, latency=OLLAMA_LATENCY, token_rate=OLLAMA_TOKEN_RATE,
+               tokens=OLLAMA_TOKENS):
+    import logging
+    import requests
+    from werkzeug.serving import make_server
+    from fake_ollama import FakeOllama
+
+    rng = random.Random(BENCH_SEED)
+    vocabulary = make_vocabulary(rng, 2000)
+    questions = make_questions(rng, corpus_size, vocabulary)
+    # app.py lee sus archivos de la carpeta actual
+    os.chdir(workdir)
+    write_corpus("responses.csv", questions)
+    open("prohibidas.csv", "w", encoding="utf-8").close()
+
+    fake = FakeOllama(latency=latency, token_rate=token_rate, tokens=tokens).start()
+    import app as chat_app
+    from ollama_client import OllamaClient
+    chat_app.ollama = OllamaClient(fake.url, model=fake.model, pool_size=max(10, concurrency))
+    # Todos los clientes salen de la misma IP: sin límite por cliente, pero
+    # con el límite global de generaciones de app.py
+    chat_app.RATE_LIMIT = 0
+    chat_app.llm_gate, chat_app.rate_limiter = chat_app.admission()
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = make_server("127.0.0.1", 0, chat_app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/chat"
+
+    plan = [
+        ("hit", rng.choice(questions)) if rng.random() < hit_ratio
+        else ("miss", "¿" + " ".join(rng.choices(vocabulary, k=8)) + f" {i}?")
+        for i in range(requests_count)
+    ]
+    local = threading.local()
+
+    def ask(item):
+        kind, question = item
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+        start = time.perf_counter()
+        response = session.post(url, json={"message": question}, timeout=120)
+        return kind, time.perf_counter() - start, response.status_code
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as clients:
+        outcomes = list(clients.map(ask, plan))
+    elapsed = time.perf_counter() - started
+    server.shutdown()
+    fake.stop()
+
+    result = latency_stats([seconds for _, seconds, _ in outcomes], elapsed)
+    # 503: el modelo estaba saturado y la pregunta se rechazó sin esperar
+    result["busy"] = sum(status == 503 for _, _, status in outcomes)
+    result["errors"] = sum(status not in (200, 503) for _, _, status in outcomes)
+    result["llm_requests"] = fake.requests.get("/api/chat", 0)
+    for kind in ("hit", "miss"):
+        stats = latency_stats([seconds for k, seconds, _ in outcomes if k == kind], elapsed)
+        result[kind] = {key: stats[key] for key in ("ops", "p50_ms", "p95_ms", "p99_ms")}
+    return result
+
+CASES = {"faq": bench_faq, "filter": bench_filter, "pdf": bench_pdf, "chat": bench_chat}
+
+def _run_case(suite, params):
+    # Corre en el proceso hijo
+    home = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        baseline = peak_rss_mb()
+        try:
+            result = CASES[suite](workdir, **params)
+        finally:
+            # En Windows no se puede borrar la carpeta actual
+            os.chdir(home)
+        result.update(baseline_rss_mb=baseline, peak_rss_mb=peak_rss_mb())
+        return result
+
+def run_case(suite, params):
+    # Un proceso nuevo por caso (spawn, igual en Windows y Linux)
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+        return executor.submit(_run_case, suite, params).result()
+
+def plan_cases(args):
+    cases = []
+    if "faq" in args.suite:
+        for size in args.faq_sizes:
+            for backend in FAQ_BACKENDS:
+                cases.append(("faq", {"size": size, "backend": backend}))
+    if "filter" in args.suite:
+        for words in PROHIBITED_SIZES:
+            for length in MESSAGE_LENGTHS:
+                cases.append(("filter", {"words": words, "length": length}))
+    if "pdf" in args.suite:
+        for scanned in (False, True):
+            for workers in sorted({1, os.cpu_count() or 1}):
+                cases.append(("pdf", {"pages": args.pdf_pages, "scanned": scanned, "workers": workers}))
+    if "chat" in args.suite:
+        for concurrency in args.chat_concurrency:
+            cases.append(("chat", {
+                "concurrency": concurrency, "requests_count": args.chat_requests,
+                "latency": args.ollama_latency, "token_rate": args.ollama_token_rate,
+            }))
+    return cases
+
+def _case_id(suite, params):
+    return suite + " " + " ".join(f"{key}={value}" for key, value in params.items())
+
+def git_version():
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10,
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def compare(previous_path, results):
+    with open(previous_path, encoding="utf-8") as f:
+        previous = {result["id"]: result for result in json.load(f)["results"]}
+    print(f"\n📊 Comparación con {previous_path}:")
+    for result in results:
+        before = previous.get(result["id"])
+        if not before or "p95_ms" not in before or "p95_ms" not in result:
+            continue
+        changes = []
+        for key in ("throughput", "p95_ms", "peak_rss_mb"):
+            if before.get(key) and result.get(key) is not None:
+                changes.append(f"{key} {result[key] / before[key] - 1:+.0%}")
+        print(f"   {result['id']}: " + ", ".join(changes))
+
+def _int_list(text):
+    return [int(value) for value in text.split(",") if value]
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks de búsqueda, filtro, extracción de PDF y /chat")
+    parser.add_argument("--suite", type=lambda text: text.split(","), default=list(SUITES),
+                        help=f"Qué medir, separado por comas ({','.join(SUITES)})")
+    parser.add_argument("--faq-sizes", type=_int_list, default=list(FAQ_SIZES),
+                        help="Tamaños del corpus de preguntas (p. ej. 1000,10000,1000000)")
+    parser.add_argument("--pdf-pages", type=int, default=PDF_PAGES)
+    parser.add_argument("--chat-concurrency", type=_int_list, default=list(CHAT_CONCURRENCY))
+    parser.add_argument("--chat-requests", type=int, default=CHAT_REQUESTS)
+    parser.add_argument("--ollama-latency", type=float, default=OLLAMA_LATENCY)
+    parser.add_argument("--ollama-token-rate", type=float, default=OLLAMA_TOKEN_RATE)
+    parser.add_argument("--out", default=BENCH_RESULTS)
+    parser.add_argument("--compare", help="Resultados anteriores para comparar")
+    args = parser.parse_args()
+
+    results = []
+    for suite, params in plan_cases(args):
+        case_id = _case_id(suite, params)
+        print(f"⏱ {case_id}...", flush=True)
+        result = {"id": case_id, "suite": suite, "params": params}
+        try:
+            result.update(run_case(suite, params))
+        except Exception as e:
+            result["error"] = str(e)
+            print(f"❌ {case_id}: {e}")
+        else:
+            if "skipped" in result:
+                print(f"⏭ {result['skipped']}")
+            elif "p50_ms" in result:
+                print(f"   {result['throughput']} op/s, p50 {result['p50_ms']} ms, p95 {result['p95_ms']} ms, "
+                      f"p99 {result['p99_ms']} ms, memoria máx. {result['peak_rss_mb']} MB")
+                if "update_ms" in result:
+                    print(f"   {result['update_rows']} pregunta(s) de otro proceso incorporadas en {result['update_ms']} ms")
+        results.append(result)
+
+    report = {
+        "version": git_version(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "results": results,
+    }
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n💾 Resultados guardados en: {args.out}")
+    if args.compare:
+        compare(args.compare, results)
+
+if __name__ == "__main__":
+    main()
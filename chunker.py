@@ -0,0 +1,171 @@
+import math
+import re
+
+# Tamaño de cada bloque en tokens del modelo. Sin el tokenizador exacto se
+# estima por caracteres: en español los tokenizadores BPE tipo LLaMA dan
+# entre 3 y 4 caracteres por token, se usa el valor bajo para no pasarse
+CHUNK_TOKENS = 1500
+CHUNK_OVERLAP_TOKENS = 0
+CHARS_PER_TOKEN = 3.2
+
+# Cambia cuando cambian las reglas de abajo; forma parte de las llaves de
+# caché para que no se reutilicen resultados hechos con otros bloques
+CHUNKER_VERSION = 2
+
+HEADING_MAX_CHARS = 80
+HEADING_KEYWORD_RE = re.compile(
+    r"^(?:CAP[IÍ]TULO|T[IÍ]TULO|SECCI[OÓ]N|APARTADO|ANEXO|BASES?|ART[IÍ]CULO|"
+    r"Cap[ií]tulo|Secci[oó]n|Apartado|Anexo|Base|Art[ií]culo)\b"
+)
+LIST_ITEM_RE = re.compile(
+    r"^(?:\(?\d{1,3}(?:\.\d{1,3})*[.)]|\(?[a-zA-Z][.)]|[IVXLC]{1,6}[.)]|[-•*▪●○◦–])\s+"
+)
+SENTENCE_END_RE = re.compile(r"(?<=[.;:!?])\s+")
+PARAGRAPH_END = (".", ":", "!", "?")
+
+def estimate_tokens(text):
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+def _is_heading(line):
+    if len(line) > HEADING_MAX_CHARS or line.endswith((".", ",", ";")):
+        return False
+    if HEADING_KEYWORD_RE.match(line):
+        return True
+    letters = [c for c in line if c.isalpha()]
+    return len(letters) >= 3 and all(c.isupper() for c in letters)
+
+def _join_lines(lines):
+    text = lines[0]
+    for line in lines[1:]:
+        # Palabra partida con guion al final del renglón
+        if text.endswith("-") and text[-2:-1].isalpha() and line[:1].islower():
+            text = text[:-1] + line
+        else:
+            text += " " + line
+    return text
+
+def iter_units(pages):
+    # Rearma títulos, elementos de lista y párrafos a partir de los renglones
+    # que entrega PyMuPDF. Genera (tipo, texto); un párrafo que sigue en la
+    # página siguiente se une en una sola unidad.
+    kind, lines = None, []
+    for page_text in pages:
+        page_start = True
+        for line in page_text.splitlines():
+            line = line.strip()
+            if not line:
+                if lines:
+                    yield kind, _join_lines(lines)
+                kind, lines = None, []
+                continue
+            if _is_heading(line):
+                if lines:
+                    yield kind, _join_lines(lines)
+                yield "heading", line
+                kind, lines = None, []
+                page_start = False
+                continue
+            if LIST_ITEM_RE.match(line):
+                starts = "item"
+            elif lines and (lines[-1].endswith(PARAGRAPH_END) or page_start) and not line[:1].islower():
+                # Al cambiar de página solo se sigue el párrafo si la oración
+                # continúa (empieza en minúscula)
+                starts = "paragraph"
+            else:
+                starts = None
+            page_start = False
+            if starts:
+                if lines:
+                    yield kind, _join_lines(lines)
+                kind, lines = starts, [line]
+            else:
+                kind = kind or "paragraph"
+                lines.append(line)
+    if lines:
+        yield kind, _join_lines(lines)
+
+def _pack_words(pieces, max_tokens, count_tokens):
+    current = ""
+    for piece in pieces:
+        candidate = current + " " + piece if current else piece
+        if current and count_tokens(candidate) > max_tokens:
+            yield current
+            current = piece
+        else:
+            current = candidate
+    if current:
+        yield current
+
+def _split_word(word, max_tokens, count_tokens):
+    # Una palabra que no cabe (una URL, una tabla sin espacios) se corta por
+    # caracteres: en cada paso el prefijo más largo que cabe
+    while count_tokens(word) > max_tokens:
+        low, high = 1, len(word)
+        while low < high:
+            middle = (low + high + 1) // 2
+            if count_tokens(word[:middle]) <= max_tokens:
+                low = middle
+            else:
+                high = middle - 1
+        yield word[:low]
+        word = word[low:]
+    if word:
+        yield word
+
+def _split_oversized(text, max_tokens, count_tokens):
+    # Una unidad que por sí sola no cabe se parte por oraciones, una oración
+    # que tampoco cabe, por palabras, y una palabra, por caracteres
+    if count_tokens(text) <= max_tokens:
+        return [text]
+    pieces = []
+    for sentence in SENTENCE_END_RE.split(text):
+        if count_tokens(sentence) <= max_tokens:
+            pieces.append(sentence)
+            continue
+        for word in sentence.split():
+            pieces.extend(_split_word(word, max_tokens, count_tokens))
+    return list(_pack_words(pieces, max_tokens, count_tokens))
+
+def _overlap(units, overlap_tokens):
+    carried, size = [], 0
+    for unit in reversed(units):
+        if size + unit[2] > overlap_tokens:
+            break
+        carried.insert(0, unit)
+        size += unit[2]
+    return carried
+
+def chunk_pages(pages, max_tokens=CHUNK_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS,
+                clean=None, count_tokens=estimate_tokens):
+    # Genera bloques de hasta max_tokens juntando unidades completas, una por
+    # renglón. Los títulos no quedan al final de un bloque: pasan al
+    # siguiente junto con su contenido. Con overlap_tokens cada bloque
+    # empieza repitiendo las últimas unidades del anterior. `pages` puede ser
+    # cualquier iterable: se consume a medida que se generan los bloques.
+    current, size, repeated = [], 0, 0
+    for kind, text in iter_units(pages):
+        if clean:
+            text = clean(text)
+        if not text:
+            continue
+        # Se cuenta un token más por el salto de renglón que separa las unidades
+        for piece in _split_oversized(text, max_tokens - 1, count_tokens):
+            tokens = count_tokens(piece) + 1
+            if len(current) > repeated and size + tokens > max_tokens:
+                headings = 0
+                while headings < len(current) - repeated and current[-1 - headings][0] == "heading":
+                    headings += 1
+                emitted = current[:len(current) - headings] if len(current) - headings > repeated else current
+                carried = current[len(emitted):]
+                yield "\n".join(unit[1] for unit in emitted)
+
+                overlap = _overlap(emitted, overlap_tokens) if overlap_tokens else []
+                if sum(unit[2] for unit in overlap + carried) + tokens > max_tokens:
+                    overlap = []
+                current = overlap + carried
+                size = sum(unit[2] for unit in current)
+                repeated = len(overlap)
+            current.append((kind, piece, tokens))
+            size += tokens
+    if len(current) > repeated:
+        yield "\n".join(unit[1] for unit in current)
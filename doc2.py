@@ -1,135 +1,206 @@
-import os
-import re
-import pytesseract
-import fitz  # PyMuPDF
-from PIL import Image
-import tempfile
-import subprocess
-from docx import Document
-
-# Ajusta la ruta a tesseract si no está en PATH
-pytesseract.pytesseract.tesseract_cmd = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
-os.environ["TESSDATA_PREFIX"] = r"C:\Program Files\Tesseract-OCR\tessdata"
-
-# Carpetas de entrada y salida
-pdf_folder = r"D:\Ussicamm\AI\pdfs"
-output_folder = r"D:\Ussicamm\AI\results_word"
-os.makedirs(output_folder, exist_ok=True)
-
-# Máximo caracteres por bloque
-MAX_CHARS = 2000
-
-def clean_text(text):
-    # Mantener solo caracteres imprimibles y acentos
-    text = re.sub(r'[^\x20-\x7EÁÉÍÓÚáéíóúÜüÑñ.,;:!?()\-–—\n]', '', text)
-    # Reemplazar múltiples espacios
-    text = re.sub(r'\s+', ' ', text)
-    # Reemplazar secuencias largas de caracteres sin espacios por guiones
-    text = re.sub(r'(\S{50,})', lambda m: m.group(1)[:50] + '-', text)
-    return text.strip()
-
-def extract_text_from_pdf(pdf_path):
-    print("🔹 Abriendo PDF para extracción de texto...")
-    text = ""
-    pdf_doc = fitz.open(pdf_path)
-    total_pages = len(pdf_doc)
-    print(f"📄 Total de páginas: {total_pages}")
-
-    for page_num in range(total_pages):
-        print(f"➡ Procesando página {page_num + 1}/{total_pages}...")
-        page = pdf_doc.load_page(page_num)
-
-        page_text = page.get_text()
-        if page_text.strip():
-            text += page_text + "\n"
-        else:
-            pix = page.get_pixmap(dpi=300)
-            with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as tmp_img:
-                tmp_img.write(pix.tobytes())
-                tmp_img_path = tmp_img.name
-
-            img = Image.open(tmp_img_path).convert("L")
-            img = img.point(lambda x: 0 if x < 140 else 255, '1')
-            custom_config = r'--psm 6'
-            ocr_text = pytesseract.image_to_string(img, lang="spa+eng", config=custom_config)
-            text += ocr_text + "\n"
-
-            os.remove(tmp_img_path)
-
-    pdf_doc.close()
-    text = clean_text(text)
-    print(f"✅ Extracción completa, {len(text)} caracteres obtenidos.")
-    return text
-
-def split_into_blocks(text, max_chars=MAX_CHARS):
-    blocks = [text[i:i+max_chars] for i in range(0, len(text), max_chars)]
-    print(f"✂ Texto dividido en {len(blocks)} bloque(s) de máximo {max_chars} caracteres.")
-    return blocks
-
-def query_ollama(prompt, model="deepseek-llm:7b"):
-    process = subprocess.Popen(
-        ["ollama", "run", model],
-        stdin=subprocess.PIPE,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.DEVNULL
-    )
-    output_bytes, _ = process.communicate(input=prompt.encode('utf-8'))
-    output = output_bytes.decode('utf-8', errors='ignore')
-    return output.strip()
-
-def save_word_and_convert_to_pdf(pdf_name, analysis_results):
-    # Guardar en Word
-    doc = Document()
-    doc.add_heading(f"Requisitos extraídos de la convocatoria: {pdf_name}", level=1)
-    doc.add_paragraph(analysis_results)
-    word_path = os.path.join(output_folder, pdf_name.replace(".pdf", ".docx"))
-    doc.save(word_path)
-    print(f"💾 Resultado guardado en Word: {word_path}")
-
-    # Convertir a PDF usando LibreOffice headless
-    pdf_path = os.path.join(output_folder, pdf_name.replace(".pdf", ".pdf"))
-    try:
-        # Ajusta la ruta a soffice.exe si no está en PATH
-        subprocess.run([
-            r"C:\Program Files\LibreOffice\program\soffice.exe", "--headless",
-            "--convert-to", "pdf", word_path, "--outdir", output_folder
-        ], check=True)
-        print(f"💾 Resultado convertido a PDF: {pdf_path}")
-    except subprocess.CalledProcessError as e:
-        print(f"❌ Error al convertir a PDF con LibreOffice: {e}")
-
-def main():
-    pdfs = [f for f in os.listdir(pdf_folder) if f.lower().endswith(".pdf")]
-    if not pdfs:
-        print(f"⚠ No se encontraron archivos PDF en la carpeta: {pdf_folder}")
-        return
-
-    print(f"📂 Se encontraron {len(pdfs)} archivo(s) PDF para procesar.")
-
-    for idx, pdf_file in enumerate(pdfs, start=1):
-        print(f"\n🔹 [{idx}/{len(pdfs)}] Procesando archivo: {pdf_file}")
-        pdf_path = os.path.join(pdf_folder, pdf_file)
-        text = extract_text_from_pdf(pdf_path)
-        blocks = split_into_blocks(text)
-
-        full_analysis = ""
-        total_blocks = len(blocks)
-        for i, block in enumerate(blocks, start=1):
-            print(f"🤖 Procesando bloque {i}/{total_blocks} con Ollama...")
-            prompt = (
-                "Extrae únicamente los requisitos de la convocatoria en el siguiente texto. "
-                "No agregues encabezados, numeraciones, ni menciones a bloques. "
-                "Devuélvelo en un listado limpio y claro:\n\n"
-                + block
-            )
-            result = query_ollama(prompt)
-            print(f"✅ Bloque {i} procesado, {len(result)} caracteres obtenidos.")
-            full_analysis += result + "\n\n"
-
-        save_word_and_convert_to_pdf(pdf_file, full_analysis)
-        print(f"🎯 Archivo {pdf_file} completado.")
-
-    print("\n🏁 Todos los archivos PDF han sido procesados correctamente.")
-
-if __name__ == "__main__":
-    main()
+import os
+import re
+import pytesseract
+import requests
+from chunker import CHUNKER_VERSION, chunk_pages, estimate_tokens
+from doc_batch import Batch, BlocksFailed, batch_parser
+from doc_pipeline import DocxStreamWriter, map_ordered, staged
+from ollama_client import OllamaClient, OllamaError
+from pdf_convert import OfficeConverter
+from pdf_extract import OCR_SIGNATURE, count_pages, iter_pages
+from pipeline_cache import PipelineCache, digest, file_digest, llm_key
+
+# Ajusta la ruta a tesseract si no está en PATH
+pytesseract.pytesseract.tesseract_cmd = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
+os.environ["TESSDATA_PREFIX"] = r"C:\Program Files\Tesseract-OCR\tessdata"
+
+# Carpetas de entrada y salida por omisión (se cambian con --input y --output)
+pdf_folder = r"D:\Ussicamm\AI\pdfs"
+output_folder = r"D:\Ussicamm\AI\results_word"
+
+# Tamaño de cada bloque en tokens del modelo y cuánto se repite del bloque
+# anterior. deepseek-llm:7b tiene 4096 tokens de contexto: el bloque, el
+# prompt y la respuesta deben caber juntos
+CHUNK_TOKENS = 1500
+CHUNK_OVERLAP_TOKENS = 0
+MODEL_CONTEXT = 4096
+
+# Procesos para extraer y hacer OCR de páginas en paralelo (1 = en serie)
+# y cuántas páginas toma cada proceso por tarea
+EXTRACT_WORKERS = os.cpu_count() or 1
+PAGES_PER_TASK = 4
+# Documentos en proceso al mismo tiempo; comparten los procesos de OCR y
+# las consultas al modelo
+DOCUMENT_WORKERS = 2
+
+# Caché de texto extraído, OCR y respuestas del modelo por hash de contenido
+# (se cambia con --cache; inspeccionar o limpiar con:
+# python pipeline_cache.py --db ... stats|clear). Se abre en main()
+CACHE_DB = r"D:\Ussicamm\AI\pipeline_cache.db"
+CACHE_MAX_MB = 512
+cache = None
+
+MODEL = "deepseek-llm:7b"
+OLLAMA_URL = "http://localhost:11434"
+# Bloques que se mandan al modelo al mismo tiempo (ajustar junto con
+# OLLAMA_NUM_PARALLEL del servidor) y tiempos de conexión/respuesta
+OLLAMA_CONCURRENCY = 2
+OLLAMA_TIMEOUT = (5, 600)
+ollama = OllamaClient(OLLAMA_URL, model=MODEL, timeout=OLLAMA_TIMEOUT, pool_size=OLLAMA_CONCURRENCY)
+# Bloques pendientes por documento por cada consulta simultánea (en el
+# modelo o esperando turno); mientras estén todos ocupados no se extraen
+# más páginas de ese documento
+BLOCKS_PER_LLM_WORKER = 2
+
+# Una sola instancia de LibreOffice convierte todos los Word a PDF (la ruta
+# a soffice se toma de SOFFICE_PATH, del PATH o de la instalación por omisión)
+converter = OfficeConverter()
+
+REQUIREMENTS_PROMPT = (
+    "Extrae únicamente los requisitos de la convocatoria en el siguiente texto. "
+    "No agregues encabezados, numeraciones, ni menciones a bloques. "
+    "Devuélvelo en un listado limpio y claro:\n\n"
+)
+
+def clean_text(text):
+    # Mantener solo caracteres imprimibles y acentos
+    text = re.sub(r'[^\x20-\x7EÁÉÍÓÚáéíóúÜüÑñ.,;:!?()\-–—\n]', '', text)
+    # Reemplazar múltiples espacios
+    text = re.sub(r'\s+', ' ', text)
+    # Reemplazar secuencias largas de caracteres sin espacios por guiones
+    text = re.sub(r'(\S{50,})', lambda m: m.group(1)[:50] + '-', text)
+    return text.strip()
+
+def page_reporter(pdf_file):
+    def report_pages(start, stop, total):
+        if stop - start == 1:
+            print(f"➡ {pdf_file}: página {stop}/{total} procesada.")
+        else:
+            print(f"➡ {pdf_file}: páginas {start + 1}-{stop}/{total} procesadas.")
+        if stop == total:
+            print(f"✅ {pdf_file}: extracción completa.")
+    return report_pages
+
+def extract_pages_from_pdf(batch, pdf_path):
+    # Las páginas se extraen conforme el resto del proceso las va pidiendo,
+    # en el pool de OCR que comparten todos los documentos
+    return iter_pages(
+        pdf_path, workers=batch.args.ocr_workers, pages_per_task=PAGES_PER_TASK,
+        progress=page_reporter(os.path.basename(pdf_path)), cache=cache, pool=batch.ocr_pool,
+    )
+
+def split_into_blocks(pages):
+    # Bloques que respetan títulos, listas y párrafos del PDF
+    return chunk_pages(pages, CHUNK_TOKENS, CHUNK_OVERLAP_TOKENS, clean=clean_text)
+
+def query_ollama(prompt, model=MODEL):
+    # None si el modelo falló o no respondió nada
+    try:
+        return ollama.generate(prompt, model, options={"num_ctx": MODEL_CONTEXT}).strip() or None
+    except (OllamaError, requests.RequestException) as e:
+        print(f"❌ Error al consultar Ollama: {e}")
+        return None
+
+def query_ollama_cached(template, block, model=MODEL):
+    # Las fallas (None) no se guardan
+    return cache.get_or_compute(
+        llm_key(model, template, block), "llm",
+        lambda: query_ollama(template + block, model),
+    )
+
+def output_paths(pdf_name):
+    word_path = os.path.join(output_folder, pdf_name.replace(".pdf", ".docx"))
+    return word_path, os.path.splitext(word_path)[0] + ".pdf"
+
+def save_word(pdf_name, results):
+    # Cada resultado se escribe en cuanto llega, en el orden del documento
+    word_path, _ = output_paths(pdf_name)
+    total_blocks = 0
+    with DocxStreamWriter(word_path, f"Requisitos extraídos de la convocatoria: {pdf_name}") as writer:
+        for result in results:
+            writer.add_paragraph(result)
+            total_blocks += 1
+    print(f"💾 Resultado guardado en Word: {word_path} ({total_blocks} bloque(s)).")
+    return word_path
+
+def process_block(pdf_file, i, block):
+    result = query_ollama_cached(REQUIREMENTS_PROMPT, block)
+    if result is None:
+        print(f"❌ {pdf_file}: bloque {i} sin respuesta del modelo.")
+        return None, estimate_tokens(REQUIREMENTS_PROMPT + block)
+    print(f"✅ {pdf_file}: bloque {i} procesado, {len(result)} caracteres obtenidos.")
+    return result, estimate_tokens(REQUIREMENTS_PROMPT + block) + estimate_tokens(result)
+
+def document_key(pdf_path):
+    # Mismo PDF, misma configuración: mismos resultados
+    return digest(
+        file_digest(pdf_path), OCR_SIGNATURE, CHUNKER_VERSION, CHUNK_TOKENS, CHUNK_OVERLAP_TOKENS,
+        MODEL, REQUIREMENTS_PROMPT,
+    )
+
+def outputs_exist(pdf_file):
+    return all(os.path.exists(p) for p in output_paths(pdf_file))
+
+def process_document(batch, pdf_path):
+    pdf_file = os.path.basename(pdf_path)
+    counts = {"pages": count_pages(pdf_path), "blocks": 0, "tokens": 0}
+    print(f"🔹 Procesando archivo: {pdf_file} ({counts['pages']} páginas)")
+
+    failed = 0
+
+    def counted(results):
+        nonlocal failed
+        for result, tokens in results:
+            counts["blocks"] += 1
+            counts["tokens"] += tokens
+            if result is None:
+                failed += 1
+                continue
+            yield result
+
+    # Páginas, bloques, respuestas y Word avanzan juntos: cada página se
+    # suelta en cuanto sus bloques se escriben, así la memoria no crece con
+    # el tamaño del PDF
+    pages = staged(extract_pages_from_pdf(batch, pdf_path), "extract")
+    blocks = staged(split_into_blocks(pages), "chunk", inner=pages)
+    results = staged(map_ordered(
+        batch.llm_pool, lambda item: process_block(pdf_file, *item), enumerate(blocks, start=1),
+        batch.args.llm_workers * BLOCKS_PER_LLM_WORKER, check=batch.check,
+    ), "generate", inner=blocks)
+    word_path = save_word(pdf_file, counted(results))
+    if failed:
+        raise BlocksFailed(failed, counts["blocks"])
+
+    # LibreOffice junta en un lote los Word de los documentos que terminan
+    # al mismo tiempo; el documento queda registrado cuando su PDF está listo
+    conversion = converter.submit(word_path, output_folder)
+    conversion.add_done_callback(report_conversion)
+    return counts, conversion
+
+def report_conversion(future):
+    if not future.cancelled() and future.exception() is None:
+        print(f"💾 Resultado convertido a PDF: {future.result()}")
+
+def main(argv=None):
+    global pdf_folder, output_folder, ollama, cache
+    args = batch_parser(
+        "Extrae los requisitos de las convocatorias en PDF a Word y PDF",
+        pdf_folder, output_folder, DOCUMENT_WORKERS, EXTRACT_WORKERS, OLLAMA_CONCURRENCY, CACHE_DB,
+    ).parse_args(argv)
+    pdf_folder, output_folder = args.input, args.output
+    cache = PipelineCache(args.cache, CACHE_MAX_MB * 1024 * 1024)
+    if args.llm_workers != OLLAMA_CONCURRENCY:
+        # Una conexión al servidor por consulta simultánea
+        ollama = OllamaClient(OLLAMA_URL, model=MODEL, timeout=OLLAMA_TIMEOUT, pool_size=args.llm_workers)
+
+    try:
+        with Batch(args) as batch:
+            stats = batch.run(process_document, document_key, outputs_exist)
+    finally:
+        converter.close()
+
+    if stats.counts["failed"] == 0:
+        print("\n🏁 Todos los archivos PDF han sido procesados correctamente.")
+
+if __name__ == "__main__":
+    main()
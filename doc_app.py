@@ -1,135 +1,289 @@
-import os
-import re
-import pytesseract
-import fitz  # PyMuPDF
-from PIL import Image
-import tempfile
-import subprocess
-from docx import Document
-from flask import Flask, render_template, request, jsonify
-from werkzeug.utils import secure_filename
-
-# Configuración Flask
-app = Flask(__name__)
-UPLOAD_FOLDER = r"D:\Ussicamm\AI\pdfs"
-OUTPUT_FOLDER = r"D:\Ussicamm\AI\results_word"
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-os.makedirs(OUTPUT_FOLDER, exist_ok=True)
-app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
-
-# Ajusta Tesseract
-pytesseract.pytesseract.tesseract_cmd = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
-os.environ["TESSDATA_PREFIX"] = r"C:\Program Files\Tesseract-OCR\tessdata"
-
-MAX_CHARS = 2000
-
-def clean_text(text):
-    text = re.sub(r'[^\x20-\x7EÁÉÍÓÚáéíóúÜüÑñ.,;:!?()\-–—\n]', '', text)
-    text = re.sub(r'\s+', ' ', text)
-    text = re.sub(r'(\S{50,})', lambda m: m.group(1)[:50] + '-', text)
-    return text.strip()
-
-def extract_text_from_pdf(pdf_path):
-    logs = []
-    logs.append("🔹 Abriendo PDF para extracción de texto...")
-    text = ""
-    pdf_doc = fitz.open(pdf_path)
-    total_pages = len(pdf_doc)
-    logs.append(f"📄 Total de páginas: {total_pages}")
-
-    for page_num in range(total_pages):
-        logs.append(f"➡ Procesando página {page_num + 1}/{total_pages}...")
-        page = pdf_doc.load_page(page_num)
-
-        page_text = page.get_text()
-        if page_text.strip():
-            text += page_text + "\n"
-        else:
-            pix = page.get_pixmap(dpi=300)
-            with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as tmp_img:
-                tmp_img.write(pix.tobytes())
-                tmp_img_path = tmp_img.name
-
-            img = Image.open(tmp_img_path).convert("L")
-            img = img.point(lambda x: 0 if x < 140 else 255, '1')
-            custom_config = r'--psm 6'
-            ocr_text = pytesseract.image_to_string(img, lang="spa+eng", config=custom_config)
-            text += ocr_text + "\n"
-            os.remove(tmp_img_path)
-
-    pdf_doc.close()
-    text = clean_text(text)
-    logs.append(f"✅ Extracción completa, {len(text)} caracteres obtenidos.")
-    return text, logs
-
-def split_into_blocks(text, max_chars=MAX_CHARS):
-    return [text[i:i+max_chars] for i in range(0, len(text), max_chars)]
-
-def query_ollama(prompt, model="deepseek-llm:7b"):
-    process = subprocess.Popen(
-        ["ollama", "run", model],
-        stdin=subprocess.PIPE,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.DEVNULL
-    )
-    output_bytes, _ = process.communicate(input=prompt.encode('utf-8'))
-    return output_bytes.decode('utf-8', errors='ignore').strip()
-
-def save_word_and_convert_to_pdf(pdf_name, analysis_results):
-    doc = Document()
-    doc.add_heading(f"Requisitos extraídos de la convocatoria: {pdf_name}", level=1)
-    doc.add_paragraph(analysis_results)
-    word_path = os.path.join(OUTPUT_FOLDER, pdf_name.replace(".pdf", ".docx"))
-    doc.save(word_path)
-
-    subprocess.run([
-        r"C:\Program Files\LibreOffice\program\soffice.exe", "--headless",
-        "--convert-to", "pdf", word_path, "--outdir", OUTPUT_FOLDER
-    ], check=True)
-
-@app.route("/")
-def index():
-    return render_template("index_doc.html")
-
-@app.route("/upload", methods=["POST"])
-def upload_pdf():
-    if "pdf" not in request.files:
-        return jsonify({"error": "No se envió archivo"})
-    file = request.files["pdf"]
-    if file.filename == "":
-        return jsonify({"error": "Nombre de archivo vacío"})
-    filename = secure_filename(file.filename)
-    file.save(os.path.join(app.config["UPLOAD_FOLDER"], filename))
-    return jsonify({"message": f"Archivo {filename} subido correctamente"})
-
-@app.route("/process", methods=["POST"])
-def process_pdfs():
-    logs_total = []
-    pdfs = [f for f in os.listdir(UPLOAD_FOLDER) if f.lower().endswith(".pdf")]
-    if not pdfs:
-        return jsonify({"logs": ["⚠ No se encontraron PDFs en la carpeta de subida."]})
-
-    for pdf_file in pdfs:
-        logs_total.append(f"🔹 Procesando {pdf_file}...")
-        pdf_path = os.path.join(UPLOAD_FOLDER, pdf_file)
-        text, logs = extract_text_from_pdf(pdf_path)
-        logs_total.extend(logs)
-        blocks = split_into_blocks(text)
-
-        full_analysis = ""
-        for i, block in enumerate(blocks, start=1):
-            logs_total.append(f"🤖 Procesando bloque {i}/{len(blocks)} con Ollama...")
-            prompt = (
-                "Extrae únicamente los requisitos de la convocatoria en el siguiente texto. "
-                "No agregues encabezados ni numeraciones:\n\n" + block
-            )
-            result = query_ollama(prompt)
-            full_analysis += result + "\n\n"
-
-        save_word_and_convert_to_pdf(pdf_file, full_analysis)
-        logs_total.append(f"✅ {pdf_file} completado.")
-
-    return jsonify({"logs": logs_total})
-
-if __name__ == "__main__":
-    app.run(debug=True)
+import json
+import os
+import re
+import pytesseract
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from flask import Flask, Response, render_template, request, jsonify, stream_with_context
+from werkzeug.utils import secure_filename
+import metrics
+from chunker import CHUNKER_VERSION, chunk_pages
+from doc_jobs import FINISHED, JobQueue
+from doc_pipeline import DocxStreamWriter, map_ordered, staged
+from ollama_client import OllamaClient, OllamaError
+from pdf_convert import ConversionError, OfficeConverter
+from pdf_extract import OCR_SIGNATURE, count_pages, iter_pages
+from pipeline_cache import PipelineCache, digest, file_digest, llm_key
+
+# Configuración Flask
+app = Flask(__name__)
+UPLOAD_FOLDER = r"D:\Ussicamm\AI\pdfs"
+OUTPUT_FOLDER = r"D:\Ussicamm\AI\results_word"
+os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+os.makedirs(OUTPUT_FOLDER, exist_ok=True)
+app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
+
+# Ajusta Tesseract
+pytesseract.pytesseract.tesseract_cmd = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
+os.environ["TESSDATA_PREFIX"] = r"C:\Program Files\Tesseract-OCR\tessdata"
+
+# Tamaño de cada bloque en tokens del modelo y cuánto se repite del bloque
+# anterior. deepseek-llm:7b tiene 4096 tokens de contexto: el bloque, el
+# prompt y la respuesta deben caber juntos
+CHUNK_TOKENS = 1500
+CHUNK_OVERLAP_TOKENS = 0
+MODEL_CONTEXT = 4096
+
+# Procesos para extraer y hacer OCR de páginas en paralelo (1 = en serie)
+EXTRACT_WORKERS = os.cpu_count() or 1
+PAGES_PER_TASK = 4
+
+# Caché de texto extraído, OCR y respuestas del modelo por hash de contenido
+# (inspeccionar o limpiar con: python pipeline_cache.py --db ... stats|clear).
+# Se abre en start(), junto con la cola de trabajos que la usa
+CACHE_DB = r"D:\Ussicamm\AI\pipeline_cache.db"
+CACHE_MAX_MB = 512
+cache = None
+
+MODEL = "deepseek-llm:7b"
+OLLAMA_URL = "http://localhost:11434"
+# Bloques que se mandan al modelo al mismo tiempo, sumando todas las
+# solicitudes (ajustar junto con OLLAMA_NUM_PARALLEL del servidor)
+OLLAMA_CONCURRENCY = 2
+OLLAMA_TIMEOUT = (5, 600)
+ollama = OllamaClient(OLLAMA_URL, model=MODEL, timeout=OLLAMA_TIMEOUT, pool_size=OLLAMA_CONCURRENCY)
+llm_pool = ThreadPoolExecutor(max_workers=OLLAMA_CONCURRENCY)
+# Bloques pendientes como máximo por archivo; mientras estén todos ocupados
+# no se extraen más páginas
+BLOCKS_IN_FLIGHT = OLLAMA_CONCURRENCY * 2
+
+# Una sola instancia de LibreOffice convierte todos los Word a PDF (la ruta
+# a soffice se toma de SOFFICE_PATH, del PATH o de la instalación por omisión)
+converter = OfficeConverter()
+# Trabajos de /process: se ejecutan en segundo plano y su estado y avance
+# se guardan aquí, así sobreviven a un reinicio del servidor
+JOBS_DB = r"D:\Ussicamm\AI\jobs.db"
+JOB_WORKERS = 1
+# Cada cuánto se revisa si se canceló el trabajo mientras se espera al modelo
+JOB_POLL_SECONDS = 1.0
+REQUIREMENTS_PROMPT = (
+    "Extrae únicamente los requisitos de la convocatoria en el siguiente texto. "
+    "No agregues encabezados ni numeraciones:\n\n"
+)
+
+def clean_text(text):
+    text = re.sub(r'[^\x20-\x7EÁÉÍÓÚáéíóúÜüÑñ.,;:!?()\-–—\n]', '', text)
+    text = re.sub(r'\s+', ' ', text)
+    text = re.sub(r'(\S{50,})', lambda m: m.group(1)[:50] + '-', text)
+    return text.strip()
+
+def extract_pages_from_pdf(job, pdf_file, pdf_path):
+    job.log("🔹 Abriendo PDF para extracción de texto...")
+    total_pages = count_pages(pdf_path)
+    job.log(f"📄 Total de páginas: {total_pages}")
+    done = 0
+
+    def report_pages(start, stop, total):
+        nonlocal done
+        done += stop - start
+        job.progress(pdf_file, "pages", done, total)
+        if stop == total:
+            job.log("✅ Extracción completa.")
+        job.check()
+
+    # Las páginas se extraen conforme el resto del proceso las va pidiendo
+    return iter_pages(
+        pdf_path, workers=EXTRACT_WORKERS, pages_per_task=PAGES_PER_TASK,
+        progress=report_pages, cache=cache,
+    )
+
+def split_into_blocks(pages):
+    # Bloques que respetan títulos, listas y párrafos del PDF
+    return chunk_pages(pages, CHUNK_TOKENS, CHUNK_OVERLAP_TOKENS, clean=clean_text)
+
+def query_ollama(prompt, model=MODEL):
+    # None si el modelo falló o no respondió nada
+    try:
+        return ollama.generate(prompt, model, options={"num_ctx": MODEL_CONTEXT}).strip() or None
+    except (OllamaError, requests.RequestException):
+        return None
+
+def query_ollama_cached(template, block, model=MODEL):
+    # Las fallas (None) no se guardan
+    return cache.get_or_compute(
+        llm_key(model, template, block), "llm",
+        lambda: query_ollama(template + block, model),
+    )
+
+def output_paths(pdf_name):
+    word_path = os.path.join(OUTPUT_FOLDER, pdf_name.replace(".pdf", ".docx"))
+    return word_path, os.path.splitext(word_path)[0] + ".pdf"
+
+def save_word(job, pdf_name, results):
+    # Cada resultado se escribe en cuanto llega, en el orden del documento.
+    # Devuelve la ruta y cuántos bloques se quedaron sin respuesta
+    word_path, _ = output_paths(pdf_name)
+    failed = 0
+    with DocxStreamWriter(word_path, f"Requisitos extraídos de la convocatoria: {pdf_name}") as writer:
+        for i, result in enumerate(results, start=1):
+            if result is None:
+                failed += 1
+            else:
+                writer.add_paragraph(result)
+            # El total de bloques no se conoce hasta terminar de leer el PDF
+            job.progress(pdf_name, "blocks", i, None)
+    return word_path, failed
+
+@app.route("/")
+def index():
+    return render_template("index_doc.html")
+
+@app.route("/upload", methods=["POST"])
+def upload_pdf():
+    if "pdf" not in request.files:
+        return jsonify({"error": "No se envió archivo"})
+    file = request.files["pdf"]
+    if file.filename == "":
+        return jsonify({"error": "Nombre de archivo vacío"})
+    filename = secure_filename(file.filename)
+    file.save(os.path.join(app.config["UPLOAD_FOLDER"], filename))
+    return jsonify({"message": f"Archivo {filename} subido correctamente"})
+
+def query_requirements(block):
+    return query_ollama_cached(REQUIREMENTS_PROMPT, block)
+
+def process_job(job):
+    conversions = []
+    failed = []
+    for pdf_file in job.params["files"]:
+        job.check()
+        job.log(f"🔹 Procesando {pdf_file}...")
+        pdf_path = os.path.join(UPLOAD_FOLDER, pdf_file)
+        if not os.path.exists(pdf_path):
+            job.log(f"⚠ {pdf_file} ya no está en la carpeta de subida, se omite.")
+            continue
+
+        # Mismo PDF, misma configuración y resultados ya generados: se omite
+        done_key = "done:" + digest(
+            file_digest(pdf_path), OCR_SIGNATURE, CHUNKER_VERSION, CHUNK_TOKENS,
+            CHUNK_OVERLAP_TOKENS, MODEL, REQUIREMENTS_PROMPT,
+        )
+        if cache.get(done_key) and all(os.path.exists(p) for p in output_paths(pdf_file)):
+            job.log(f"⏭ {pdf_file} no cambió desde la última vez, se omite.")
+            continue
+
+        # Páginas, bloques, respuestas y Word avanzan juntos: cada página se
+        # suelta en cuanto sus bloques se escriben. Al cancelar o fallar, los
+        # bloques que no han empezado ya no van al modelo.
+        job.log("🤖 Enviando bloques a Ollama conforme se extraen las páginas...")
+        pages = staged(extract_pages_from_pdf(job, pdf_file, pdf_path), "extract")
+        blocks = staged(split_into_blocks(pages), "chunk", inner=pages)
+        results = staged(map_ordered(llm_pool, query_requirements, blocks, BLOCKS_IN_FLIGHT,
+                                     check=job.check, poll=JOB_POLL_SECONDS), "generate", inner=blocks)
+        with closing(results):
+            word_path, failed_blocks = save_word(job, pdf_file, results)
+        if failed_blocks:
+            # Sin marcarlo como terminado: la próxima vez se repiten solo
+            # los bloques que fallaron (los demás están en la caché)
+            job.log(f"❌ {pdf_file}: {failed_blocks} bloque(s) sin respuesta del modelo.")
+            failed.append(pdf_file)
+            continue
+
+        # La conversión a PDF corre aparte mientras se procesa el siguiente
+        job.log(f"📝 {pdf_file} en cola para convertir a PDF.")
+        conversions.append((pdf_file, done_key, converter.submit(word_path, OUTPUT_FOLDER)))
+
+    for pdf_file, done_key, future in conversions:
+        try:
+            future.result()
+        except ConversionError as e:
+            job.log(f"❌ Error al convertir {pdf_file} a PDF: {e}")
+            failed.append(pdf_file)
+            continue
+        cache.put(done_key, "done", pdf_file)
+        job.log(f"✅ {pdf_file} completado.")
+    if failed:
+        raise RuntimeError(f"No se pudieron procesar: {', '.join(failed)}")
+
+jobs = JobQueue(process_job, JOBS_DB, JOB_WORKERS)
+
+@app.route("/process", methods=["POST"])
+def process_pdfs():
+    pdfs = [f for f in os.listdir(UPLOAD_FOLDER) if f.lower().endswith(".pdf")]
+    if not pdfs:
+        return jsonify({"logs": ["⚠ No se encontraron PDFs en la carpeta de subida."]})
+    job_id = jobs.submit({"files": pdfs})
+    return jsonify({"job_id": job_id}), 202
+
+@app.route("/jobs")
+def list_jobs():
+    return jsonify({"jobs": jobs.recent()})
+
+@app.route("/jobs/<job_id>")
+def job_status(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Trabajo no encontrado"}), 404
+    return jsonify(job)
+
+@app.route("/jobs/<job_id>/events")
+def job_events(job_id):
+    status = jobs.status(job_id)
+    if status is None:
+        return jsonify({"error": "Trabajo no encontrado"}), 404
+    # EventSource manda Last-Event-ID al reconectarse: solo se envía lo nuevo
+    try:
+        after = int(request.headers.get("Last-Event-ID") or request.args.get("after") or 0)
+    except ValueError:
+        after = 0
+    if status in FINISHED and not jobs.events(job_id, after):
+        # 204 le indica al navegador que deje de reconectarse
+        return "", 204
+
+    def events():
+        for item in jobs.follow(job_id, after):
+            if item is None:
+                yield ": ping\n\n"
+                continue
+            seq, data = item
+            yield f"id: {seq}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.route("/jobs/<job_id>/cancel", methods=["POST"])
+def cancel_job(job_id):
+    if not jobs.cancel(job_id):
+        return jsonify({"error": "El trabajo no existe o ya terminó"}), 409
+    return jsonify({"message": "⏹ Cancelando trabajo..."})
+
+@app.route("/metrics")
+def metrics_endpoint():
+    return Response(metrics.registry.render(), mimetype=metrics.PROMETHEUS_CONTENT_TYPE)
+
+def shutdown():
+    # Para gunicorn (ver gunicorn_doc.py). El trabajo en curso queda como
+    # "running" en JOBS_DB y se retoma al arrancar de nuevo
+    llm_pool.shutdown(cancel_futures=True)
+    converter.close()
+    ollama.close()
+
+def start():
+    global cache
+    cache = PipelineCache(CACHE_DB, CACHE_MAX_MB * 1024 * 1024)
+    jobs.start()
+
+# Con FLASK_DEBUG=1 el recargador ejecuta este archivo también en el proceso
+# que vigila los cambios; ahí no deben correr trabajos
+if (__name__ != "__main__" or os.environ.get("FLASK_DEBUG") != "1"
+        or os.environ.get("WERKZEUG_RUN_MAIN") == "true"):
+    start()
+
+if __name__ == "__main__":
+    # Servidor de desarrollo (FLASK_DEBUG=1 activa el depurador y el
+    # recargador); en producción: gunicorn -c gunicorn_doc.py
+    app.run(debug=os.environ.get("FLASK_DEBUG") == "1")
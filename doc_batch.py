@@ -0,0 +1,218 @@
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed, wait
+import metrics
+from pdf_extract import extraction_pool
+
+MANIFEST_NAME = "manifest.jsonl"
+METRICS_NAME = "metrics.json"
+
+class BatchInterrupted(Exception):
+    pass
+
+class BlocksFailed(Exception):
+    # Algún bloque se quedó sin respuesta del modelo: el documento no se
+    # registra como terminado para que la siguiente corrida lo repita
+    def __init__(self, failed, total):
+        super().__init__(f"{failed} de {total} bloque(s) sin respuesta del modelo")
+        self.failed = failed
+        self.total = total
+
+def batch_parser(description, input_dir, output_dir, documents, ocr_workers, llm_workers, cache_db=None):
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--input", default=input_dir, help="Carpeta con los PDF")
+    parser.add_argument("--output", default=output_dir, help="Carpeta para los resultados")
+    parser.add_argument("--docs", type=int, default=documents, help="Documentos en proceso al mismo tiempo")
+    parser.add_argument("--ocr-workers", type=int, default=ocr_workers,
+                        help="Procesos para extraer texto y hacer OCR, compartidos por todos los documentos")
+    parser.add_argument("--llm-workers", type=int, default=llm_workers,
+                        help="Consultas simultáneas al modelo, compartidas por todos los documentos")
+    parser.add_argument("--manifest", help=f"Registro de archivos terminados (por omisión {MANIFEST_NAME} en --output)")
+    parser.add_argument("--force", action="store_true", help="Procesa de nuevo los archivos ya registrados")
+    parser.add_argument("--metrics", help=f"Resumen de tiempos por etapa en JSON (por omisión {METRICS_NAME} en --output)")
+    if cache_db is not None:
+        parser.add_argument("--cache", default=cache_db, help="Caché de texto extraído, OCR y respuestas del modelo")
+    return parser
+
+class Manifest:
+    # Registro de archivos terminados, un JSON por renglón con la llave de
+    # la configuración con que se hicieron. Cada archivo se agrega en cuanto
+    # termina, así una corrida interrumpida se retoma donde se quedó.
+    def __init__(self, path):
+        self.path = path
+        self._done = {}
+        self._lock = threading.Lock()
+        if not os.path.exists(path):
+            return
+        with open(path, encoding="utf-8") as f:
+            content = f.read()
+        for line in content.splitlines():
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # Renglón a medias de una corrida que se cortó
+                continue
+            self._done[entry["file"]] = entry["key"]
+        if content and not content.endswith("\n"):
+            with open(path, "a", encoding="utf-8") as f:
+                f.write("\n")
+
+    def is_done(self, name, key):
+        return self._done.get(name) == key
+
+    def record(self, name, key, **stats):
+        entry = {"file": name, "key": key, "finished": time.time(), **stats}
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._done[name] = key
+
+class BatchStats:
+    def __init__(self):
+        self.started = time.monotonic()
+        self.counts = {"documents": 0, "skipped": 0, "failed": 0, "pages": 0, "blocks": 0, "tokens": 0}
+        self._lock = threading.Lock()
+
+    def add(self, **counts):
+        with self._lock:
+            for name, value in counts.items():
+                self.counts[name] += value
+
+    def elapsed(self):
+        return max(time.monotonic() - self.started, 1e-9)
+
+    def summary(self):
+        elapsed = self.elapsed()
+        c = self.counts
+        return (
+            f"📊 {c['documents']} documento(s) procesados, {c['skipped']} omitidos y "
+            f"{c['failed']} con error en {elapsed:.1f} s\n"
+            f"   {c['pages']} páginas ({c['pages'] / elapsed:.2f} páginas/s), "
+            f"{c['blocks']} bloques ({c['blocks'] / elapsed:.2f} bloques/s), "
+            f"~{c['tokens']} tokens ({c['tokens'] / elapsed:.0f} tokens/s)"
+        )
+
+class Batch:
+    # Procesa una carpeta de PDF con varios documentos a la vez. Los
+    # documentos comparten dos límites independientes: un pool de procesos
+    # para la extracción y el OCR (CPU) y un pool de hilos para las consultas
+    # al modelo (E/S), así mientras un documento está en OCR otro puede estar
+    # esperando al modelo sin que ninguno de los dos se sature.
+    def __init__(self, args):
+        self.args = args
+        os.makedirs(args.output, exist_ok=True)
+        self.manifest = Manifest(args.manifest or os.path.join(args.output, MANIFEST_NAME))
+        self.stats = BatchStats()
+        self.ocr_pool = None
+        self.llm_pool = None
+        self._stop = threading.Event()
+        self._pending = []
+
+    def __enter__(self):
+        if self.args.ocr_workers > 1:
+            self.ocr_pool = extraction_pool(self.args.ocr_workers)
+        self.llm_pool = ThreadPoolExecutor(max_workers=self.args.llm_workers)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.llm_pool.shutdown(cancel_futures=True)
+        if self.ocr_pool is not None:
+            self.ocr_pool.shutdown(cancel_futures=True)
+
+    def check(self):
+        # Para map_ordered: corta los documentos en curso tras un Ctrl+C
+        if self._stop.is_set():
+            raise BatchInterrupted()
+
+    def run(self, process_document, document_key, outputs_exist=None):
+        # process_document(batch, pdf_path) devuelve los conteos del
+        # documento (pages, blocks, tokens), o (conteos, future) si le falta
+        # un paso que termina después (p. ej. la conversión a PDF, que junta
+        # varios documentos en un lote): se registra cuando el future
+        # termina bien. document_key(pdf_path) identifica el archivo y la
+        # configuración para el registro de terminados
+        pdfs = sorted(f for f in os.listdir(self.args.input) if f.lower().endswith(".pdf"))
+        if not pdfs:
+            print(f"⚠ No se encontraron archivos PDF en la carpeta: {self.args.input}")
+            return self.stats
+        print(f"📂 Se encontraron {len(pdfs)} archivo(s) PDF para procesar "
+              f"({self.args.docs} a la vez, OCR: {self.args.ocr_workers}, modelo: {self.args.llm_workers}).")
+
+        with ThreadPoolExecutor(max_workers=self.args.docs) as documents:
+            futures = [
+                documents.submit(self._process, pdf_file, process_document, document_key, outputs_exist)
+                for pdf_file in pdfs
+            ]
+            try:
+                for future in as_completed(futures):
+                    future.result()
+                wait(self._pending)
+            except KeyboardInterrupt:
+                print("\n⏹ Interrumpido: se terminan los bloques en curso y se guarda el registro.")
+                self._stop.set()
+                documents.shutdown(cancel_futures=True)
+                raise
+            finally:
+                print("\n" + self.stats.summary())
+                self.save_metrics()
+        return self.stats
+
+    def save_metrics(self):
+        path = self.args.metrics or os.path.join(self.args.output, METRICS_NAME)
+        summary = {
+            "finished": time.time(),
+            "seconds": round(self.stats.elapsed(), 3),
+            "counts": self.stats.counts,
+            "metrics": metrics.registry.summary(),
+        }
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        print(f"📈 Métricas guardadas en: {path}")
+
+    def _process(self, pdf_file, process_document, document_key, outputs_exist):
+        if self._stop.is_set():
+            return
+        pdf_path = os.path.join(self.args.input, pdf_file)
+        try:
+            key = document_key(pdf_path)
+            if (not self.args.force and self.manifest.is_done(pdf_file, key)
+                    and (outputs_exist is None or outputs_exist(pdf_file))):
+                print(f"⏭ {pdf_file} ya está en el registro con la misma configuración, se omite.")
+                self.stats.add(skipped=1)
+                return
+            started = time.monotonic()
+            counts = process_document(self, pdf_path)
+        except BatchInterrupted:
+            return
+        except Exception as e:
+            print(f"❌ Error al procesar {pdf_file}: {e}")
+            self.stats.add(failed=1)
+            return
+        if isinstance(counts, tuple):
+            counts, future = counts
+            finished = Future()
+            self._pending.append(finished)
+
+            def done(future):
+                try:
+                    error = "cancelado" if future.cancelled() else future.exception()
+                    self._finish(pdf_file, key, started, counts, error)
+                finally:
+                    finished.set_result(None)
+
+            future.add_done_callback(done)
+        else:
+            self._finish(pdf_file, key, started, counts)
+
+    def _finish(self, pdf_file, key, started, counts, error=None):
+        if error is not None:
+            print(f"❌ Error al procesar {pdf_file}: {error}")
+            self.stats.add(failed=1)
+            return
+        seconds = round(time.monotonic() - started, 3)
+        self.manifest.record(pdf_file, key, seconds=seconds, **counts)
+        self.stats.add(documents=1, **counts)
+        print(f"🎯 Archivo {pdf_file} completado en {seconds:.1f} s.")
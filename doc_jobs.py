@@ -0,0 +1,255 @@
+import json
+import queue
+import threading
+import time
+import uuid
+import sqlite_util
+
+JOBS_DB = "jobs.db"
+JOB_WORKERS = 1
+# Los trabajos terminados (y sus eventos) se borran después de estos días
+JOB_RETENTION_DAYS = 7
+
+QUEUED = "queued"
+RUNNING = "running"
+CANCELLING = "cancelling"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    params TEXT NOT NULL,
+    error TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs(status);
+CREATE TABLE IF NOT EXISTS job_events (
+    job_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    created REAL NOT NULL,
+    PRIMARY KEY (job_id, seq)
+);
+"""
+
+class JobCancelled(Exception):
+    pass
+
+class Job:
+    # Lo que recibe la función que ejecuta el trabajo: sus parámetros, una
+    # forma de publicar eventos y de saber si se pidió cancelarlo.
+    def __init__(self, jobs, job_id, params):
+        self.id = job_id
+        self.params = params
+        self._jobs = jobs
+        self._cancel = threading.Event()
+
+    def emit(self, **data):
+        self._jobs._emit(self.id, data)
+
+    def log(self, message):
+        self.emit(type="log", message=message)
+
+    def progress(self, file, stage, done, total):
+        self.emit(type="progress", file=file, stage=stage, done=done, total=total)
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def check(self):
+        if self._cancel.is_set():
+            raise JobCancelled()
+
+class JobQueue:
+    # Cola de trabajos en segundo plano. El estado y los eventos de cada
+    # trabajo se guardan en SQLite: los clientes pueden reconectarse y pedir
+    # los eventos desde el último que vieron, y al reiniciar el servidor los
+    # trabajos que no terminaron se vuelven a encolar.
+    def __init__(self, runner, path=JOBS_DB, workers=JOB_WORKERS, timeout=30.0):
+        self.runner = runner
+        self.path = path
+        self.workers = workers
+        self.timeout = timeout
+        self._local = threading.local()
+        self._queue = queue.Queue()
+        self._active = {}
+        self._lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._version = 0
+        self._threads = []
+        self._conn().executescript(SCHEMA)
+
+    def _conn(self):
+        return sqlite_util.connection(self._local, self.path, self.timeout)
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            self._prune()
+            self._resume()
+            for _ in range(self.workers):
+                thread = threading.Thread(target=self._worker, daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _prune(self):
+        cutoff = time.time() - JOB_RETENTION_DAYS * 86400
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            old = [row[0] for row in conn.execute(
+                f"SELECT id FROM jobs WHERE status IN ({','.join('?' * len(FINISHED))}) AND updated < ?",
+                FINISHED + (cutoff,),
+            )]
+            for job_id in old:
+                conn.execute("DELETE FROM job_events WHERE job_id = ?", (job_id,))
+                conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+    def _resume(self):
+        # Lo que quedó a medias se repite completo; la caché del pipeline
+        # hace que las páginas y bloques ya procesados no cuesten de nuevo
+        rows = self._conn().execute(
+            "SELECT id, status, params FROM jobs WHERE status IN (?, ?, ?) ORDER BY created",
+            (QUEUED, RUNNING, CANCELLING),
+        ).fetchall()
+        for job_id, status, params in rows:
+            if status == CANCELLING:
+                self._emit(job_id, {"type": "status", "status": CANCELLED}, status=CANCELLED)
+                continue
+            if status == RUNNING:
+                self._emit(job_id, {"type": "log", "message": "🔁 El servidor se reinició, se retoma el trabajo."},
+                           status=QUEUED)
+            self._enqueue(Job(self, job_id, json.loads(params)))
+
+    def _enqueue(self, job):
+        self._active[job.id] = job
+        self._queue.put(job)
+
+    def submit(self, params):
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        self._conn().execute(
+            "INSERT INTO jobs (id, status, params, created, updated) VALUES (?, ?, ?, ?, ?)",
+            (job_id, QUEUED, json.dumps(params, ensure_ascii=False), now, now),
+        )
+        self._emit(job_id, {"type": "status", "status": QUEUED})
+        self._enqueue(Job(self, job_id, params))
+        return job_id
+
+    def cancel(self, job_id):
+        job = self._active.get(job_id)
+        status = self.status(job_id)
+        if status in (None,) + FINISHED:
+            return False
+        if status == QUEUED:
+            # Todavía no arranca: el worker lo descarta al sacarlo de la cola
+            self._emit(job_id, {"type": "status", "status": CANCELLED}, status=CANCELLED)
+        else:
+            self._emit(job_id, {"type": "status", "status": CANCELLING}, status=CANCELLING)
+        if job is not None:
+            job._cancel.set()
+        return True
+
+    def _emit(self, job_id, data, status=None, error=None):
+        # El evento y el cambio de estado van en la misma transacción, así
+        # quien lee los eventos nunca ve el trabajo terminado sin su evento final
+        conn = self._conn()
+        now = time.time()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "INSERT INTO job_events (job_id, seq, data, created) "
+                "SELECT ?, coalesce(max(seq), 0) + 1, ?, ? FROM job_events WHERE job_id = ?",
+                (job_id, json.dumps(data, ensure_ascii=False), now, job_id),
+            )
+            if status is not None:
+                conn.execute(
+                    "UPDATE jobs SET status = ?, error = coalesce(?, error), updated = ? WHERE id = ?",
+                    (status, error, now, job_id),
+                )
+            else:
+                conn.execute("UPDATE jobs SET updated = ? WHERE id = ?", (now, job_id))
+        with self._cond:
+            self._version += 1
+            self._cond.notify_all()
+
+    def status(self, job_id):
+        row = self._conn().execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row[0] if row else None
+
+    def get(self, job_id):
+        row = self._conn().execute(
+            "SELECT id, status, params, error, created, updated FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        return self._as_dict(row) if row else None
+
+    def recent(self, limit=20):
+        rows = self._conn().execute(
+            "SELECT id, status, params, error, created, updated FROM jobs ORDER BY created DESC LIMIT ?",
+            (limit,),
+        ).fetchall()
+        return [self._as_dict(row) for row in rows]
+
+    def _as_dict(self, row):
+        job_id, status, params, error, created, updated = row
+        return {
+            "id": job_id, "status": status, "params": json.loads(params),
+            "error": error, "created": created, "updated": updated,
+        }
+
+    def events(self, job_id, after=0):
+        rows = self._conn().execute(
+            "SELECT seq, data FROM job_events WHERE job_id = ? AND seq > ? ORDER BY seq",
+            (job_id, after),
+        ).fetchall()
+        return [(seq, json.loads(data)) for seq, data in rows]
+
+    def follow(self, job_id, after=0, heartbeat=15.0):
+        # Genera (seq, evento) hasta que el trabajo termina; cada `heartbeat`
+        # segundos sin novedades genera None para mantener viva la conexión
+        while True:
+            with self._cond:
+                version = self._version
+            events = self.events(job_id, after)
+            for seq, data in events:
+                yield seq, data
+                after = seq
+            if events:
+                continue
+            if self.status(job_id) in (None,) + FINISHED:
+                return
+            with self._cond:
+                woke = self._version != version or self._cond.wait(heartbeat)
+            if not woke:
+                yield None
+
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            try:
+                self._run(job)
+            finally:
+                self._active.pop(job.id, None)
+
+    def _run(self, job):
+        if self.status(job.id) != QUEUED:
+            return
+        self._emit(job.id, {"type": "status", "status": RUNNING}, status=RUNNING)
+        try:
+            job.check()
+            self.runner(job)
+            job.check()
+        except JobCancelled:
+            self._emit(job.id, {"type": "status", "status": CANCELLED}, status=CANCELLED)
+        except Exception as e:
+            self._emit(job.id, {"type": "status", "status": FAILED, "error": str(e)},
+                       status=FAILED, error=str(e))
+        else:
+            self._emit(job.id, {"type": "status", "status": DONE}, status=DONE)
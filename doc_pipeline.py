@@ -0,0 +1,112 @@
+import io
+import os
+import re
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import wait
+from xml.sax.saxutils import escape
+from docx import Document
+import metrics
+
+_MARK = "@@CONTENIDO@@"
+# Caracteres que no se pueden escribir en XML (python-docx los rechaza)
+_INVALID_XML_RE = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+# Tiempo y elementos por etapa del pipeline de documentos (extract, chunk,
+# generate, docx); cada etapa cuenta solo su propio tiempo
+STAGE_SECONDS = metrics.counter("doc_stage_seconds_total", "Segundos dedicados a cada etapa del pipeline")
+STAGE_ITEMS = metrics.counter("doc_stage_items_total", "Elementos producidos por cada etapa (páginas, bloques, respuestas)")
+
+def staged(iterable, stage, inner=None):
+    # p. ej. staged(split_into_blocks(pages), "chunk", inner=pages) con
+    # pages = staged(iter_pages(...), "extract")
+    return metrics.TimedIterator(iterable, STAGE_SECONDS, STAGE_ITEMS, inner=inner, stage=stage)
+
+def map_ordered(pool, fn, items, window, check=None, poll=1.0):
+    # Aplica fn a cada elemento en el pool y genera los resultados en orden,
+    # con a lo más `window` elementos en vuelo. Los elementos se piden
+    # conforme se liberan lugares, así que un consumidor lento frena a quien
+    # produce (p. ej. la extracción de páginas) en lugar de acumular trabajo.
+    # Si se da check(), se llama mientras se espera y puede lanzar una
+    # excepción para detenerse; los elementos que no han empezado se cancelan.
+    pending = deque()
+
+    def next_result():
+        future = pending.popleft()
+        while check is not None:
+            check()
+            if wait([future], timeout=poll).done:
+                break
+        return future.result()
+
+    try:
+        for item in items:
+            pending.append(pool.submit(fn, item))
+            if len(pending) >= window:
+                yield next_result()
+        while pending:
+            yield next_result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+class DocxStreamWriter:
+    # Escribe un .docx párrafo por párrafo directo al zip, sin tener el
+    # documento completo en memoria. Estilos y demás partes salen de la
+    # plantilla de python-docx, así se ve igual que uno hecho con Document().
+    # Se escribe a un archivo temporal que solo reemplaza al destino al
+    # cerrar sin errores.
+    def __init__(self, path, title):
+        self.path = path
+        self._tmp_path = path + ".part"
+        template = Document()
+        template.add_heading(title, level=1)
+        template.add_paragraph(_MARK)
+        buffer = io.BytesIO()
+        template.save(buffer)
+
+        with zipfile.ZipFile(buffer) as source:
+            document_xml = source.read("word/document.xml").decode("utf-8")
+            mark = document_xml.index(_MARK)
+            start = document_xml.rindex("<w:p>", 0, mark)
+            end = document_xml.index("</w:p>", mark) + len("</w:p>")
+            self._suffix = document_xml[end:]
+            self._zip = zipfile.ZipFile(self._tmp_path, "w", zipfile.ZIP_DEFLATED)
+            # document.xml va al final: zipfile solo deja escribir una parte a la vez
+            for item in source.infolist():
+                if item.filename != "word/document.xml":
+                    self._zip.writestr(item, source.read(item.filename))
+        self._document = self._zip.open("word/document.xml", "w")
+        self._document.write(document_xml[:start].encode("utf-8"))
+
+    def add_paragraph(self, text):
+        start = time.perf_counter()
+        # Igual que python-docx, cada salto de renglón queda como <w:br/>
+        lines = _INVALID_XML_RE.sub("", text).split("\n")
+        runs = "<w:br/>".join(f'<w:t xml:space="preserve">{escape(line)}</w:t>' for line in lines)
+        self._document.write(f"<w:p><w:r>{runs}</w:r></w:p>".encode("utf-8"))
+        STAGE_SECONDS.inc(time.perf_counter() - start, stage="docx")
+        STAGE_ITEMS.inc(stage="docx")
+
+    def close(self):
+        start = time.perf_counter()
+        self._document.write(self._suffix.encode("utf-8"))
+        self._document.close()
+        self._zip.close()
+        os.replace(self._tmp_path, self.path)
+        STAGE_SECONDS.inc(time.perf_counter() - start, stage="docx")
+
+    def abort(self):
+        self._document.close()
+        self._zip.close()
+        os.remove(self._tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
@@ -0,0 +1,169 @@
+import argparse
+import hashlib
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Servidor que imita la API HTTP de Ollama para pruebas de carga y
+# benchmarks: responde con texto fijo después de `latency` segundos y
+# genera `tokens` fragmentos a `token_rate` por segundo, sin cargar ningún
+# modelo. Uso: python fake_ollama.py --port 11434 --latency 0.5 --token-rate 30
+
+FAKE_PORT = 11434
+FAKE_LATENCY = 0.5
+FAKE_TOKEN_RATE = 30.0
+FAKE_TOKENS = 40
+EMBED_DIMENSIONS = 64
+
+WORDS = (
+    "Para participar en la convocatoria se requiere presentar la documentación completa "
+    "en las fechas indicadas y cumplir con el perfil profesional solicitado."
+).split()
+
+def _tokens(count):
+    return [WORDS[i % len(WORDS)] + " " for i in range(count)]
+
+def _embedding(text):
+    # Vector determinista por palabras: textos parecidos dan vectores parecidos
+    vector = [0.0] * EMBED_DIMENSIONS
+    for word in text.lower().split():
+        vector[int(hashlib.md5(word.encode("utf-8")).hexdigest(), 16) % EMBED_DIMENSIONS] += 1.0
+    return vector
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, data, status=200):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_chunk(self, data):
+        line = json.dumps(data, ensure_ascii=False).encode("utf-8") + b"\n"
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self._send_json({"models": [{"name": self.server.fake.model}]})
+        else:
+            self._send_json({"error": "not found"}, 404)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        fake = self.server.fake
+        fake.count(self.path)
+        if self.path == "/api/embed":
+            texts = payload.get("input", [])
+            texts = [texts] if isinstance(texts, str) else texts
+            self._send_json({"model": payload.get("model"), "embeddings": [_embedding(t) for t in texts]})
+            return
+        if self.path not in ("/api/chat", "/api/generate"):
+            self._send_json({"error": "not found"}, 404)
+            return
+
+        time.sleep(fake.latency)
+        tokens = _tokens(fake.tokens)
+        if payload.get("format") == "json":
+            tokens = [json.dumps(fake.json_response, ensure_ascii=False)]
+        key = "message" if self.path == "/api/chat" else "response"
+
+        def piece(text):
+            return {"role": "assistant", "content": text} if key == "message" else text
+
+        if not payload.get("stream", True):
+            time.sleep(len(tokens) / fake.token_rate if fake.token_rate else 0)
+            self._send_json({key: piece("".join(tokens)), "done": True, "eval_count": len(tokens)})
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for token in tokens:
+            if fake.token_rate:
+                time.sleep(1 / fake.token_rate)
+            self._send_chunk({key: piece(token), "done": False})
+        self._send_chunk({key: piece(""), "done": True, "eval_count": len(tokens)})
+        self.wfile.write(b"0\r\n\r\n")
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clientes que cierran la conexión a medias (p. ej. al terminar una
+        # prueba de carga) no son un error del servidor
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            return
+        super().handle_error(request, client_address)
+
+class FakeOllama:
+    def __init__(self, port=0, latency=FAKE_LATENCY, token_rate=FAKE_TOKEN_RATE, tokens=FAKE_TOKENS,
+                 model="fake", host="127.0.0.1"):
+        self.latency = latency
+        self.token_rate = token_rate
+        self.tokens = tokens
+        self.model = model
+        # Lo que devuelve con format="json"
+        self.json_response = {
+            "requisitos": ["Título profesional", "Constancia de servicio"],
+            "faq": [{"pregunta": "¿Qué documentos se piden?", "respuesta": "Título y constancia de servicio."}],
+        }
+        self.requests = {}
+        self._lock = threading.Lock()
+        self._server = _Server((host, port), _Handler)
+        self._server.fake = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, path):
+        with self._lock:
+            self.requests[path] = self.requests.get(path, 0) + 1
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor que imita la API de Ollama")
+    parser.add_argument("--port", type=int, default=FAKE_PORT)
+    parser.add_argument("--latency", type=float, default=FAKE_LATENCY, help="Segundos antes del primer token")
+    parser.add_argument("--token-rate", type=float, default=FAKE_TOKEN_RATE, help="Tokens por segundo (0 = sin espera)")
+    parser.add_argument("--tokens", type=int, default=FAKE_TOKENS, help="Tokens por respuesta")
+    args = parser.parse_args()
+
+    fake = FakeOllama(args.port, args.latency, args.token_rate, args.tokens)
+    print(f"🤖 Ollama simulado en {fake.url} (latencia {args.latency} s, {args.token_rate} tokens/s)")
+    try:
+        fake.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+import argparse
+import csv
+import sqlite3
+import threading
+import time
+import sqlite_util
+from faq_store import (
+    NORMALIZE_VERSION, FAQIndex, FAQStore, _file_signature, load_responses, min_overlap,
+    normalize_question, token_similarity, tokenize,
+)
+
+FAQ_DB = "faq.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS faq (
+    id INTEGER PRIMARY KEY,
+    question TEXT NOT NULL,
+    norm_question TEXT NOT NULL UNIQUE,
+    answer TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    revision INTEGER NOT NULL DEFAULT 0
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS faq_fts USING fts5(
+    question, content='faq', content_rowid='id',
+    tokenize="unicode61 remove_diacritics 0"
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS faq_vocab USING fts5vocab(faq_fts, 'row');
+CREATE TRIGGER IF NOT EXISTS faq_ai AFTER INSERT ON faq BEGIN
+    INSERT INTO faq_fts(rowid, question) VALUES (new.id, new.question);
+END;
+CREATE TRIGGER IF NOT EXISTS faq_ad AFTER DELETE ON faq BEGIN
+    INSERT INTO faq_fts(faq_fts, rowid, question) VALUES ('delete', old.id, old.question);
+END;
+CREATE TRIGGER IF NOT EXISTS faq_au AFTER UPDATE OF question ON faq BEGIN
+    INSERT INTO faq_fts(faq_fts, rowid, question) VALUES ('delete', old.id, old.question);
+    INSERT INTO faq_fts(rowid, question) VALUES (new.id, new.question);
+END;
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value
+);
+"""
+
+def _fts_term(token):
+    return '"' + token.replace('"', '""') + '"'
+
+def get_meta(conn, key, default=None):
+    row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return default if row is None else row[0]
+
+def set_meta(conn, key, value):
+    conn.execute(
+        "INSERT INTO meta (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+        (key, value),
+    )
+
+def add_revision_column(conn):
+    # Bases creadas antes de la columna `revision`: las filas existentes
+    # quedan con 0 y se leen en la carga inicial
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(faq)")]
+    if "revision" not in columns:
+        conn.execute("ALTER TABLE faq ADD COLUMN revision INTEGER NOT NULL DEFAULT 0")
+    conn.execute("CREATE INDEX IF NOT EXISTS faq_revision ON faq(revision)")
+
+def renormalize(conn, table):
+    # Recalcula norm_question con la versión actual de normalize_question;
+    # si dos preguntas quedan con la misma clave se conserva la primera
+    conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value)")
+    key = f"normalize_version:{table}"
+    if get_meta(conn, key) == NORMALIZE_VERSION:
+        return 0
+    removed = 0
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        rows = conn.execute(f"SELECT id, question FROM {table} ORDER BY id").fetchall()
+        # Claves provisionales para que el orden de las actualizaciones no
+        # choque con la restricción UNIQUE
+        conn.execute(f"UPDATE {table} SET norm_question = '#' || id")
+        for row_id, question in rows:
+            try:
+                conn.execute(f"UPDATE {table} SET norm_question = ? WHERE id = ?",
+                             (normalize_question(question), row_id))
+            except sqlite3.IntegrityError:
+                conn.execute(f"DELETE FROM {table} WHERE id = ?", (row_id,))
+                removed += 1
+        set_meta(conn, key, NORMALIZE_VERSION)
+    return removed
+
+def fts_search(conn, table, question, threshold, where="", params=()):
+    # Búsqueda sobre una tabla con su índice FTS (`table`_fts) y vocabulario
+    # (`table`_vocab); `where` agrega condiciones sobre la tabla
+    query = tokenize(question)
+    need = min_overlap(len(query), threshold) if query else None
+    if need is None:
+        return None
+
+    # Mismo filtro que FAQIndex: basta con buscar las palabras más raras
+    placeholders = ",".join("?" * len(query))
+    doc_freq = dict(conn.execute(
+        f"SELECT term, doc FROM {table}_vocab WHERE term IN ({placeholders})", tuple(query)
+    ))
+    by_rarity = sorted(query, key=lambda t: doc_freq.get(t, 0))
+    prefix = by_rarity[:len(query) - need + 1]
+    candidates = conn.execute(
+        f"SELECT {table}.id, {table}.question, {table}.answer FROM {table}_fts "
+        f"JOIN {table} ON {table}.id = {table}_fts.rowid WHERE {table}_fts MATCH ?{where}",
+        (" OR ".join(_fts_term(t) for t in prefix),) + tuple(params),
+    )
+
+    best, best_score = None, 0.0
+    for row in candidates:
+        score = token_similarity(tokenize(row[1]), query)
+        if score < threshold:
+            continue
+        if best is None or score > best_score or (score == best_score and row[0] < best[0]):
+            best, best_score = row, score
+    if best is None:
+        return None
+    return best, best_score
+
+class FAQDatabase:
+    # Preguntas frecuentes en SQLite (modo WAL): varios procesos pueden leer
+    # y escribir a la vez y la pregunta normalizada no se repite.
+    def __init__(self, path=FAQ_DB, timeout=30.0):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        conn = self._conn()
+        conn.executescript(SCHEMA)
+        add_revision_column(conn)
+        renormalize(conn, "faq")
+
+    def _conn(self):
+        return sqlite_util.connection(self._local, self.path, self.timeout)
+
+    def __len__(self):
+        return self._conn().execute("SELECT count(*) FROM faq").fetchone()[0]
+
+    def add(self, question, answer):
+        return self.add_many([(question, answer)]) == 1
+
+    def add_many(self, rows, replace=False):
+        # Con replace=True una pregunta que ya existe toma la respuesta nueva
+        # (importar el CSV que editan los responsables); si no, se omite.
+        # Las filas nuevas o cambiadas llevan la revisión de esta escritura,
+        # así los demás procesos leen solo lo que cambió (ver changes()).
+        # Devuelve cuántas filas se insertaron o cambiaron.
+        conn = self._conn()
+        now = time.time()
+        on_conflict = (
+            "DO UPDATE SET answer = excluded.answer, revision = excluded.revision "
+            "WHERE answer != excluded.answer"
+            if replace else "DO NOTHING"
+        )
+        changed = 0
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            revision = get_meta(conn, "revision", 0) + 1
+            for question, answer in rows:
+                cur = conn.execute(
+                    "INSERT INTO faq (question, norm_question, answer, created_at, revision) "
+                    f"VALUES (?, ?, ?, ?, ?) ON CONFLICT(norm_question) {on_conflict}",
+                    (question, normalize_question(question), answer, now, revision),
+                )
+                changed += cur.rowcount
+            if changed:
+                set_meta(conn, "revision", revision)
+        return changed
+
+    def revision(self):
+        # Cambia con cada escritura, de este o de otro proceso
+        return get_meta(self._conn(), "revision", 0)
+
+    def get_meta(self, key, default=None):
+        return get_meta(self._conn(), key, default)
+
+    def set_meta(self, key, value):
+        set_meta(self._conn(), key, value)
+
+    def rows(self):
+        return self._conn().execute("SELECT question, answer FROM faq ORDER BY id").fetchall()
+
+    def changes(self, since):
+        # Filas insertadas o cambiadas después de la revisión `since`
+        return self._conn().execute(
+            "SELECT id, question, answer FROM faq WHERE revision > ? ORDER BY id", (since,)
+        ).fetchall()
+
+    def search(self, question, threshold):
+        return fts_search(self._conn(), "faq", question, threshold)
+
+    def find_similar(self, question, threshold):
+        match = self.search(question, threshold)
+        if match is None:
+            return None
+        return match[0][2]
+
+    def import_csv(self, path):
+        return self.add_many(load_responses(path), replace=True)
+
+    def export_csv(self, path):
+        rows = self.rows()
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(["question", "answer"])
+            writer.writerows(rows)
+        return len(rows)
+
+class SQLiteFAQStore(FAQStore):
+    # Igual que FAQStore (las búsquedas se hacen en el FAQIndex en memoria),
+    # pero las respuestas viven en FAQDatabase. Cuando otro proceso escribe
+    # en la base (p. ej. Doc.py) solo se leen las filas de las revisiones
+    # nuevas: las preguntas nuevas se agregan al índice y las respuestas
+    # corregidas se cambian en su lugar, sin reconstruirlo. `import_from`
+    # (responses.csv) se vuelve a importar cuando cambia.
+    def __init__(self, db_path, prohibidas_csv, import_from=None, **kwargs):
+        self.database = FAQDatabase(db_path)
+        self.import_from = import_from
+        self._csv_sig = None
+        # id en la base -> posición en el FAQIndex
+        self._positions = {}
+        super().__init__(None, prohibidas_csv, **kwargs)
+
+    def _csv_signature(self):
+        return _file_signature(self.import_from) if self.import_from else None
+
+    def _import_if_changed(self):
+        sig = self._csv_signature()
+        self._csv_sig = sig
+        # La firma importada se guarda en la base para que los demás
+        # procesos (y los reinicios) no repitan la importación
+        if sig is None or self.database.get_meta("csv_signature") == repr(sig):
+            return
+        changed = self.database.import_csv(self.import_from)
+        self.database.set_meta("csv_signature", repr(sig))
+        if changed:
+            print(f"📥 {changed} pregunta(s) nuevas o corregidas importadas desde {self.import_from}")
+
+    def _load_responses(self):
+        self._import_if_changed()
+        # La revisión se lee antes que las filas: lo que se escriba en medio
+        # se vuelve a leer la próxima vez, y aplicarlo dos veces no cambia nada
+        revision = self.database.revision()
+        since = -1 if self._responses_sig is None else self._responses_sig
+        changes = self.database.changes(since)
+        for row_id, question, answer in changes:
+            position = self._positions.get(row_id)
+            if position is None:
+                self._positions[row_id] = self._index.add(question, answer)
+            else:
+                self._index.rows[position][1] = answer
+        self._responses_sig = revision
+        self._notify([(question, answer) for _, question, answer in changes])
+
+    def _responses_changed(self):
+        return self._csv_signature() != self._csv_sig or self.database.revision() != self._responses_sig
+
+    def add(self, question, answer):
+        with self._lock:
+            added = self.database.add(question, answer)
+            self._load_responses()
+            return added
+
+def main():
+    parser = argparse.ArgumentParser(description="Base de preguntas frecuentes (SQLite)")
+    parser.add_argument("--db", default=FAQ_DB)
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("import", help="Importa un CSV question,answer").add_argument("csv")
+    sub.add_parser("export", help="Exporta la base a CSV").add_argument("csv")
+    sub.add_parser("stats", help="Muestra cuántas preguntas hay")
+    args = parser.parse_args()
+
+    db = FAQDatabase(args.db)
+    if args.command == "import":
+        inserted = db.import_csv(args.csv)
+        print(f"✅ {inserted} pregunta(s) nuevas importadas desde {args.csv}")
+    elif args.command == "export":
+        total = db.export_csv(args.csv)
+        print(f"💾 {total} pregunta(s) exportadas a {args.csv}")
+    else:
+        print(f"📋 {len(db)} pregunta(s) en {args.db}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+import csv
+import os
+import re
+import threading
+import time
+from prohibited_filter import ProhibitedMatcher, fold_text
+
+# Cada cuántos segundos se revisa si los CSV cambiaron fuera del proceso
+STAT_INTERVAL = 2.0
+
+WORD_RE = re.compile(r'\w+')
+
+def _file_signature(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+def tokenize(text):
+    return frozenset(WORD_RE.findall(text.lower()))
+
+# Cambia cuando cambia normalize_question: las bases guardadas recalculan
+# sus claves al abrirse
+NORMALIZE_VERSION = 2
+
+def normalize_question(text):
+    # Clave canónica: las mismas palabras en el mismo orden, sin importar
+    # acentos, mayúsculas ni signos de puntuación ("¿Puedo participar si no
+    # tengo título?" y "¿No puedo participar si tengo título?" son distintas)
+    return " ".join(WORD_RE.findall(fold_text(text, fold_accents=True)))
+
+def simple_similarity(a, b):
+    a_words = tokenize(a)
+    b_words = tokenize(b)
+    return token_similarity(a_words, b_words)
+
+def token_similarity(a_words, b_words):
+    if not a_words or not b_words:
+        return 0.0
+    inter = a_words.intersection(b_words)
+    return len(inter) / max(len(a_words), len(b_words))
+
+def min_overlap(size, threshold):
+    # Menor número de palabras comunes con el que una pregunta de `size`
+    # palabras puede alcanzar el umbral (mismo cálculo que la similitud).
+    for k in range(1, size + 1):
+        if k / size >= threshold:
+            return k
+    return None
+
+def load_prohibited_words(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, newline='', encoding='utf-8') as f:
+        return [row[0].lower() for row in csv.reader(f) if row]
+
+def load_responses(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, newline='', encoding='utf-8') as f:
+        rows = [row[:2] for row in csv.reader(f) if len(row) >= 2]
+    if rows and rows[0] == ["question", "answer"]:
+        rows = rows[1:]
+    return rows
+
+class FAQIndex:
+    # Índice invertido palabra -> ids de preguntas, con los conjuntos de
+    # palabras de cada pregunta ya calculados.
+    def __init__(self, rows=()):
+        self.rows = []
+        self.token_sets = []
+        self.postings = {}
+        for question, answer in rows:
+            self.add(question, answer)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def add(self, question, answer):
+        qid = len(self.rows)
+        tokens = tokenize(question)
+        self.rows.append([question, answer])
+        self.token_sets.append(tokens)
+        for token in tokens:
+            self.postings.setdefault(token, []).append(qid)
+        return qid
+
+    def search(self, question, threshold):
+        query = tokenize(question)
+        need = min_overlap(len(query), threshold) if query else None
+        if need is None:
+            return None
+
+        # Toda pregunta con al menos `need` palabras en común comparte una de
+        # las (len(query) - need + 1) palabras más raras de la consulta, así
+        # que solo esas listas generan candidatos.
+        by_rarity = sorted(query, key=lambda t: len(self.postings.get(t, ())))
+        candidates = set()
+        for token in by_rarity[:len(query) - need + 1]:
+            candidates.update(self.postings.get(token, ()))
+
+        best_id, best_score = None, 0.0
+        for qid in candidates:
+            score = token_similarity(self.token_sets[qid], query)
+            if score < threshold:
+                continue
+            if best_id is None or score > best_score or (score == best_score and qid < best_id):
+                best_id, best_score = qid, score
+        if best_id is None:
+            return None
+        return best_id, best_score
+
+class FAQStore:
+    def __init__(self, responses_csv, prohibidas_csv, stat_interval=STAT_INTERVAL,
+                 whole_word=False, fold_accents=False):
+        self.responses_csv = responses_csv
+        self.prohibidas_csv = prohibidas_csv
+        self.stat_interval = stat_interval
+        self.whole_word = whole_word
+        self.fold_accents = fold_accents
+        self._lock = threading.RLock()
+        self._listeners = []
+        self._index = FAQIndex()
+        self._matcher = ProhibitedMatcher([])
+        self._responses_sig = None
+        self._prohibited_sig = None
+        self._next_check = 0.0
+        self.reload()
+
+    def reload(self):
+        with self._lock:
+            self._load_responses()
+            self._load_prohibited_words()
+            self._next_check = time.monotonic() + self.stat_interval
+
+    def subscribe(self, callback):
+        # callback(rows) recibe las filas (pregunta, respuesta) nuevas o
+        # cambiadas cada vez que se recargan o se agregan preguntas
+        self._listeners.append(callback)
+
+    def _notify(self, rows):
+        if rows:
+            for callback in self._listeners:
+                callback(rows)
+
+    def _load_responses(self):
+        self._responses_sig = _file_signature(self.responses_csv)
+        # Se construye aparte y se publica de una vez para que las búsquedas
+        # concurrentes nunca vean un índice a medias.
+        rows = load_responses(self.responses_csv)
+        self._index = FAQIndex(rows)
+        self._notify(rows)
+
+    def _responses_changed(self):
+        return _file_signature(self.responses_csv) != self._responses_sig
+
+    def _load_prohibited_words(self):
+        self._prohibited_sig = _file_signature(self.prohibidas_csv)
+        self._matcher = ProhibitedMatcher(
+            load_prohibited_words(self.prohibidas_csv),
+            whole_word=self.whole_word,
+            fold_accents=self.fold_accents,
+        )
+
+    def _refresh_if_changed(self):
+        # Solo se hace stat() una vez por intervalo; el resto de las
+        # consultas se atienden desde memoria.
+        if time.monotonic() < self._next_check:
+            return
+        with self._lock:
+            now = time.monotonic()
+            if now < self._next_check:
+                return
+            self._next_check = now + self.stat_interval
+            if self._responses_changed():
+                self._load_responses()
+            if _file_signature(self.prohibidas_csv) != self._prohibited_sig:
+                self._load_prohibited_words()
+
+    def responses(self):
+        self._refresh_if_changed()
+        return self._index.rows
+
+    def prohibited_matcher(self):
+        self._refresh_if_changed()
+        return self._matcher
+
+    def find_similar(self, question, threshold):
+        self._refresh_if_changed()
+        index = self._index
+        match = index.search(question, threshold)
+        if match is None:
+            return None
+        return index.rows[match[0]][1]
+
+    def add(self, question, answer):
+        with self._lock:
+            stale = self._responses_changed()
+            exists = os.path.exists(self.responses_csv)
+            with open(self.responses_csv, 'a', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                if not exists:
+                    writer.writerow(["question", "answer"])
+                writer.writerow([question, answer])
+            if stale:
+                # Hubo una edición externa que aún no se había detectado
+                self._load_responses()
+            else:
+                self._responses_sig = _file_signature(self.responses_csv)
+                self._index.add(question, answer)
+                self._notify([(question, answer)])
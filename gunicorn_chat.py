@@ -0,0 +1,44 @@
+import gc
+import multiprocessing
+import os
+
+# Configuración de gunicorn para el chat (app.py):
+#   gunicorn -c gunicorn_chat.py
+# gunicorn no funciona en Windows; ahí se puede usar waitress con un solo
+# proceso: waitress-serve --threads 16 app:app
+
+wsgi_app = "app:app"
+bind = os.environ.get("CHAT_BIND", "0.0.0.0:8000")
+
+# app.py se importa una vez en el proceso principal, antes de crear los
+# workers: el índice de preguntas frecuentes, el filtro de palabras
+# prohibidas y el índice semántico se cargan una sola vez y los workers los
+# comparten (copy-on-write) en lugar de leer cada uno los CSV
+preload_app = True
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+# Las métricas de /metrics son por worker (cada consulta las toma del que
+# la atienda); para medir el servidor completo usar WEB_CONCURRENCY=1
+# Cada respuesta en streaming ocupa un hilo mientras se genera
+worker_class = "gthread"
+threads = 16
+
+# Segundos sin señal de un worker antes de reiniciarlo y, al apagar o
+# reiniciar, cuánto se esperan las solicitudes en curso
+timeout = 120
+graceful_timeout = 60
+keepalive = 5
+
+def when_ready(server):
+    # Lo cargado hasta aquí no lo revisa el recolector de basura de los
+    # workers, así no toca (y copia) esas páginas de memoria
+    import app
+    app.reset_admission()
+    gc.freeze()
+
+def post_fork(server, worker):
+    import app
+    app.after_fork(server.cfg.workers)
+
+def worker_exit(server, worker):
+    import app
+    app.shutdown()
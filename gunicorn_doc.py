@@ -0,0 +1,26 @@
+import os
+
+# Configuración de gunicorn para el procesamiento de convocatorias
+# (doc_app.py):
+#   gunicorn -c gunicorn_doc.py
+# gunicorn no funciona en Windows; ahí se puede usar waitress:
+# waitress-serve --threads 8 doc_app:app
+
+wsgi_app = "doc_app:app"
+bind = os.environ.get("DOC_BIND", "0.0.0.0:8001")
+
+# Un solo worker: la cola de trabajos vive en el proceso (cada worker
+# retomaría los mismos trabajos pendientes de JOBS_DB) y el OCR ya usa su
+# propio pool de procesos. Sin preload, la cola arranca dentro del worker
+workers = 1
+preload_app = False
+# Los clientes siguen el avance de los trabajos con conexiones abiertas
+worker_class = "gthread"
+threads = 8
+
+timeout = 120
+graceful_timeout = 30
+
+def worker_exit(server, worker):
+    import doc_app
+    doc_app.shutdown()
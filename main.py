@@ -1,103 +1,134 @@
-import requests
-import csv
-import os
-import re
-
-OLLAMA_API = "http://localhost:11434/api/chat"
-
-# Archivos CSV
-RESPONSES_CSV = "responses.csv"
-PROHIBIDAS_CSV = "prohibidas.csv"
-
-# Umbral de similitud simple (porcentaje de palabras comunes)
-SIMILARITY_THRESHOLD = 0.6
-
-SYSTEM_PROMPT = {
-    "role": "system",
-    "content": (
-        "Gobi, el asistente virtual oficial de la USICAMM. "
-        "Responde con precisión y amabilidad las dudas relacionadas con la USICAMM."
-    )
-}
-
-def load_prohibited_words():
-    if not os.path.exists(PROHIBIDAS_CSV):
-        return []
-    with open(PROHIBIDAS_CSV, newline='', encoding='utf-8') as f:
-        return [row[0].lower() for row in csv.reader(f)]
-
-def contains_prohibited_word(text, prohibited_words):
-    text_lower = text.lower()
-    return any(palabra in text_lower for palabra in prohibited_words)
-
-def load_responses():
-    if not os.path.exists(RESPONSES_CSV):
-        return []
-    with open(RESPONSES_CSV, newline='', encoding='utf-8') as f:
-        return list(csv.reader(f))
-
-def save_response(question, answer):
-    exists = os.path.exists(RESPONSES_CSV)
-    with open(RESPONSES_CSV, 'a', newline='', encoding='utf-8') as f:
-        writer = csv.writer(f)
-        if not exists:
-            writer.writerow(["question", "answer"])
-        writer.writerow([question, answer])
-
-def simple_similarity(a, b):
-    a_words = set(re.findall(r'\w+', a.lower()))
-    b_words = set(re.findall(r'\w+', b.lower()))
-    if not a_words or not b_words:
-        return 0.0
-    inter = a_words.intersection(b_words)
-    return len(inter) / max(len(a_words), len(b_words))
-
-def find_similar_answer(question, responses):
-    for q, a in responses:
-        if simple_similarity(q, question) >= SIMILARITY_THRESHOLD:
-            return a
-    return None
-
-def chat_with_ollama(user_prompt):
-    payload = {
-        "model": "deepseek-llm:7b",
-        "messages": [
-            SYSTEM_PROMPT,
-            {"role": "user", "content": user_prompt}
-        ],
-        "stream": False
-    }
-
-    response = requests.post(OLLAMA_API, json=payload)
-    if response.status_code == 200:
-        return response.json().get("message", {}).get("content", "")
-    else:
-        return f"Error: {response.status_code} - {response.text}"
-
-def main():
-    prohibited_words = load_prohibited_words()
-    responses = load_responses()
-
-    print("\n💬 Chat con Gobi, el asistente de USICAMM (escribe 'salir' para terminar)")
-
-    while True:
-        user_input = input("\nTú: ")
-        if user_input.lower() in ["salir", "exit", "quit"]:
-            print("👋 Saliendo del chat...")
-            break
-
-        if contains_prohibited_word(user_input, prohibited_words):
-            print("Gobi: Lo siento, no puedo responder esa pregunta.")
-            continue
-
-        answer = find_similar_answer(user_input, responses)
-        if answer:
-            print("Gobi:", answer)
-        else:
-            answer = chat_with_ollama(user_input)
-            print("Gobi:", answer)
-            save_response(user_input, answer)
-            responses = load_responses()
-
-if __name__ == "__main__":
-    main()
+import requests
+from answer_cache import AnswerCache
+from faq_db import SQLiteFAQStore
+from faq_store import FAQStore
+from ollama_client import OllamaClient, OllamaError
+
+OLLAMA_URL = "http://localhost:11434"
+OLLAMA_MODEL = "deepseek-llm:7b"
+
+# Archivos CSV
+RESPONSES_CSV = "responses.csv"
+PROHIBIDAS_CSV = "prohibidas.csv"
+
+# "sqlite" guarda las preguntas en FAQ_DB (seguro con varios procesos e
+# importa RESPONSES_CSV la primera vez); "csv" usa solo RESPONSES_CSV
+FAQ_BACKEND = "sqlite"
+FAQ_DB = "faq.db"
+
+# Las respuestas del modelo se guardan aparte de las preguntas curadas, en
+# ANSWER_CACHE_DB: caducan a los ANSWER_TTL segundos y se conservan a lo más
+# ANSWER_MAX_ENTRIES (las menos usadas se descartan primero)
+ANSWER_CACHE_DB = FAQ_DB
+ANSWER_TTL = 7 * 24 * 3600
+ANSWER_MAX_ENTRIES = 5000
+
+# Búsqueda semántica opcional (requiere numpy): si ninguna pregunta comparte
+# suficientes palabras, se compara el embedding de la pregunta contra los de
+# las preguntas guardadas (similitud coseno)
+SEMANTIC_SEARCH = False
+EMBED_MODEL = "nomic-embed-text"
+SEMANTIC_INDEX = "faq_embeddings"
+SEMANTIC_THRESHOLD = 0.85
+SEMANTIC_TOP_K = 5
+
+# Umbral de similitud simple (porcentaje de palabras comunes)
+SIMILARITY_THRESHOLD = 0.6
+
+# Filtro de palabras prohibidas: coincidir solo con palabras completas y
+# comparar sin acentos ni mayúsculas
+PROHIBITED_WHOLE_WORD = False
+PROHIBITED_FOLD_ACCENTS = True
+
+SYSTEM_PROMPT = {
+    "role": "system",
+    "content": (
+        "Gobi, el asistente virtual oficial de la USICAMM. "
+        "Responde con precisión y amabilidad las dudas relacionadas con la USICAMM."
+    )
+}
+
+if FAQ_BACKEND == "sqlite":
+    faq_store = SQLiteFAQStore(
+        FAQ_DB, PROHIBIDAS_CSV, import_from=RESPONSES_CSV,
+        whole_word=PROHIBITED_WHOLE_WORD,
+        fold_accents=PROHIBITED_FOLD_ACCENTS,
+    )
+else:
+    faq_store = FAQStore(
+        RESPONSES_CSV, PROHIBIDAS_CSV,
+        whole_word=PROHIBITED_WHOLE_WORD,
+        fold_accents=PROHIBITED_FOLD_ACCENTS,
+    )
+
+answer_cache = AnswerCache(ANSWER_CACHE_DB, ttl=ANSWER_TTL, max_entries=ANSWER_MAX_ENTRIES)
+
+ollama = OllamaClient(OLLAMA_URL, model=OLLAMA_MODEL)
+
+def contains_prohibited_word(text):
+    return faq_store.prohibited_matcher().search(text) is not None
+
+semantic_index = None
+if SEMANTIC_SEARCH:
+    from semantic_index import SemanticIndex
+    semantic_index = SemanticIndex(
+        SEMANTIC_INDEX, lambda texts: ollama.embed(texts, model=EMBED_MODEL), EMBED_MODEL
+    )
+    # Lo que se agregue o corrija después (Doc.py, responses.csv) llega por
+    # la suscripción; sync() solo calcula lo que falta al arrancar
+    faq_store.subscribe(semantic_index.add_many)
+    semantic_index.sync(faq_store.responses())
+
+def save_response(question, answer):
+    # Solo se guardan respuestas completas; las vacías o de error no
+    return answer_cache.add(question, answer)
+
+def find_similar_answer(question):
+    # Primero las preguntas curadas y después las respuestas generadas
+    answer = faq_store.find_similar(question, SIMILARITY_THRESHOLD)
+    if answer is None:
+        answer = answer_cache.find_similar(question, SIMILARITY_THRESHOLD)
+    if answer is None and semantic_index is not None:
+        answer = semantic_index.find_similar(question, SEMANTIC_THRESHOLD, k=SEMANTIC_TOP_K)
+    return answer
+
+def chat_with_ollama(user_prompt):
+    # Muestra la respuesta conforme llega y la devuelve completa al final
+    messages = [
+        SYSTEM_PROMPT,
+        {"role": "user", "content": user_prompt}
+    ]
+    parts = []
+    for token in ollama.chat_stream(messages):
+        print(token, end="", flush=True)
+        parts.append(token)
+    print()
+    return "".join(parts)
+
+def main():
+    print("\n💬 Chat con Gobi, el asistente de USICAMM (escribe 'salir' para terminar)")
+
+    while True:
+        user_input = input("\nTú: ")
+        if user_input.lower() in ["salir", "exit", "quit"]:
+            print("👋 Saliendo del chat...")
+            break
+
+        if contains_prohibited_word(user_input):
+            print("Gobi: Lo siento, no puedo responder esa pregunta.")
+            continue
+
+        answer = find_similar_answer(user_input)
+        if answer:
+            print("Gobi:", answer)
+        else:
+            print("Gobi: ", end="", flush=True)
+            try:
+                answer = chat_with_ollama(user_input)
+            except (OllamaError, requests.RequestException) as e:
+                print(f"\nError: {e}")
+                continue
+            save_response(user_input, answer)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Límites (en segundos) de los histogramas de tiempo: desde una búsqueda en
+# memoria hasta una generación larga del modelo
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+# Flask le agrega charset=utf-8
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4"
+
+def _key(labels):
+    return tuple(sorted(labels.items()))
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _label_text(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+def _summary_key(key):
+    return ",".join(f"{name}={value}" for name, value in key) or "total"
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(_key(labels), 0)
+
+    def _drain(self):
+        with self._lock:
+            values, self._values = self._values, {}
+        return values
+
+    def _merge(self, values):
+        with self._lock:
+            for key, value in values.items():
+                self._values[key] = self._values.get(key, 0) + value
+
+    def _render(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield f"{self.name}{_label_text(key)} {_number(value)}"
+
+    def _summary(self):
+        with self._lock:
+            return {_summary_key(key): value for key, value in sorted(self._values.items())}
+
+class Histogram:
+    # Por cada combinación de etiquetas guarda [conteo por cubeta, suma,
+    # conteo, máximo]; observar cuesta un bisect y una suma bajo un candado
+    kind = "histogram"
+
+    def __init__(self, name, help, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0, 0.0]
+            state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+            state[3] = max(state[3], value)
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _drain(self):
+        with self._lock:
+            values, self._values = self._values, {}
+        return values
+
+    def _merge(self, values):
+        with self._lock:
+            for key, (counts, total, count, peak) in values.items():
+                state = self._values.get(key)
+                if state is None:
+                    state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0, 0.0]
+                state[0] = [a + b for a, b in zip(state[0], counts)]
+                state[1] += total
+                state[2] += count
+                state[3] = max(state[3], peak)
+
+    def _snapshot(self):
+        with self._lock:
+            return {key: (list(counts), total, count, peak) for key, (counts, total, count, peak) in self._values.items()}
+
+    def _render(self):
+        for key, (counts, total, count, _) in sorted(self._snapshot().items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                yield f"{self.name}_bucket{_label_text(key, [('le', _number(bound))])} {cumulative}"
+            yield f"{self.name}_sum{_label_text(key)} {_number(total)}"
+            yield f"{self.name}_count{_label_text(key)} {count}"
+
+    def _quantile(self, counts, count, peak, q):
+        # Estimación por cubetas: límite superior de la cubeta que la
+        # contiene, sin pasar del máximo observado
+        target = q * count
+        cumulative = 0
+        for bound, n in zip(self.buckets, counts):
+            cumulative += n
+            if cumulative >= target:
+                return min(bound, round(peak, 6))
+        return round(peak, 6)
+
+    def _summary(self):
+        summary = {}
+        for key, (counts, total, count, peak) in sorted(self._snapshot().items()):
+            summary[_summary_key(key)] = {
+                "count": count,
+                "sum": round(total, 6),
+                "mean": round(total / count, 6) if count else 0.0,
+                "p50": self._quantile(counts, count, peak, 0.5),
+                "p95": self._quantile(counts, count, peak, 0.95),
+                "max": round(peak, 6),
+            }
+        return summary
+
+class Registry:
+    # Métricas del proceso. Los procesos del pool de OCR llevan las suyas y
+    # las mandan al padre con drain()/merge() junto con cada resultado.
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, help, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help, **kwargs)
+            return metric
+
+    def counter(self, name, help=""):
+        return self._get(Counter, name, help)
+
+    def histogram(self, name, help="", buckets=DEFAULT_BUCKETS):
+        return self._get(Histogram, name, help, buckets=buckets)
+
+    def drain(self):
+        return {name: metric._drain() for name, metric in list(self._metrics.items())}
+
+    def merge(self, drained):
+        for name, values in drained.items():
+            metric = self._metrics.get(name)
+            if metric is not None and values:
+                metric._merge(values)
+
+    def render(self):
+        # Formato de texto de Prometheus
+        lines = []
+        for name, metric in sorted(self._metrics.items()):
+            if metric.help:
+                lines.append(f"# HELP {name} {metric.help}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            lines.extend(metric._render())
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        return {name: metric._summary() for name, metric in sorted(self._metrics.items()) if metric._values}
+
+registry = Registry()
+counter = registry.counter
+histogram = registry.histogram
+
+class TimedIterator:
+    # Envuelve un iterador y suma a `seconds` el tiempo que tarda en
+    # producir cada elemento y a `items` cuántos produjo. Si consume de otro
+    # TimedIterator (`inner`), se descuenta el tiempo de ese, así en una
+    # cadena extracción -> bloques -> modelo cada etapa cuenta solo lo suyo.
+    def __init__(self, iterable, seconds, items=None, inner=None, **labels):
+        self._iterator = iter(iterable)
+        self._seconds = seconds
+        self._items = items
+        self._inner = inner
+        self._labels = labels
+        self.total = 0.0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        inner_before = self._inner.total if self._inner is not None else 0.0
+        start = time.perf_counter()
+        try:
+            item = next(self._iterator)
+        finally:
+            spent = time.perf_counter() - start
+            self.total += spent
+            if self._inner is not None:
+                spent -= self._inner.total - inner_before
+            self._seconds.inc(spent, **self._labels)
+        if self._items is not None:
+            self._items.inc(**self._labels)
+        return item
+
+    def close(self):
+        close = getattr(self._iterator, "close", None)
+        if close is not None:
+            close()
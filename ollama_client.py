@@ -0,0 +1,130 @@
+import json
+import time
+from contextlib import contextmanager
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import metrics
+
+OLLAMA_URL = "http://localhost:11434"
+DEFAULT_MODEL = "deepseek-llm:7b"
+
+# (conexión, lectura) en segundos; la lectura cubre toda la generación
+# en modo normal y el tiempo entre fragmentos en modo streaming
+DEFAULT_TIMEOUT = (5, 300)
+DEFAULT_RETRIES = 2
+DEFAULT_POOL_SIZE = 10
+# Cuánto tiempo mantiene Ollama el modelo cargado después de cada solicitud
+DEFAULT_KEEP_ALIVE = "30m"
+
+REQUEST_SECONDS = metrics.histogram("ollama_request_seconds", "Duración de las solicitudes a Ollama")
+REQUEST_ERRORS = metrics.counter("ollama_request_errors_total", "Solicitudes a Ollama que fallaron")
+FIRST_TOKEN_SECONDS = metrics.histogram("ollama_first_token_seconds", "Tiempo hasta el primer fragmento en streaming")
+
+class OllamaError(Exception):
+    pass
+
+@contextmanager
+def _measured(endpoint):
+    start = time.perf_counter()
+    try:
+        yield start
+    except Exception:
+        REQUEST_ERRORS.inc(endpoint=endpoint)
+        raise
+    finally:
+        REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint=endpoint)
+
+class OllamaClient:
+    # Sesión HTTP compartida: las conexiones al servidor de Ollama se
+    # reutilizan (keep-alive) en lugar de abrir una nueva por pregunta.
+    def __init__(self, base_url=OLLAMA_URL, model=DEFAULT_MODEL, timeout=DEFAULT_TIMEOUT,
+                 retries=DEFAULT_RETRIES, pool_size=DEFAULT_POOL_SIZE, keep_alive=DEFAULT_KEEP_ALIVE):
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.timeout = timeout
+        self.retries = retries
+        self.keep_alive = keep_alive
+        # Solo se reintentan errores de conexión y respuestas 502/503, que
+        # llegan antes de que Ollama empiece a generar; nunca un tiempo de
+        # lectura agotado ni un 504, porque la generación puede seguir
+        # corriendo y repetirla solo duplica el trabajo.
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=False,
+            status=retries,
+            backoff_factor=0.5,
+            status_forcelist=(502, 503),
+            allowed_methods=None,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _post(self, path, payload, stream=False):
+        response = self.session.post(
+            self.base_url + path, json=payload, stream=stream, timeout=self.timeout
+        )
+        if response.status_code != 200:
+            try:
+                raise OllamaError(f"{response.status_code} - {response.text}")
+            finally:
+                response.close()
+        return response
+
+    def chat(self, messages, model=None):
+        payload = {
+            "model": model or self.model, "messages": messages, "stream": False,
+            "keep_alive": self.keep_alive,
+        }
+        with _measured("chat"):
+            response = self._post("/api/chat", payload)
+            return response.json().get("message", {}).get("content", "")
+
+    def chat_stream(self, messages, model=None):
+        payload = {
+            "model": model or self.model, "messages": messages, "stream": True,
+            "keep_alive": self.keep_alive,
+        }
+        first = True
+        with _measured("chat_stream") as start, self._post("/api/chat", payload, stream=True) as response:
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if "error" in chunk:
+                    raise OllamaError(chunk["error"])
+                content = chunk.get("message", {}).get("content", "")
+                if content:
+                    if first:
+                        FIRST_TOKEN_SECONDS.observe(time.perf_counter() - start)
+                        first = False
+                    yield content
+                if chunk.get("done"):
+                    break
+
+    def generate(self, prompt, model=None, options=None, format=None):
+        # Con format="json" (o un esquema JSON) el modelo solo puede
+        # responder JSON válido
+        payload = {
+            "model": model or self.model, "prompt": prompt, "stream": False,
+            "keep_alive": self.keep_alive,
+        }
+        if options:
+            payload["options"] = options
+        if format:
+            payload["format"] = format
+        with _measured("generate"):
+            return self._post("/api/generate", payload).json().get("response", "")
+
+    def embed(self, texts, model=None):
+        payload = {"model": model or self.model, "input": list(texts)}
+        with _measured("embed"):
+            response = self._post("/api/embed", payload)
+            return response.json().get("embeddings", [])
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,264 @@
+import os
+import pathlib
+import queue
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+import metrics
+
+try:
+    # Solo existe con el Python que trae LibreOffice (o con python3-uno).
+    # Con él se mantiene una instancia escuchando y cada archivo se convierte
+    # sin arrancar nada; sin él, cada lote se convierte en una sola llamada.
+    import uno
+    from com.sun.star.beans import PropertyValue
+    from com.sun.star.connection import NoConnectException
+except ImportError:
+    uno = None
+
+# Ruta a soffice: variable de entorno SOFFICE_PATH, luego el PATH y al final
+# la instalación por omisión en Windows
+SOFFICE_PATH = (
+    os.environ.get("SOFFICE_PATH")
+    or shutil.which("soffice")
+    or r"C:\Program Files\LibreOffice\program\soffice.exe"
+)
+SOFFICE_PORT = 2002
+START_TIMEOUT = 60
+# Segundos por documento; un lote tiene este tiempo por cada archivo
+CONVERT_TIMEOUT = 120
+
+CONVERSION_SECONDS = metrics.histogram(
+    "pdf_conversion_seconds", "Segundos por archivo convertido a PDF (en un lote se reparte el tiempo del lote)"
+)
+CONVERSION_ERRORS = metrics.counter("pdf_conversion_errors_total", "Archivos que no se pudieron convertir a PDF")
+
+class ConversionError(Exception):
+    pass
+
+def _pdf_path(docx_path, outdir):
+    return os.path.join(outdir, os.path.splitext(os.path.basename(docx_path))[0] + ".pdf")
+
+def _properties(**values):
+    props = []
+    for name, value in values.items():
+        prop = PropertyValue()
+        prop.Name = name
+        prop.Value = value
+        props.append(prop)
+    return tuple(props)
+
+class OfficeConverter:
+    # Convierte .docx a PDF con LibreOffice sin arrancarlo por cada archivo.
+    # Los documentos se encolan y un hilo los convierte: los que llegan
+    # mientras se procesa un lote se juntan en el siguiente. Usa su propio
+    # perfil de LibreOffice para no chocar con una instancia abierta por el
+    # usuario, y si la instancia se cae o se cuelga se vuelve a arrancar.
+    def __init__(self, soffice=SOFFICE_PATH, port=SOFFICE_PORT, profile_dir=None,
+                 timeout=CONVERT_TIMEOUT, persistent=None):
+        self.soffice = soffice
+        self.port = port
+        self.profile_dir = profile_dir or os.path.join(tempfile.gettempdir(), f"soffice_profile_{port}")
+        self.timeout = timeout
+        self.persistent = uno is not None if persistent is None else persistent
+        self._process = None
+        self._desktop = None
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _base_args(self):
+        return [
+            self.soffice, "--headless", "--invisible", "--nologo", "--norestore", "--nodefault",
+            "-env:UserInstallation=" + pathlib.Path(self.profile_dir).resolve().as_uri(),
+        ]
+
+    def submit(self, docx_path, outdir=None):
+        # Devuelve un Future con la ruta del PDF (o ConversionError)
+        future = Future()
+        outdir = os.path.abspath(outdir or os.path.dirname(docx_path))
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._worker, daemon=True)
+                self._thread.start()
+        self._queue.put((os.path.abspath(docx_path), outdir, future))
+        return future
+
+    def convert(self, docx_path, outdir=None):
+        return self.submit(docx_path, outdir).result()
+
+    def convert_many(self, docx_paths, outdir=None):
+        futures = [self.submit(path, outdir) for path in docx_paths]
+        return [future.result() for future in futures]
+
+    def close(self):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join()
+        self._stop()
+
+    def _worker(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            # Lo que se acumuló mientras se convertía el lote anterior va junto
+            while True:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._queue.put(None)
+                    break
+                batch.append(item)
+            if self.persistent:
+                for docx_path, outdir, future in batch:
+                    self._run(future, self._convert_persistent, docx_path, outdir)
+            else:
+                by_outdir = {}
+                for docx_path, outdir, future in batch:
+                    by_outdir.setdefault(outdir, []).append((docx_path, future))
+                for outdir, items in by_outdir.items():
+                    self._convert_batch(items, outdir)
+
+    def _run(self, future, convert, *args):
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            with CONVERSION_SECONDS.time(mode="persistent"):
+                future.set_result(convert(*args))
+        except Exception as e:
+            CONVERSION_ERRORS.inc()
+            future.set_exception(e if isinstance(e, ConversionError) else ConversionError(str(e)))
+
+    def _convert_batch(self, items, outdir):
+        # Un solo arranque de LibreOffice para todo el lote. Si se cuelga se
+        # mata y los archivos que faltan se intentan una vez más.
+        items = [(path, future) for path, future in items if future.set_running_or_notify_cancel()]
+        start = time.perf_counter()
+        for attempt in range(2):
+            missing = [(path, future) for path, future in items if not future.done()]
+            if not missing:
+                return
+            args = self._base_args() + ["--convert-to", "pdf", "--outdir", outdir]
+            error = None
+            try:
+                subprocess.run(
+                    args + [path for path, _ in missing],
+                    stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                    timeout=self.timeout * len(missing), check=True,
+                )
+            except subprocess.TimeoutExpired:
+                error = f"LibreOffice no respondió en {self.timeout * len(missing)} s"
+            except subprocess.CalledProcessError as e:
+                error = f"LibreOffice terminó con código {e.returncode}: {e.stderr.decode(errors='replace').strip()}"
+            except OSError as e:
+                error = f"No se pudo ejecutar {self.soffice}: {e}"
+            # El lote se reparte entre sus archivos
+            seconds = (time.perf_counter() - start) / len(missing)
+            start = time.perf_counter()
+            for path, future in missing:
+                pdf_path = _pdf_path(path, outdir)
+                if os.path.exists(pdf_path) and os.path.getmtime(pdf_path) >= os.path.getmtime(path):
+                    CONVERSION_SECONDS.observe(seconds, mode="batch")
+                    future.set_result(pdf_path)
+                elif attempt == 1:
+                    CONVERSION_ERRORS.inc()
+                    future.set_exception(ConversionError(error or f"LibreOffice no generó {pdf_path}"))
+
+    def _start(self):
+        self._stop()
+        self._process = subprocess.Popen(
+            self._base_args() + [f"--accept=socket,host=127.0.0.1,port={self.port};urp;StarOffice.ComponentContext"],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        local = uno.getComponentContext()
+        resolver = local.ServiceManager.createInstanceWithContext("com.sun.star.bridge.UnoUrlResolver", local)
+        deadline = time.monotonic() + START_TIMEOUT
+        while True:
+            try:
+                context = resolver.resolve(
+                    f"uno:socket,host=127.0.0.1,port={self.port};urp;StarOffice.ComponentContext"
+                )
+                break
+            except NoConnectException:
+                if self._process.poll() is not None or time.monotonic() > deadline:
+                    self._stop()
+                    raise ConversionError("LibreOffice no arrancó")
+                time.sleep(0.5)
+        self._desktop = context.ServiceManager.createInstanceWithContext("com.sun.star.frame.Desktop", context)
+
+    def _stop(self):
+        if self._desktop is not None:
+            try:
+                self._desktop.terminate()
+            except Exception:
+                pass
+            self._desktop = None
+        if self._process is not None:
+            if self._process.poll() is None:
+                self._process.kill()
+            self._process.wait()
+            self._process = None
+
+    def _convert_persistent(self, docx_path, outdir):
+        # Si la instancia se cayó (o la conexión se rompió) se arranca de
+        # nuevo y se repite el archivo una vez
+        for attempt in range(2):
+            try:
+                if self._desktop is None or self._process.poll() is not None:
+                    self._start()
+                return self._store_with_watchdog(docx_path, outdir)
+            except ConversionError:
+                raise
+            except Exception:
+                self._stop()
+                if attempt == 1:
+                    raise
+
+    def _store_with_watchdog(self, docx_path, outdir):
+        # Las llamadas por UNO no tienen límite de tiempo: si el documento no
+        # termina en self.timeout segundos se mata LibreOffice, lo que corta
+        # la llamada; el archivo falla y el siguiente arranca otra instancia
+        process = self._process
+        expired = threading.Event()
+
+        def kill():
+            expired.set()
+            if process.poll() is None:
+                process.kill()
+
+        watchdog = threading.Timer(self.timeout, kill)
+        watchdog.daemon = True
+        watchdog.start()
+        try:
+            return self._store_pdf(docx_path, outdir)
+        except Exception:
+            if not expired.is_set():
+                raise
+            self._stop()
+            raise ConversionError(f"LibreOffice no respondió en {self.timeout} s")
+        finally:
+            watchdog.cancel()
+
+    def _store_pdf(self, docx_path, outdir):
+        pdf_path = _pdf_path(docx_path, outdir)
+        document = self._desktop.loadComponentFromURL(
+            pathlib.Path(docx_path).as_uri(), "_blank", 0, _properties(Hidden=True, ReadOnly=True)
+        )
+        if document is None:
+            raise ConversionError(f"LibreOffice no pudo abrir {docx_path}")
+        try:
+            document.storeToURL(
+                pathlib.Path(os.path.abspath(pdf_path)).as_uri(), _properties(FilterName="writer_pdf_Export")
+            )
+        finally:
+            document.close(True)
+        return pdf_path
@@ -0,0 +1,269 @@
+import os
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor
+import fitz  # PyMuPDF
+import pytesseract
+from PIL import Image
+import metrics
+from pipeline_cache import CACHE_MAX_BYTES, digest, get_cache
+
+try:
+    # Opcional: usa la API de Tesseract en el mismo proceso, sin archivos
+    # temporales ni un proceso tesseract por página
+    import tesserocr
+except ImportError:
+    tesserocr = None
+
+OCR_DPI = 300
+OCR_THRESHOLD = 140
+OCR_LANG = "spa+eng"
+OCR_CONFIG = r'--psm 6'
+
+# Resolución adaptativa: una zona escaneada se renderiza a la resolución
+# original de sus imágenes (no hay más detalle que ganar) dentro de
+# [OCR_MIN_DPI, OCR_DPI], y nunca con más de OCR_MAX_PIXELS
+OCR_MIN_DPI = 150
+OCR_MAX_PIXELS = 24_000_000
+
+# Clasificación de páginas: imágenes más chicas que esta fracción de la
+# página (logos, sellos, firmas) no se consideran escaneos...
+MIN_IMAGE_FRACTION = 0.15
+# ...salvo en páginas con menos de SPARSE_PAGE_CHARS caracteres de texto
+# nativo, donde cuenta cualquier imagen de al menos SMALL_IMAGE_FRACTION
+SPARSE_PAGE_CHARS = 200
+SMALL_IMAGE_FRACTION = 0.02
+# Caracteres del texto nativo por pulgada cuadrada a partir de los cuales
+# una zona con imagen ya tiene su texto (p. ej. un PDF con capa de OCR)
+MIN_TEXT_DENSITY = 5.0
+# Una zona se considera en blanco si, vista a BLANK_CHECK_DPI, menos de esta
+# fracción de sus pixeles es tinta
+BLANK_CHECK_DPI = 24
+BLANK_INK_FRACTION = 0.002
+
+# Tabla de umbral para binarizar; PIL la aplica en C sobre todo el buffer
+BINARIZE_LUT = [0] * OCR_THRESHOLD + [255] * (256 - OCR_THRESHOLD)
+
+# Forma parte de las llaves de caché: si cambia la configuración de OCR,
+# los resultados anteriores dejan de usarse
+OCR_SIGNATURE = digest(
+    "ocr", OCR_DPI, OCR_THRESHOLD, OCR_LANG, OCR_CONFIG, OCR_MIN_DPI, OCR_MAX_PIXELS,
+    MIN_IMAGE_FRACTION, SPARSE_PAGE_CHARS, SMALL_IMAGE_FRACTION, MIN_TEXT_DENSITY,
+    BLANK_CHECK_DPI, BLANK_INK_FRACTION,
+)
+
+# Páginas que procesa cada tarea del pool; con menos páginas que esto no
+# vale la pena arrancar procesos
+PAGES_PER_TASK = 4
+
+PAGE_SECONDS = metrics.histogram("pdf_page_seconds", "Tiempo de extracción por página según su tipo")
+OCR_SECONDS = metrics.histogram("ocr_seconds", "Tiempo de Tesseract por zona (sin contar la caché)")
+
+def _init_worker(tesseract_cmd, tessdata_prefix):
+    # En Windows los procesos hijos no heredan la configuración del padre
+    pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+    if tessdata_prefix:
+        os.environ["TESSDATA_PREFIX"] = tessdata_prefix
+    # Con fork se heredan las métricas del padre; el worker solo reporta
+    # las suyas
+    metrics.registry.drain()
+
+_tesseract = threading.local()
+
+def pixmap_to_image(pix):
+    # Imagen PIL sobre el buffer de muestras del pixmap, sin copiarlo ni
+    # pasar por PNG; el pixmap debe seguir vivo mientras se use la imagen
+    mode = {1: "L", 3: "RGB", 4: "RGBA"}[pix.n]
+    return Image.frombuffer(mode, (pix.width, pix.height), pix.samples_mv, "raw", mode, pix.stride, 1)
+
+def _tesserocr_api():
+    api = getattr(_tesseract, "api", None)
+    if api is None:
+        # --psm 6 equivale a PSM.SINGLE_BLOCK
+        options = {"lang": OCR_LANG, "psm": tesserocr.PSM.SINGLE_BLOCK}
+        if os.environ.get("TESSDATA_PREFIX"):
+            options["path"] = os.environ["TESSDATA_PREFIX"]
+        api = tesserocr.PyTessBaseAPI(**options)
+        _tesseract.api = api
+    return api
+
+def image_to_text(img):
+    with OCR_SECONDS.time():
+        if tesserocr is not None:
+            api = _tesserocr_api()
+            api.SetImage(img)
+            return api.GetUTF8Text()
+        return pytesseract.image_to_string(img, lang=OCR_LANG, config=OCR_CONFIG)
+
+def _merge_rects(rects):
+    merged = []
+    for rect in rects:
+        rect = fitz.Rect(rect)
+        changed = True
+        while changed:
+            changed = False
+            for other in merged:
+                if rect.intersects(other):
+                    merged.remove(other)
+                    rect |= other
+                    changed = True
+                    break
+        merged.append(rect)
+    return merged
+
+def _is_blank(page, clip):
+    pix = page.get_pixmap(dpi=BLANK_CHECK_DPI, colorspace=fitz.csGRAY, clip=clip)
+    histogram = pixmap_to_image(pix).histogram()
+    return sum(histogram[:OCR_THRESHOLD]) < BLANK_INK_FRACTION * pix.width * pix.height
+
+def classify_page(page):
+    # Decide qué hacer con una página a partir de sus metadatos (bloques de
+    # texto e imágenes); solo las zonas candidatas a OCR se miran a baja
+    # resolución para descartar las que están en blanco. Devuelve
+    # (tipo, bloques, zonas):
+    #   "text"  -> basta el texto nativo
+    #   "ocr"   -> no hay texto útil, se hace OCR de las zonas
+    #   "mixed" -> texto nativo más OCR de las zonas escaneadas
+    #   "blank" -> no hay nada que leer
+    # Las zonas son (rectángulo, dpi) de lo que hay que pasar por OCR.
+    blocks = [b for b in page.get_text("blocks", sort=True) if b[6] == 0 and b[4].strip()]
+    area = page.rect.width * page.rect.height
+    sparse = sum(len(b[4].strip()) for b in blocks) < SPARSE_PAGE_CHARS
+    min_area = (SMALL_IMAGE_FRACTION if sparse else MIN_IMAGE_FRACTION) * area
+    images = []
+    for info in page.get_image_info():
+        rect = fitz.Rect(info["bbox"]) & page.rect
+        if rect.is_empty or rect.width * rect.height < min_area:
+            continue
+        images.append((rect, info["width"] / (rect.width / 72)))
+    candidates = _merge_rects([rect for rect, _ in images])
+    if not blocks and not candidates and page.get_cdrawings():
+        # Sin texto ni imágenes pero con trazos: puede ser texto convertido
+        # en curvas
+        candidates = [page.rect]
+
+    regions = []
+    for rect in candidates:
+        # Las medidas de la página están en puntos (72 por pulgada)
+        inches = rect.width * rect.height / (72 * 72)
+        chars = sum(len(b[4].strip()) for b in blocks if fitz.Rect(b[:4]).intersects(rect))
+        if chars / inches >= MIN_TEXT_DENSITY:
+            continue
+        if _is_blank(page, rect):
+            continue
+        native = [dpi for image, dpi in images if image.intersects(rect)]
+        dpi = round(min(max(max(native, default=OCR_DPI), OCR_MIN_DPI), OCR_DPI))
+        dpi = min(dpi, int((OCR_MAX_PIXELS / inches) ** 0.5))
+        regions.append((rect, dpi))
+
+    if not regions:
+        return ("text" if blocks else "blank"), blocks, regions
+    outside = [b for b in blocks if not any(fitz.Rect(b[:4]).intersects(rect) for rect, _ in regions)]
+    return ("mixed" if outside else "ocr"), outside, regions
+
+def ocr_region(page, clip, dpi, cache=None):
+    pix = page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY, clip=clip)
+    img = pixmap_to_image(pix).point(BINARIZE_LUT, '1')
+    if cache is None:
+        return image_to_text(img)
+    # La llave es el hash de la zona ya renderizada: si solo cambiaron
+    # otras páginas del PDF, esta no se vuelve a pasar por Tesseract
+    key = "ocr:" + digest(OCR_SIGNATURE, pix.samples_mv)
+    return cache.get_or_compute(key, "ocr", lambda: image_to_text(img))
+
+def extract_page_text(page, cache=None):
+    start = time.perf_counter()
+    kind, blocks, regions = classify_page(page)
+    if kind == "text":
+        text = page.get_text()
+    elif kind == "blank":
+        text = ""
+    else:
+        # El texto nativo fuera de las zonas escaneadas y el OCR de cada
+        # zona, en orden de arriba hacia abajo
+        parts = [(b[1], b[0], b[4]) for b in blocks]
+        parts.extend((rect.y0, rect.x0, ocr_region(page, rect, dpi, cache)) for rect, dpi in regions)
+        parts.sort(key=lambda part: part[:2])
+        text = "".join(part if part.endswith("\n") else part + "\n" for _, _, part in parts)
+    PAGE_SECONDS.observe(time.perf_counter() - start, kind=kind)
+    return text
+
+_worker_doc = {}
+
+def _open_in_worker(pdf_path):
+    # Cada proceso del pool deja abierto el último PDF que leyó: en un
+    # documento grande, volver a abrirlo por cada tramo cuesta más que
+    # extraer las páginas
+    key = (pdf_path, os.path.getmtime(pdf_path))
+    if _worker_doc.get("key") != key:
+        if _worker_doc.get("doc") is not None:
+            _worker_doc["doc"].close()
+        _worker_doc["doc"] = fitz.open(pdf_path)
+        _worker_doc["key"] = key
+    return _worker_doc["doc"]
+
+def extract_page_range(pdf_path, start, stop, cache_path=None, cache_max_bytes=CACHE_MAX_BYTES):
+    cache = get_cache(cache_path, cache_max_bytes) if cache_path else None
+    pdf_doc = _open_in_worker(pdf_path)
+    pages = [extract_page_text(pdf_doc.load_page(n), cache) for n in range(start, stop)]
+    # Las métricas del worker viajan con el resultado y se suman en el padre
+    return pages, metrics.registry.drain()
+
+def count_pages(pdf_path):
+    with fitz.open(pdf_path) as pdf_doc:
+        return len(pdf_doc)
+
+def extraction_pool(workers):
+    # Pool de procesos para extract_page_range; se puede compartir entre
+    # varios documentos para que el OCR de todos tenga un solo límite
+    initargs = (pytesseract.pytesseract.tesseract_cmd, os.environ.get("TESSDATA_PREFIX"))
+    return ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=initargs)
+
+def iter_pages(pdf_path, workers=1, pages_per_task=PAGES_PER_TASK, progress=None, cache=None,
+               window=None, pool=None):
+    # Genera el texto de cada página en orden, a medida que quien consume lo
+    # pide. Con workers > 1 los tramos de páginas se reparten entre procesos,
+    # pero solo hay `window` tramos en vuelo (por omisión 2 por proceso): si
+    # el consumidor se atrasa, la extracción espera en lugar de acumular
+    # texto en memoria. Con `pool` (de extraction_pool) se usa ese pool en
+    # lugar de arrancar uno propio, aunque el documento sea corto.
+    total = count_pages(pdf_path)
+    if pool is None and (workers <= 1 or total <= pages_per_task):
+        with fitz.open(pdf_path) as pdf_doc:
+            for n in range(total):
+                page_text = extract_page_text(pdf_doc.load_page(n), cache)
+                if progress:
+                    progress(n, n + 1, total)
+                yield page_text
+        return
+
+    workers = min(workers, -(-total // pages_per_task))
+    window = window or workers * 2
+    ranges = ((start, min(start + pages_per_task, total)) for start in range(0, total, pages_per_task))
+    cache_args = (cache.path, cache.max_bytes) if cache is not None else ()
+    pending = deque()
+
+    def next_range():
+        start, stop, future = pending.popleft()
+        pages, worker_metrics = future.result()
+        metrics.registry.merge(worker_metrics)
+        if progress:
+            progress(start, stop, total)
+        return pages
+
+    with nullcontext(pool) if pool is not None else extraction_pool(workers) as pool:
+        try:
+            for start, stop in ranges:
+                pending.append((start, stop, pool.submit(extract_page_range, pdf_path, start, stop, *cache_args)))
+                if len(pending) >= window:
+                    yield from next_range()
+            while pending:
+                yield from next_range()
+        finally:
+            # Si falla un tramo, progress() pide detenerse (p. ej. al cancelar
+            # un trabajo) o el consumidor deja de leer, no se arrancan los
+            # tramos pendientes
+            for _, _, future in pending:
+                future.cancel()
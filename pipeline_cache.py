@@ -0,0 +1,199 @@
+import argparse
+import hashlib
+import threading
+import time
+import metrics
+import sqlite_util
+
+CACHE_DB = "pipeline_cache.db"
+CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache (
+    key TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    value TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cache_accessed ON cache(accessed);
+CREATE TABLE IF NOT EXISTS cache_size (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    total INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO cache_size SELECT 0, total(size) FROM cache;
+CREATE TRIGGER IF NOT EXISTS cache_ai AFTER INSERT ON cache BEGIN
+    UPDATE cache_size SET total = total + new.size;
+END;
+CREATE TRIGGER IF NOT EXISTS cache_ad AFTER DELETE ON cache BEGIN
+    UPDATE cache_size SET total = total - old.size;
+END;
+"""
+
+CACHE_REQUESTS = metrics.counter("pipeline_cache_requests_total", "Consultas a la caché del pipeline por tipo y resultado")
+
+def digest(*parts):
+    h = hashlib.sha256()
+    for part in parts:
+        if not isinstance(part, (bytes, bytearray, memoryview)):
+            part = str(part).encode("utf-8")
+        h.update(part)
+        h.update(b"\0")
+    return h.hexdigest()
+
+def file_digest(path, chunk_size=1024 * 1024):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def llm_key(model, template, block):
+    return "llm:" + digest(model, template, block)
+
+class PipelineCache:
+    # Resultados de extracción, OCR y LLM indexados por el hash de su
+    # contenido. Cuando se pasa de max_bytes se borran las entradas usadas
+    # hace más tiempo (LRU).
+    def __init__(self, path=CACHE_DB, max_bytes=CACHE_MAX_BYTES, timeout=30.0):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self._local = threading.local()
+        self._conn().executescript(SCHEMA)
+
+    def _conn(self):
+        # Para que INSERT OR REPLACE también descuente el tamaño anterior
+        return sqlite_util.connection(
+            self._local, self.path, self.timeout, sqlite_util.PRAGMAS + ("recursive_triggers=ON",)
+        )
+
+    def get(self, key):
+        conn = self._conn()
+        row = conn.execute("SELECT value FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        conn.execute("UPDATE cache SET accessed = ? WHERE key = ?", (time.time(), key))
+        return row[0]
+
+    def put(self, key, kind, value):
+        conn = self._conn()
+        now = time.time()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache (key, kind, value, size, created, accessed) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (key, kind, value, len(value.encode("utf-8")), now, now),
+        )
+        self.evict()
+
+    def get_or_compute(self, key, kind, compute):
+        # Si compute() devuelve None (falla) no se guarda nada
+        value = self.get(key)
+        CACHE_REQUESTS.inc(kind=kind, result="miss" if value is None else "hit")
+        if value is None:
+            value = compute()
+            if value is not None:
+                self.put(key, kind, value)
+        return value
+
+    def total_size(self):
+        return self._conn().execute("SELECT total FROM cache_size").fetchone()[0]
+
+    def evict(self):
+        if self.total_size() <= self.max_bytes:
+            return 0
+        conn = self._conn()
+        removed = 0
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            total = conn.execute("SELECT total FROM cache_size").fetchone()[0]
+            while total > self.max_bytes:
+                rows = conn.execute(
+                    "SELECT key, size FROM cache ORDER BY accessed LIMIT 100"
+                ).fetchall()
+                if not rows:
+                    break
+                for key, size in rows:
+                    if total <= self.max_bytes:
+                        break
+                    conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                    total -= size
+                    removed += 1
+        return removed
+
+    def clear(self, kind=None):
+        conn = self._conn()
+        if kind:
+            cur = conn.execute("DELETE FROM cache WHERE kind = ?", (kind,))
+        else:
+            cur = conn.execute("DELETE FROM cache")
+        conn.execute("VACUUM")
+        return cur.rowcount
+
+    def stats(self):
+        return self._conn().execute(
+            "SELECT kind, count(*), total(size), min(accessed), max(accessed) "
+            "FROM cache GROUP BY kind ORDER BY kind"
+        ).fetchall()
+
+    def entries(self, kind=None, limit=50):
+        query = "SELECT key, kind, size, accessed FROM cache"
+        params = ()
+        if kind:
+            query += " WHERE kind = ?"
+            params = (kind,)
+        query += " ORDER BY accessed DESC LIMIT ?"
+        return self._conn().execute(query, params + (limit,)).fetchall()
+
+_caches = {}
+
+def get_cache(path, max_bytes=CACHE_MAX_BYTES):
+    # Una instancia por ruta en cada proceso (útil en los workers del pool)
+    cache = _caches.get(path)
+    if cache is None:
+        cache = _caches[path] = PipelineCache(path, max_bytes)
+    return cache
+
+def _format_size(size):
+    return f"{size / (1024 * 1024):.1f} MB"
+
+def _format_time(ts):
+    return time.strftime("%Y-%m-%d %H:%M", time.localtime(ts))
+
+def main():
+    parser = argparse.ArgumentParser(description="Caché de extracción, OCR y respuestas del LLM")
+    parser.add_argument("--db", default=CACHE_DB)
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("stats", help="Resumen por tipo de entrada")
+    list_parser = sub.add_parser("list", help="Entradas usadas más recientemente")
+    list_parser.add_argument("--kind")
+    list_parser.add_argument("--limit", type=int, default=50)
+    clear_parser = sub.add_parser("clear", help="Borra la caché (o solo un tipo)")
+    clear_parser.add_argument("--kind")
+    evict_parser = sub.add_parser("evict", help="Aplica un límite de tamaño")
+    evict_parser.add_argument("--max-mb", type=float, required=True)
+    args = parser.parse_args()
+
+    cache = PipelineCache(args.db)
+    if args.command == "stats":
+        total_count, total_size = 0, 0
+        for kind, count, size, oldest, newest in cache.stats():
+            print(f"{kind:8} {count:8} entradas {_format_size(size):>10}  "
+                  f"uso: {_format_time(oldest)} - {_format_time(newest)}")
+            total_count += count
+            total_size += size
+        print(f"{'total':8} {total_count:8} entradas {_format_size(total_size):>10}")
+    elif args.command == "list":
+        for key, kind, size, accessed in cache.entries(args.kind, args.limit):
+            print(f"{_format_time(accessed)}  {kind:8} {size:10}  {key}")
+    elif args.command == "clear":
+        removed = cache.clear(args.kind)
+        print(f"🧹 {removed} entrada(s) borradas.")
+    else:
+        cache.max_bytes = int(args.max_mb * 1024 * 1024)
+        removed = cache.evict()
+        print(f"🧹 {removed} entrada(s) borradas para quedar en {args.max_mb} MB.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+import unicodedata
+from collections import deque
+
+# La tilde de la ñ no es un acento: "año" y "ano" son palabras distintas
+TILDE = "\u0303"
+
+def fold_text(text, fold_accents=False):
+    if not fold_accents:
+        return text.lower()
+    kept = []
+    for c in unicodedata.normalize("NFD", text.casefold()):
+        if unicodedata.combining(c) and not (c == TILDE and kept and kept[-1] == "n"):
+            continue
+        kept.append(c)
+    return unicodedata.normalize("NFC", "".join(kept))
+
+def _is_word_char(c):
+    return c.isalnum() or c == "_"
+
+class ProhibitedMatcher:
+    # Autómata de Aho–Corasick: revisa el mensaje en una sola pasada sin
+    # importar cuántas palabras tenga la lista.
+    def __init__(self, words, whole_word=False, fold_accents=False):
+        self.whole_word = whole_word
+        self.fold_accents = fold_accents
+        self.words = []
+        seen = set()
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [()]
+
+        for word in words:
+            word = fold_text(word.strip(), fold_accents)
+            if word and word not in seen:
+                seen.add(word)
+                self.words.append(word)
+                self._insert(word)
+        self._build_failure_links()
+
+    def __len__(self):
+        return len(self.words)
+
+    def _insert(self, word):
+        state = 0
+        for c in word:
+            nxt = self._goto[state].get(c)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][c] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+            state = nxt
+        self._out[state] = self._out[state] + (word,)
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for c, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and c not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(c, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def search(self, text):
+        if not self.words:
+            return None
+        text = fold_text(text, self.fold_accents)
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for i, c in enumerate(text):
+            while state and c not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(c, 0)
+            for word in out[state]:
+                if not self.whole_word or self._is_whole_word(text, i - len(word) + 1, i + 1):
+                    return word
+        return None
+
+    def _is_whole_word(self, text, start, end):
+        if start > 0 and _is_word_char(text[start - 1]):
+            return False
+        if end < len(text) and _is_word_char(text[end]):
+            return False
+        return True
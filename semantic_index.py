@@ -0,0 +1,173 @@
+import json
+import os
+import threading
+import numpy as np
+from faq_store import normalize_question
+
+EMBED_BATCH = 64
+
+class SemanticIndex:
+    # Vectores de las preguntas guardadas en una matriz float32 contigua
+    # (<path>.f32, mapeada en memoria), sus claves una por línea
+    # (<path>.keys) y el modelo y dimensión (<path>.json). Cada
+    # consulta es un solo producto matriz-vector sobre vectores unitarios,
+    # así que el resultado ya es la similitud coseno.
+    #
+    # Solo sync() escribe los archivos (una vez, al arrancar). Las preguntas
+    # que llegan después (add_many, p. ej. suscrito a FAQStore) se guardan en
+    # memoria en cada proceso, para que varios workers no escriban a la vez
+    # en los mismos archivos; el siguiente sync() las pasa a disco.
+    def __init__(self, path, embed, model):
+        self.path = path
+        self.embed = embed
+        self.model = model
+        self.dim = None
+        self._keys = []
+        self._key_set = set()
+        self._matrix = None
+        self._added_keys = []
+        self._added_set = set()
+        self._added = None
+        self._pending = {}
+        self._answers = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def __len__(self):
+        return len(self._keys) + len(self._added_keys)
+
+    @property
+    def _vectors_path(self):
+        return self.path + ".f32"
+
+    @property
+    def _keys_path(self):
+        return self.path + ".keys"
+
+    @property
+    def _meta_path(self):
+        return self.path + ".json"
+
+    def _load(self):
+        paths = (self._meta_path, self._vectors_path, self._keys_path)
+        if not all(os.path.exists(p) for p in paths):
+            return
+        with open(self._meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("model") != self.model:
+            # Vectores de otro modelo: no son comparables, se recalculan
+            return
+        self.dim = meta["dim"]
+        with open(self._keys_path, encoding="utf-8") as f:
+            keys = f.read().split("\n")[:-1]
+        # Si una escritura quedó a medias solo cuentan las filas completas
+        rows = os.path.getsize(self._vectors_path) // (self.dim * 4)
+        self._keys = keys[:rows]
+        self._key_set = set(self._keys)
+        self._remap()
+
+    def _remap(self):
+        rows = len(self._keys)
+        if rows == 0:
+            self._matrix = None
+            return
+        self._matrix = np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dim))
+
+    def _save_meta(self):
+        with open(self._meta_path, "w", encoding="utf-8") as f:
+            json.dump({"model": self.model, "dim": self.dim}, f)
+
+    def _embed(self, texts):
+        vectors = np.asarray(self.embed(texts), dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def _append(self, questions):
+        keys = [normalize_question(q) for q in questions]
+        vectors = []
+        for start in range(0, len(questions), EMBED_BATCH):
+            vectors.append(self._embed(questions[start:start + EMBED_BATCH]))
+        vectors = np.concatenate(vectors)
+
+        if self.dim is None or not self._keys:
+            self.dim = vectors.shape[1]
+            self._save_meta()
+            mode = "w"
+        else:
+            mode = "a"
+        with open(self._keys_path, mode, encoding="utf-8", newline="\n") as f:
+            f.write("".join(key + "\n" for key in keys))
+        with open(self._vectors_path, mode + "b") as f:
+            f.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+        # Se publica una lista nueva: las búsquedas en curso conservan la suya
+        self._keys = self._keys + keys
+        self._key_set.update(keys)
+        self._remap()
+
+    def sync(self, rows):
+        # Se calcula el vector solo de las preguntas que aún no lo tienen
+        with self._lock:
+            self._answers = {normalize_question(q): a for q, a in rows}
+            missing = {}
+            for question, _ in rows:
+                key = normalize_question(question)
+                if key not in self._key_set and key not in missing:
+                    missing[key] = question
+            if missing:
+                self._append(list(missing.values()))
+            self._added_keys, self._added_set, self._added, self._pending = [], set(), None, {}
+
+    def add_many(self, rows):
+        # Preguntas nuevas o respuestas corregidas después de sync(). Las
+        # respuestas se actualizan siempre; si el modelo de embeddings no
+        # responde, las preguntas nuevas se intentan de nuevo en la próxima
+        # llamada.
+        with self._lock:
+            for question, answer in rows:
+                key = normalize_question(question)
+                self._answers[key] = answer
+                if key not in self._key_set and key not in self._added_set:
+                    self._pending[key] = question
+            if not self._pending:
+                return
+            try:
+                vectors = np.concatenate([
+                    self._embed(list(self._pending.values())[start:start + EMBED_BATCH])
+                    for start in range(0, len(self._pending), EMBED_BATCH)
+                ])
+            except Exception as e:
+                print(f"⚠️ No se pudieron calcular {len(self._pending)} embedding(s): {e}")
+                return
+            if self._added is not None:
+                vectors = np.concatenate([self._added, vectors])
+            # Se publican arreglos nuevos: las búsquedas en curso conservan los suyos
+            self._added_keys = self._added_keys + list(self._pending)
+            self._added_set.update(self._pending)
+            self._added = vectors
+            self._pending = {}
+
+    def search(self, question, threshold, k=5):
+        segments = [(m, keys) for m, keys in ((self._matrix, self._keys), (self._added, self._added_keys))
+                    if m is not None]
+        if not segments:
+            return None
+        query = self._embed([question])[0]
+        candidates = []
+        for matrix, keys in segments:
+            scores = matrix @ query
+            top = np.argpartition(-scores, min(k, len(scores)) - 1)[:k]
+            candidates.extend((float(scores[i]), keys[i]) for i in top)
+        for score, key in sorted(candidates, key=lambda c: -c[0])[:k]:
+            if score < threshold:
+                break
+            answer = self._answers.get(key)
+            if answer is not None:
+                return answer, score
+        return None
+
+    def find_similar(self, question, threshold, k=5):
+        match = self.search(question, threshold, k)
+        if match is None:
+            return None
+        return match[0]
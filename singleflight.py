@@ -0,0 +1,95 @@
+import threading
+from faq_store import normalize_question, token_similarity, tokenize
+
+class FlightError(Exception):
+    pass
+
+class Flight:
+    # Una generación en curso. Quien la inicia publica los fragmentos y
+    # cualquier número de solicitudes puede seguirlos o esperar el total.
+    def __init__(self, question):
+        self.question = question
+        self.key = normalize_question(question)
+        self.tokens = tokenize(question)
+        self.followers = 0
+        self._chunks = []
+        self._done = False
+        self._error = None
+        self._cond = threading.Condition()
+
+    def publish(self, chunk):
+        with self._cond:
+            self._chunks.append(chunk)
+            self._cond.notify_all()
+
+    def finish(self, error=None):
+        with self._cond:
+            if not self._done:
+                self._done = True
+                self._error = error
+                self._cond.notify_all()
+
+    @property
+    def done(self):
+        return self._done
+
+    def text(self):
+        with self._cond:
+            return "".join(self._chunks)
+
+    def follow(self):
+        seen = 0
+        while True:
+            with self._cond:
+                while seen >= len(self._chunks) and not self._done:
+                    self._cond.wait()
+                chunks = self._chunks[seen:]
+                done = self._done
+                error = self._error
+            seen += len(chunks)
+            yield from chunks
+            if done:
+                break
+        if error:
+            raise FlightError(error)
+
+    def result(self):
+        return "".join(self.follow())
+
+class SingleFlight:
+    # Agrupa las preguntas iguales (misma clave normalizada) o lo bastante
+    # parecidas a una que ya se está generando, para que solo una llegue al
+    # modelo.
+    def __init__(self, similarity_threshold=None):
+        self.similarity_threshold = similarity_threshold
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._flights)
+
+    def join_or_lead(self, question):
+        flight = Flight(question)
+        with self._lock:
+            current = self._flights.get(flight.key) or self._find_similar(flight.tokens)
+            if current is not None:
+                current.followers += 1
+                return current, False
+            self._flights[flight.key] = flight
+            return flight, True
+
+    def _find_similar(self, tokens):
+        if self.similarity_threshold is None or not tokens:
+            return None
+        best, best_score = None, 0.0
+        for flight in self._flights.values():
+            score = token_similarity(flight.tokens, tokens)
+            if score >= self.similarity_threshold and score > best_score:
+                best, best_score = flight, score
+        return best
+
+    def land(self, flight, error=None):
+        with self._lock:
+            if self._flights.get(flight.key) is flight:
+                del self._flights[flight.key]
+        flight.finish(error)
@@ -0,0 +1,16 @@
+import os
+import sqlite3
+
+PRAGMAS = ("journal_mode=WAL", "synchronous=NORMAL")
+
+def connection(local, path, timeout=30.0, pragmas=PRAGMAS):
+    # Una conexión por hilo y por proceso (no se comparten tras un fork);
+    # local es el threading.local() de quien la usa
+    conn = getattr(local, "conn", None)
+    if conn is None or local.pid != os.getpid():
+        conn = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+        for pragma in pragmas:
+            conn.execute(f"PRAGMA {pragma}")
+        local.conn = conn
+        local.pid = os.getpid()
+    return conn
@@ -0,0 +1,81 @@
+import multiprocessing
+import os
+import threading
+import time
+import pytest
+from admission import AdmissionGate, Busy, RateLimiter, SharedAdmissionGate, SharedRateLimiter
+
+def test_gate_queues_then_refuses():
+    gate = AdmissionGate(limit=2, max_waiting=1, timeout=5)
+    gate.acquire()
+    gate.acquire()
+    admitted = threading.Event()
+
+    def waiter():
+        gate.acquire()
+        admitted.set()
+
+    thread = threading.Thread(target=waiter)
+    thread.start()
+    while not gate._waiting:
+        time.sleep(0.01)
+    with pytest.raises(Busy):
+        gate.acquire()
+    assert not admitted.is_set()
+    gate.release()
+    thread.join(5)
+    assert admitted.is_set() and gate.running == 2
+
+def test_gate_times_out_waiting():
+    gate = AdmissionGate(limit=1, max_waiting=5, timeout=0.1)
+    gate.acquire()
+    start = time.monotonic()
+    with pytest.raises(Busy):
+        gate.acquire()
+    assert time.monotonic() - start >= 0.1
+    assert gate.running == 1 and gate._waiting == 0
+
+def test_rate_limiter_allows_burst_then_refills():
+    limiter = RateLimiter(rate=20, burst=3)
+    assert [limiter.allow("a") for _ in range(3)] == [0.0, 0.0, 0.0]
+    retry_after = limiter.allow("a")
+    assert 0 < retry_after <= 1 / 20
+    assert limiter.allow("b") == 0.0
+    time.sleep(retry_after + 0.01)
+    assert limiter.allow("a") == 0.0
+
+def test_rate_limiter_forgets_idle_clients():
+    limiter = RateLimiter(rate=1000, burst=1, max_clients=10)
+    for i in range(50):
+        limiter.allow(str(i))
+        time.sleep(0.002)
+    assert len(limiter._buckets) <= 11
+
+def test_shared_limits_hold_across_instances(tmp_path):
+    path = str(tmp_path / "admission.db")
+    gates = [SharedAdmissionGate(path, 2, 0, 1) for _ in range(3)]
+    slots = [gates[0].acquire(), gates[1].acquire()]
+    with pytest.raises(Busy):
+        gates[2].acquire()
+    gates[0].release(slots.pop())
+    slots.append(gates[2].acquire())
+    assert gates[1].running == 2
+
+    limiters = [SharedRateLimiter(path, rate=1, burst=2) for _ in range(2)]
+    assert limiters[0].allow("x") == 0.0
+    assert limiters[1].allow("x") == 0.0
+    assert limiters[0].allow("x") > 0
+
+def _hold_slot(path):
+    SharedAdmissionGate(path, 1, 0, 1).acquire()
+
+@pytest.mark.skipif(os.name != "posix", reason="los lugares de procesos muertos solo se liberan en POSIX")
+def test_shared_gate_reclaims_slots_of_dead_workers(tmp_path):
+    path = str(tmp_path / "admission.db")
+    gate = SharedAdmissionGate(path, 1, 0, 1)
+    process = multiprocessing.get_context("fork").Process(target=_hold_slot, args=(path,))
+    process.start()
+    process.join(10)
+    assert gate.running == 1
+    gate.release(gate.acquire())
+    assert gate.running == 0
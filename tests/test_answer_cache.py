@@ -0,0 +1,79 @@
+import sqlite3
+import time
+import answer_cache
+from answer_cache import AnswerCache
+
+QUESTION = "¿Cuándo abre el registro de admisión?"
+
+def used_at(cache):
+    return cache._conn().execute("SELECT used_at FROM answers").fetchone()[0]
+
+def test_hit_only_writes_when_used_at_is_stale(tmp_path):
+    cache = AnswerCache(str(tmp_path / "answers.db"))
+    cache.add(QUESTION, "En mayo.")
+    added = used_at(cache)
+    assert cache.find_similar(QUESTION, 0.6) == "En mayo."
+    assert used_at(cache) == added
+    cache._conn().execute("UPDATE answers SET used_at = used_at - ?", (answer_cache.TOUCH_INTERVAL + 1,))
+    assert cache.find_similar(QUESTION, 0.6) == "En mayo."
+    assert used_at(cache) >= added
+
+def test_hit_does_not_wait_for_a_locked_database(tmp_path):
+    path = str(tmp_path / "answers.db")
+    cache = AnswerCache(path)
+    cache.add(QUESTION, "En mayo.")
+    cache._conn().execute("UPDATE answers SET used_at = 0")
+    writer = sqlite3.connect(path, isolation_level=None)
+    writer.execute("BEGIN IMMEDIATE")
+    try:
+        start = time.monotonic()
+        assert cache.find_similar(QUESTION, 0.6) == "En mayo."
+        assert time.monotonic() - start < 1
+    finally:
+        writer.execute("ROLLBACK")
+    assert used_at(cache) == 0
+    assert cache.find_similar(QUESTION, 0.6) == "En mayo."
+    assert used_at(cache) > 0
+
+def test_only_complete_answers_are_cached(tmp_path):
+    cache = AnswerCache(str(tmp_path / "answers.db"))
+    assert answer_cache.is_cacheable("En mayo.")
+    assert not answer_cache.is_cacheable("   ")
+    assert not answer_cache.is_cacheable(None)
+    assert not answer_cache.is_cacheable("Error: 500 - model not found")
+    assert not cache.add(QUESTION, "Error: tiempo agotado")
+    assert len(cache) == 0
+
+def test_answers_expire_after_ttl(tmp_path):
+    cache = AnswerCache(str(tmp_path / "answers.db"), ttl=0.2)
+    cache.add(QUESTION, "En mayo.")
+    assert cache.find_similar(QUESTION, 0.6) == "En mayo."
+    time.sleep(0.3)
+    assert cache.find_similar(QUESTION, 0.6) is None
+    assert len(cache) == 0
+    assert cache.purge() == 1
+
+def test_least_recently_used_answers_are_evicted(tmp_path):
+    cache = AnswerCache(str(tmp_path / "answers.db"), max_entries=2)
+    cache.add("¿Cuándo abre el registro?", "En mayo.")
+    cache.add("¿Qué documentos piden?", "Título y constancia.")
+    conn = cache._conn()
+    conn.execute("UPDATE answers SET used_at = 1 WHERE question LIKE '%registro%'")
+    conn.execute("UPDATE answers SET used_at = 2 WHERE question LIKE '%documentos%'")
+    cache.add("¿Dónde consulto resultados?", "En la plataforma.")
+    assert len(cache) == 2
+    assert cache.find_similar("¿Cuándo abre el registro?", 0.6) is None
+    assert cache.find_similar("¿Qué documentos piden?", 0.6) == "Título y constancia."
+
+def test_invalidate_removes_only_the_given_topics(tmp_path):
+    cache = AnswerCache(str(tmp_path / "answers.db"))
+    assert answer_cache.topics_for("¿Requisitos de promoción vertical para director?") == ["promocion_vertical"]
+    cache.add("¿Cuándo es el examen de admisión?", "En junio.")
+    cache.add("¿Requisitos para ser director?", "Cinco años de servicio.")
+    cache.add("¿Cómo cambio mi contraseña?", "Desde tu perfil.")
+    assert cache.stats() == {"admision": 1, "promocion_vertical": 1, "(sin tema)": 1}
+    assert cache.invalidate(["admision"]) == 1
+    assert cache.find_similar("¿Cuándo es el examen de admisión?", 0.6) is None
+    assert cache.find_similar("¿Requisitos para ser director?", 0.6) == "Cinco años de servicio."
+    assert cache.invalidate() == 2
+    assert len(cache) == 0
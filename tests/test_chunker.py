@@ -0,0 +1,38 @@
+from chunker import chunk_pages, estimate_tokens, iter_units
+
+def test_units_rebuild_headings_items_and_paragraphs():
+    pages = [
+        "BASES\nPrimera. Los aspirantes deberán regis-\ntrarse en la plataforma y\n",
+        "cumplir los requisitos.\n1. Título profesional.\n2. Constancia de servicio.\n",
+    ]
+    assert list(iter_units(pages)) == [
+        ("heading", "BASES"),
+        ("paragraph", "Primera. Los aspirantes deberán registrarse en la plataforma y cumplir los requisitos."),
+        ("item", "1. Título profesional."),
+        ("item", "2. Constancia de servicio."),
+    ]
+
+def test_chunks_respect_budget_and_keep_headings_with_content():
+    paragraph = "Los aspirantes deberán presentar la documentación en la fecha indicada."
+    pages = ["\n".join(["CAPÍTULO PRIMERO", paragraph, paragraph, "CAPÍTULO SEGUNDO", paragraph, paragraph])]
+    chunks = list(chunk_pages(pages, max_tokens=55))
+    assert all(estimate_tokens(chunk) + chunk.count("\n") <= 55 for chunk in chunks)
+    assert not any(chunk.endswith(("PRIMERO", "SEGUNDO")) for chunk in chunks)
+    assert any(chunk.startswith("CAPÍTULO SEGUNDO") for chunk in chunks)
+    assert "\n".join(chunks).count(paragraph) == 4
+
+def test_overlap_repeats_the_last_units_of_the_previous_chunk():
+    units = [f"Requisito número {i} para el registro." for i in range(8)]
+    chunks = list(chunk_pages(["\n".join(units)], max_tokens=40, overlap_tokens=15))
+    assert len(chunks) > 1
+    for previous, chunk in zip(chunks, chunks[1:]):
+        assert chunk.split("\n")[0] == previous.split("\n")[-1]
+    assert all(estimate_tokens(chunk) + chunk.count("\n") <= 40 for chunk in chunks)
+
+def test_long_word_is_split_to_fit_budget():
+    url = "https://www.usicamm.sep.gob.mx/" + "x" * 400
+    chunks = list(chunk_pages([f"Consulte la convocatoria en {url} antes de registrarse."], max_tokens=20))
+    assert all(estimate_tokens(chunk) <= 20 for chunk in chunks)
+    assert "".join(chunk.replace("\n", "").replace(" ", "") for chunk in chunks) == (
+        f"Consultelaconvocatoriaen{url}antesderegistrarse."
+    )
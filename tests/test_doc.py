@@ -0,0 +1,50 @@
+import json
+import Doc
+from answer_cache import AnswerCache
+
+def analysis(requirements, faq):
+    return json.dumps({"requisitos": requirements, "faq": faq}, ensure_ascii=False)
+
+def test_requirements_and_questions_are_parsed():
+    result, pairs = Doc.parse_analysis(analysis(
+        ["Acta de nacimiento", " CURP ", ""],
+        [{"pregunta": "¿Qué documentos se entregan?", "respuesta": " Acta y CURP. "}],
+    ))
+    assert result == "- Acta de nacimiento\n- CURP"
+    assert pairs == [("¿Qué documentos se entregan?", "Acta y CURP.")]
+
+def test_requirements_may_come_as_text():
+    result, pairs = Doc.parse_analysis(json.dumps({"requisitos": "Acta\nCURP"}))
+    assert result == "- Acta\n- CURP"
+    assert pairs == []
+
+def test_malformed_responses_are_discarded():
+    assert Doc.parse_analysis("no es JSON") == ("", [])
+    assert Doc.parse_analysis("[1, 2]") == ("", [])
+    assert Doc.parse_analysis(json.dumps({"requisitos": 3, "faq": "nada"})) == ("", [])
+
+def test_invalid_questions_are_dropped():
+    _, pairs = Doc.parse_analysis(analysis([], [
+        "no es un objeto",
+        {"pregunta": "¿Fechas?", "respuesta": "En mayo."},
+        {"pregunta": "¿Cuándo cierra el registro?", "respuesta": ""},
+        {"pregunta": "¿Cuándo cierra el registro?", "respuesta": "x" * (Doc.FAQ_MAX_ANSWER_CHARS + 1)},
+        {"pregunta": 7, "respuesta": "En mayo."},
+        {"pregunta": "¿Cuándo cierra el registro?", "respuesta": "El 30 de mayo."},
+    ]))
+    assert pairs == [("¿Cuándo cierra el registro?", "El 30 de mayo.")]
+
+def test_questions_are_limited_per_block():
+    faq = [{"pregunta": f"¿Cuál es el requisito {i}?", "respuesta": "Ninguno."} for i in range(10)]
+    _, pairs = Doc.parse_analysis(analysis([], faq))
+    assert len(pairs) == Doc.FAQS_PER_BLOCK
+
+def test_documents_without_topic_keep_the_chat_answers(tmp_path, monkeypatch):
+    cache = AnswerCache(str(tmp_path / "answers.db"))
+    cache.add("¿Cuándo abre el registro de admisión?", "En mayo.")
+    cache.add("¿Qué pasa con mi pago?", "Se acredita en 48 horas.")
+    monkeypatch.setattr(Doc, "answer_cache", cache)
+    assert Doc.invalidate_answers("aviso.pdf", set()) == 0
+    assert len(cache) == 2
+    assert Doc.invalidate_answers("admision.pdf", {"admision"}) == 1
+    assert len(cache) == 1
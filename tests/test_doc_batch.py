@@ -0,0 +1,64 @@
+import json
+import os
+import threading
+from concurrent.futures import Future
+from doc_batch import Batch, Manifest, batch_parser
+
+def make_batch(tmp_path, *extra):
+    source = tmp_path / "pdfs"
+    source.mkdir(exist_ok=True)
+    for name in ("a.pdf", "b.pdf", "c.pdf"):
+        (source / name).write_bytes(b"%PDF")
+    args = batch_parser("prueba", str(source), str(tmp_path / "out"), 3, 1, 2).parse_args(list(extra))
+    return Batch(args)
+
+def run(batch, process):
+    with batch:
+        return batch.run(process, lambda path: "v1")
+
+def test_manifest_resumes_only_unfinished_documents(tmp_path):
+    processed = []
+    fail = {"b.pdf"}
+
+    def process(batch, pdf_path):
+        name = os.path.basename(pdf_path)
+        processed.append(name)
+        if name in fail:
+            raise RuntimeError("sin respuesta del modelo")
+        if name == "c.pdf":
+            # La conversión termina después, en otro hilo
+            future = Future()
+            threading.Timer(0.1, future.set_result, ("c.pdf",)).start()
+            return {"pages": 1, "blocks": 1, "tokens": 10}, future
+        return {"pages": 1, "blocks": 1, "tokens": 10}
+
+    stats = run(make_batch(tmp_path), process)
+    assert stats.counts["documents"] == 2 and stats.counts["failed"] == 1
+    manifest = (tmp_path / "out" / "manifest.jsonl").read_text(encoding="utf-8")
+    assert sorted(json.loads(line)["file"] for line in manifest.splitlines()) == ["a.pdf", "c.pdf"]
+
+    processed.clear()
+    fail.clear()
+    stats = run(make_batch(tmp_path), process)
+    assert processed == ["b.pdf"]
+    assert stats.counts["skipped"] == 2 and stats.counts["documents"] == 1
+
+def test_failed_deferred_step_is_not_recorded(tmp_path):
+    def process(batch, pdf_path):
+        future = Future()
+        future.set_exception(RuntimeError("LibreOffice no respondió"))
+        return {"pages": 1, "blocks": 1, "tokens": 1}, future
+
+    stats = run(make_batch(tmp_path), process)
+    assert stats.counts["failed"] == 3
+    assert Manifest(str(tmp_path / "out" / "manifest.jsonl"))._done == {}
+
+def test_manifest_ignores_a_truncated_last_line(tmp_path):
+    path = tmp_path / "manifest.jsonl"
+    path.write_text('{"file": "a.pdf", "key": "v1"}\n{"file": "b.pdf", "ke', encoding="utf-8")
+    manifest = Manifest(str(path))
+    assert manifest.is_done("a.pdf", "v1")
+    assert not manifest.is_done("b.pdf", "v1")
+    assert not manifest.is_done("a.pdf", "v2")
+    manifest.record("b.pdf", "v1")
+    assert Manifest(str(path)).is_done("b.pdf", "v1")
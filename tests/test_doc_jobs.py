@@ -0,0 +1,48 @@
+import threading
+from doc_jobs import CANCELLED, CANCELLING, DONE, QUEUED, RUNNING, JobQueue
+
+def wait_finished(jobs, job_id, timeout=5):
+    for seq, event in jobs.follow(job_id, heartbeat=timeout):
+        pass
+    return jobs.status(job_id)
+
+def test_unfinished_jobs_resume_after_restart(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    # Primer "servidor": recibe trabajos pero se cae antes de terminarlos
+    crashed = JobQueue(lambda job: None, path=path)
+    queued = crashed.submit({"folder": "a"})
+    running = crashed.submit({"folder": "b"})
+    cancelling = crashed.submit({"folder": "c"})
+    conn = crashed._conn()
+    conn.execute("UPDATE jobs SET status = ? WHERE id = ?", (RUNNING, running))
+    conn.execute("UPDATE jobs SET status = ? WHERE id = ?", (CANCELLING, cancelling))
+
+    ran = []
+    lock = threading.Lock()
+
+    def runner(job):
+        with lock:
+            ran.append(job.params["folder"])
+
+    jobs = JobQueue(runner, path=path)
+    assert jobs.status(queued) == QUEUED
+    jobs.start()
+    assert wait_finished(jobs, queued) == DONE
+    assert wait_finished(jobs, running) == DONE
+    assert jobs.status(cancelling) == CANCELLED
+    assert sorted(ran) == ["a", "b"]
+    messages = [event.get("message", "") for _, event in jobs.events(running)]
+    assert any("reinició" in message for message in messages)
+
+def test_finished_jobs_are_not_run_again(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    ran = []
+    first = JobQueue(lambda job: ran.append(job.id), path=path)
+    first.start()
+    job_id = first.submit({})
+    assert wait_finished(first, job_id) == DONE
+
+    second = JobQueue(lambda job: ran.append(job.id), path=path)
+    second.start()
+    assert second.status(job_id) == DONE
+    assert ran == [job_id]
@@ -0,0 +1,84 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from docx import Document
+from doc_pipeline import DocxStreamWriter, map_ordered
+
+def test_map_ordered_keeps_order_and_window():
+    rng = random.Random(5)
+    delays = [rng.random() / 100 for _ in range(40)]
+    running, peak = 0, 0
+    lock = threading.Lock()
+
+    def work(i):
+        nonlocal running, peak
+        with lock:
+            running += 1
+            peak = max(peak, running)
+        time.sleep(delays[i])
+        with lock:
+            running -= 1
+        return i * i
+
+    with ThreadPoolExecutor(8) as pool:
+        assert list(map_ordered(pool, work, range(40), window=3)) == [i * i for i in range(40)]
+    assert peak <= 3
+
+def test_map_ordered_pulls_items_lazily():
+    pulled = []
+
+    def items():
+        for i in range(100):
+            pulled.append(i)
+            yield i
+
+    with ThreadPoolExecutor(2) as pool:
+        results = map_ordered(pool, lambda i: i, items(), window=4)
+        assert next(results) == 0
+        assert len(pulled) <= 5
+        results.close()
+
+def test_map_ordered_cancels_pending_work_when_check_fails():
+    started = []
+    stop = threading.Event()
+
+    def work(i):
+        started.append(i)
+        time.sleep(0.05)
+        return i
+
+    def check():
+        if stop.is_set():
+            raise RuntimeError("cancelado")
+
+    with ThreadPoolExecutor(1) as pool:
+        results = map_ordered(pool, work, range(20), window=5, check=check, poll=0.01)
+        assert next(results) == 0
+        stop.set()
+        with pytest.raises(RuntimeError):
+            list(results)
+    assert len(started) <= 6
+
+def test_docx_writer_escapes_text_and_keeps_line_breaks(tmp_path):
+    path = str(tmp_path / "salida.docx")
+    with DocxStreamWriter(path, "Respuestas <USICAMM>") as writer:
+        writer.add_paragraph("Requisitos & fechas: <b>no es HTML</b>\x0b\x01")
+        writer.add_paragraph("Primera línea\nSegunda \"línea\"")
+    document = Document(path)
+    texts = [paragraph.text for paragraph in document.paragraphs]
+    assert texts == [
+        "Respuestas <USICAMM>",
+        "Requisitos & fechas: <b>no es HTML</b>",
+        "Primera línea\nSegunda \"línea\"",
+    ]
+    assert document.paragraphs[0].style.name == "Heading 1"
+
+def test_docx_writer_leaves_no_file_on_error(tmp_path):
+    path = str(tmp_path / "salida.docx")
+    with pytest.raises(RuntimeError):
+        with DocxStreamWriter(path, "Título") as writer:
+            writer.add_paragraph("parcial")
+            raise RuntimeError("falló el modelo")
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,73 @@
+import os
+import random
+import sqlite3
+import time
+from faq_db import FAQDatabase, SQLiteFAQStore
+from faq_store import FAQIndex, normalize_question
+from test_faq_store import corpus, queries
+
+def test_fts_search_matches_faq_index(tmp_path):
+    rng = random.Random(11)
+    rows = corpus(rng, 200)
+    database = FAQDatabase(str(tmp_path / "faq.db"))
+    assert database.add_many(rows) == len(rows)
+    index = FAQIndex(database.rows())
+    for question in queries(rng, 300):
+        for threshold in (0.3, 0.6):
+            expected = index.search(question, threshold)
+            found = database.search(question, threshold)
+            if expected is None:
+                assert found is None
+            else:
+                qid, score = expected
+                assert found is not None
+                assert found[0][1] == index.rows[qid][0]
+                assert found[1] == score
+
+def test_normalize_question_keeps_word_order():
+    assert normalize_question("¿Puedo participar si no tengo título?") == "puedo participar si no tengo titulo"
+    assert normalize_question("¿No puedo participar si tengo título?") != normalize_question(
+        "¿Puedo participar si no tengo título?"
+    )
+    assert normalize_question("  ¿CUÁNDO   abre la Admisión?? ") == normalize_question("cuando abre la admision")
+    assert normalize_question("¿En qué año?") != normalize_question("¿En qué ano?")
+
+def test_database_keeps_questions_that_differ_only_in_order(tmp_path):
+    database = FAQDatabase(str(tmp_path / "faq.db"))
+    assert database.add("¿Puedo participar si no tengo título?", "No.")
+    assert database.add("¿No puedo participar si tengo título?", "Sí.")
+    assert not database.add("¿puedo participar si no tengo titulo", "Otra.")
+    assert len(database) == 2
+
+def test_store_applies_other_writers_changes_incrementally(tmp_path):
+    path = str(tmp_path / "faq.db")
+    responses = tmp_path / "responses.csv"
+    responses.write_text("question,answer\n¿Cuándo abre el registro?,En mayo.\n", encoding="utf-8")
+    store = SQLiteFAQStore(path, str(tmp_path / "prohibidas.csv"), import_from=str(responses), stat_interval=0)
+    index = store._index
+    assert store.find_similar("cuando abre el registro", 0.6) == "En mayo."
+
+    # Otro proceso (p. ej. Doc.py) agrega preguntas
+    FAQDatabase(path).add_many([("¿Qué documentos piden?", "Título y constancia.")])
+    assert store.find_similar("¿qué documentos piden?", 0.6) == "Título y constancia."
+
+    # Los responsables corrigen una respuesta en el CSV
+    responses.write_text("question,answer\n¿Cuándo abre el registro?,En junio.\n", encoding="utf-8")
+    os.utime(responses, ns=(time.time_ns() + 10**9, time.time_ns() + 10**9))
+    assert store.find_similar("cuando abre el registro", 0.6) == "En junio."
+
+    assert store._index is index
+    assert len(index) == 2
+
+def test_database_without_revision_column_is_migrated(tmp_path):
+    path = str(tmp_path / "faq.db")
+    conn = sqlite3.connect(path)
+    conn.executescript(
+        "CREATE TABLE faq (id INTEGER PRIMARY KEY, question TEXT NOT NULL, "
+        "norm_question TEXT NOT NULL UNIQUE, answer TEXT NOT NULL, created_at REAL NOT NULL);"
+        "INSERT INTO faq VALUES (1, '¿Hay examen?', 'hay examen', 'Sí.', 0);"
+    )
+    conn.commit()
+    conn.close()
+    store = SQLiteFAQStore(path, str(tmp_path / "prohibidas.csv"))
+    assert store.find_similar("¿hay examen?", 0.6) == "Sí."
@@ -0,0 +1,35 @@
+import random
+from faq_store import FAQIndex, token_similarity, tokenize
+
+VOCABULARY = (
+    "admisión promoción horizontal vertical docente director supervisor registro fecha "
+    "requisitos constancia título cédula convocatoria resultados etapa valoración curso "
+    "examen asesor tutor plaza horas niño año educación básica media superior"
+).split()
+
+def corpus(rng, size):
+    questions = set()
+    while len(questions) < size:
+        questions.add("¿" + " ".join(rng.sample(VOCABULARY, rng.randint(2, 8))) + "?")
+    return [(question, f"respuesta {i}") for i, question in enumerate(sorted(questions))]
+
+def linear_search(rows, question, threshold):
+    query = tokenize(question)
+    best_id, best_score = None, 0.0
+    for qid, (q, _) in enumerate(rows):
+        score = token_similarity(tokenize(q), query)
+        if score >= threshold and (best_id is None or score > best_score):
+            best_id, best_score = qid, score
+    return None if best_id is None else (best_id, best_score)
+
+def queries(rng, count):
+    for _ in range(count):
+        yield " ".join(rng.sample(VOCABULARY, rng.randint(1, 8)))
+
+def test_faq_index_matches_linear_scan():
+    rng = random.Random(7)
+    rows = corpus(rng, 300)
+    index = FAQIndex(rows)
+    for question in queries(rng, 500):
+        for threshold in (0.3, 0.6, 1.0):
+            assert index.search(question, threshold) == linear_search(rows, question, threshold)
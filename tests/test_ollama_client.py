@@ -0,0 +1,36 @@
+import pytest
+import requests
+from fake_ollama import FakeOllama
+from ollama_client import OllamaClient
+
+def test_read_timeout_is_raised_as_timeout_without_retrying():
+    with FakeOllama(latency=1.0, tokens=3) as fake:
+        client = OllamaClient(fake.url, model=fake.model, timeout=(2, 0.3), retries=2)
+        with pytest.raises(requests.Timeout):
+            client.chat([{"role": "user", "content": "hola"}])
+        client.close()
+        assert fake.requests["/api/chat"] == 1
+
+def test_chat_and_stream_return_the_same_answer():
+    with FakeOllama(latency=0, token_rate=0, tokens=3) as fake:
+        client = OllamaClient(fake.url, model=fake.model)
+        answers = [client.chat([{"role": "user", "content": "hola"}]) for _ in range(3)]
+        assert all(answers)
+        assert "".join(client.chat_stream([{"role": "user", "content": "hola"}])) == answers[0]
+        client.close()
+        assert fake.requests["/api/chat"] == 4
+
+def test_generate_is_not_resent_after_read_timeout():
+    with FakeOllama(latency=1.0, tokens=3) as fake:
+        client = OllamaClient(fake.url, model=fake.model, timeout=(2, 0.3), retries=2)
+        with pytest.raises(requests.Timeout):
+            client.generate("¿Qué requisitos hay?")
+        client.close()
+        assert fake.requests["/api/generate"] == 1
+
+def test_generate_succeeds_without_retries():
+    with FakeOllama(latency=0, token_rate=0, tokens=3) as fake:
+        client = OllamaClient(fake.url, model=fake.model, retries=2)
+        assert client.generate("hola")
+        client.close()
+        assert fake.requests["/api/generate"] == 1
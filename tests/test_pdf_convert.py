@@ -0,0 +1,47 @@
+import os
+import subprocess
+import sys
+import time
+import pytest
+from pdf_convert import ConversionError, OfficeConverter
+
+class HangingOffice(OfficeConverter):
+    # En lugar de LibreOffice, un proceso que no hace nada; el primer
+    # documento se queda esperando igual que una llamada UNO colgada
+    def __init__(self, **kwargs):
+        super().__init__(persistent=True, **kwargs)
+        self.starts = 0
+
+    def _start(self):
+        self._stop()
+        self.starts += 1
+        self._process = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(60)"])
+        self._desktop = object()
+
+    def _stop(self):
+        self._desktop = None
+        if self._process is not None:
+            if self._process.poll() is None:
+                self._process.kill()
+            self._process.wait()
+            self._process = None
+
+    def _store_pdf(self, docx_path, outdir):
+        if os.path.basename(docx_path) == "colgado.docx":
+            self._process.wait()
+            raise RuntimeError("conexión cerrada")
+        return os.path.basename(docx_path) + ".pdf"
+
+def test_hung_conversion_is_killed_and_office_restarted(tmp_path):
+    converter = HangingOffice(timeout=0.5, profile_dir=str(tmp_path))
+    try:
+        start = time.monotonic()
+        hung = converter.submit("colgado.docx", str(tmp_path))
+        ok = converter.submit("bien.docx", str(tmp_path))
+        with pytest.raises(ConversionError):
+            hung.result(timeout=10)
+        assert time.monotonic() - start < 5
+        assert ok.result(timeout=10) == "bien.docx.pdf"
+        assert converter.starts == 2
+    finally:
+        converter.close()
@@ -0,0 +1,47 @@
+import io
+import fitz
+from PIL import Image, ImageDraw
+from pdf_extract import classify_page
+
+PARAGRAPH = (
+    "La convocatoria para el proceso de admisión en educación básica establece los "
+    "requisitos, las etapas y las fechas de registro de los aspirantes. "
+)
+
+def image_bytes(width, height):
+    # Una imagen con "tinta" para que no se descarte como zona en blanco
+    image = Image.new("L", (width, height), 255)
+    draw = ImageDraw.Draw(image)
+    for y in range(10, height - 10, 20):
+        draw.line((10, y, width - 10, y), fill=0, width=4)
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+def new_page():
+    doc = fitz.open()
+    return doc, doc.new_page(width=612, height=792)
+
+def test_logo_on_text_page_is_not_ocr_candidate():
+    doc, page = new_page()
+    # Logo de ~5% de la página en el encabezado
+    page.insert_image(fitz.Rect(36, 36, 186, 186), stream=image_bytes(300, 300))
+    page.insert_textbox(fitz.Rect(72, 220, 540, 740), PARAGRAPH * 6, fontsize=11)
+    kind, blocks, regions = classify_page(page)
+    assert kind == "text"
+    assert blocks and regions == []
+
+def test_small_image_on_page_without_text_is_ocr():
+    doc, page = new_page()
+    page.insert_image(fitz.Rect(72, 72, 272, 222), stream=image_bytes(400, 300))
+    kind, blocks, regions = classify_page(page)
+    assert kind == "ocr"
+    assert len(regions) == 1
+
+def test_large_scan_next_to_text_is_mixed():
+    doc, page = new_page()
+    page.insert_textbox(fitz.Rect(72, 36, 540, 200), PARAGRAPH * 2, fontsize=11)
+    page.insert_image(fitz.Rect(72, 260, 540, 740), stream=image_bytes(900, 900))
+    kind, blocks, regions = classify_page(page)
+    assert kind == "mixed"
+    assert blocks and len(regions) == 1
@@ -0,0 +1,37 @@
+from doc_batch import batch_parser
+from pipeline_cache import PipelineCache
+
+def set_accessed(cache, key, accessed):
+    cache._conn().execute("UPDATE cache SET accessed = ? WHERE key = ?", (accessed, key))
+
+def test_size_stays_under_the_limit(tmp_path):
+    cache = PipelineCache(str(tmp_path / "cache.db"), max_bytes=250)
+    for i in range(10):
+        cache.put(f"k{i}", "llm", "x" * 100)
+        assert cache.total_size() <= 250
+    assert cache.total_size() == 200
+    assert cache.get("k9") is not None
+
+def test_least_recently_used_entries_go_first(tmp_path):
+    cache = PipelineCache(str(tmp_path / "cache.db"), max_bytes=300)
+    for i, key in enumerate(["a", "b", "c"]):
+        cache.put(key, "llm", key * 100)
+        set_accessed(cache, key, i)
+    assert cache.get("a") == "a" * 100
+    cache.put("d", "llm", "d" * 100)
+    assert cache.get("b") is None
+    assert [cache.get(key) is not None for key in "acd"] == [True, True, True]
+
+def test_replacing_an_entry_counts_only_the_new_size(tmp_path):
+    cache = PipelineCache(str(tmp_path / "cache.db"), max_bytes=1000)
+    cache.put("a", "llm", "x" * 100)
+    cache.put("a", "llm", "y" * 40)
+    assert cache.total_size() == 40
+    cache.clear()
+    assert cache.total_size() == 0
+
+def test_cache_path_comes_from_the_command_line(tmp_path):
+    parser = batch_parser("prueba", "in", "out", 1, 1, 1, "cache.db")
+    assert parser.parse_args([]).cache == "cache.db"
+    assert parser.parse_args(["--cache", str(tmp_path / "otra.db")]).cache == str(tmp_path / "otra.db")
+    assert not hasattr(batch_parser("prueba", "in", "out", 1, 1, 1).parse_args([]), "cache")
@@ -0,0 +1,35 @@
+import random
+import re
+from prohibited_filter import ProhibitedMatcher, fold_text
+
+def test_fold_text_strips_accents_but_keeps_enye():
+    assert fold_text("Árbol, canción, pingüino", fold_accents=True) == "arbol, cancion, pinguino"
+    assert fold_text("AÑO y año", fold_accents=True) == "año y año"
+    assert fold_text("Año", fold_accents=False) == "año"
+
+def test_enye_word_does_not_match_its_unaccented_twin():
+    matcher = ProhibitedMatcher(["ano"], whole_word=True, fold_accents=True)
+    assert matcher.search("¿En qué año inicia la convocatoria?") is None
+    assert matcher.search("¿En qué AÑO inicia?") is None
+    assert matcher.search("el ano") == "ano"
+
+def test_accents_are_folded_on_both_sides():
+    matcher = ProhibitedMatcher(["política"], fold_accents=True)
+    assert matcher.search("hablemos de POLITICA") == "politica"
+    assert matcher.search("hablemos de políticas") == "politica"
+
+def test_matcher_agrees_with_substring_search():
+    rng = random.Random(3)
+    alphabet = "abcñ áe"
+    words = sorted({"".join(rng.choices(alphabet[:5], k=rng.randint(1, 4))).strip() or "a" for _ in range(40)})
+    for whole_word in (False, True):
+        matcher = ProhibitedMatcher(words, whole_word=whole_word, fold_accents=True)
+        for _ in range(500):
+            text = fold_text("".join(rng.choices(alphabet, k=rng.randint(0, 30))), fold_accents=True)
+            if whole_word:
+                expected = [w for w in matcher.words if re.search(rf"(?<!\w){re.escape(w)}(?!\w)", text)]
+            else:
+                expected = [w for w in matcher.words if w in text]
+            found = matcher.search(text)
+            assert (found is None) == (not expected)
+            assert found is None or found in expected
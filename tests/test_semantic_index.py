@@ -0,0 +1,83 @@
+import os
+import zlib
+import pytest
+from faq_db import FAQDatabase, SQLiteFAQStore
+from faq_store import tokenize
+
+pytest.importorskip("numpy")
+from semantic_index import SemanticIndex
+
+class FakeEmbed:
+    # Bolsa de palabras en 64 dimensiones: preguntas con las mismas
+    # palabras dan el mismo vector
+    def __init__(self):
+        self.calls = 0
+        self.texts = 0
+        self.fail = False
+
+    def __call__(self, texts):
+        if self.fail:
+            raise ConnectionError("sin conexión")
+        self.calls += 1
+        self.texts += len(texts)
+        vectors = []
+        for text in texts:
+            vector = [0.0] * 64
+            for word in tokenize(text):
+                vector[zlib.crc32(word.encode()) % 64] += 1.0
+            vectors.append(vector)
+        return vectors
+
+ROWS = [
+    ("¿Cuándo abre el registro de admisión?", "En mayo."),
+    ("¿Qué documentos piden para promoción?", "Título y constancia."),
+]
+
+def test_sync_embeds_once_and_search_finds_answer(tmp_path):
+    path = str(tmp_path / "emb")
+    embed = FakeEmbed()
+    index = SemanticIndex(path, embed, "fake")
+    index.sync(ROWS)
+    assert len(index) == 2
+    assert index.find_similar("cuándo abre el registro de la admisión", 0.8) == "En mayo."
+    assert index.find_similar("horario de la oficina", 0.8) is None
+
+    embed = FakeEmbed()
+    reopened = SemanticIndex(path, embed, "fake")
+    reopened.sync(ROWS)
+    assert embed.texts == 0
+    assert reopened.find_similar("qué documentos piden para la promoción", 0.5) == "Título y constancia."
+    assert SemanticIndex(path, embed, "otro-modelo").find_similar("qué documentos piden para la promoción", 0.5) is None
+
+def test_store_changes_reach_the_semantic_index(tmp_path):
+    db_path = str(tmp_path / "faq.db")
+    FAQDatabase(db_path).add_many(ROWS)
+    store = SQLiteFAQStore(db_path, str(tmp_path / "prohibidas.csv"), stat_interval=0)
+    embed = FakeEmbed()
+    index = SemanticIndex(str(tmp_path / "emb"), embed, "fake")
+    store.subscribe(index.add_many)
+    index.sync(store.responses())
+    files = {name: os.path.getsize(tmp_path / name) for name in ("emb.f32", "emb.keys")}
+
+    # Otro proceso corrige una respuesta y agrega una pregunta
+    FAQDatabase(db_path).add_many([
+        ("¿Cuándo abre el registro de admisión?", "En junio."),
+        ("¿Dónde se publican los resultados?", "En la plataforma."),
+    ], replace=True)
+    store.find_similar("nada", 0.6)
+    assert index.find_similar("cuándo abre el registro de la admisión", 0.8) == "En junio."
+    assert index.find_similar("dónde se publican los resultados", 0.8) == "En la plataforma."
+    # Lo nuevo vive en memoria; los archivos solo cambian con sync()
+    assert {name: os.path.getsize(tmp_path / name) for name in files} == files
+
+def test_failed_embeddings_are_retried(tmp_path):
+    embed = FakeEmbed()
+    index = SemanticIndex(str(tmp_path / "emb"), embed, "fake")
+    index.sync(ROWS)
+    embed.fail = True
+    index.add_many([("¿Hay examen de conocimientos?", "Sí.")])
+    assert len(index) == 2
+    embed.fail = False
+    index.add_many([("¿Cuántas etapas tiene el proceso?", "Tres.")])
+    assert len(index) == 4
+    assert index.find_similar("hay examen de conocimientos", 0.8) == "Sí."
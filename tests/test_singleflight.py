@@ -0,0 +1,42 @@
+import threading
+import pytest
+from singleflight import FlightError, SingleFlight
+
+def test_same_question_joins_the_flight_in_progress():
+    flights = SingleFlight()
+    leader, is_leader = flights.join_or_lead("¿Cuándo abre el registro?")
+    follower, is_follower_leader = flights.join_or_lead("cuando abre el REGISTRO")
+    assert is_leader and not is_follower_leader
+    assert follower is leader and leader.followers == 1
+
+    received = []
+    thread = threading.Thread(target=lambda: received.append(follower.result()))
+    thread.start()
+    for token in ("El registro ", "abre ", "en mayo."):
+        leader.publish(token)
+    flights.land(leader)
+    thread.join(5)
+    assert received == ["El registro abre en mayo."]
+    assert len(flights) == 0
+
+def test_similar_question_joins_only_with_threshold():
+    question = "¿Qué documentos pide la convocatoria de admisión?"
+    similar = "¿Qué documentos pide la convocatoria de admisión 2025?"
+    flights = SingleFlight()
+    flights.join_or_lead(question)
+    assert flights.join_or_lead(similar)[1]
+    flights = SingleFlight(similarity_threshold=0.8)
+    first, _ = flights.join_or_lead(question)
+    joined, leader = flights.join_or_lead(similar)
+    assert joined is first and not leader
+
+def test_error_reaches_followers_and_next_question_leads_again():
+    flights = SingleFlight()
+    flight, _ = flights.join_or_lead("hola")
+    follower, _ = flights.join_or_lead("hola")
+    flight.publish("parcial")
+    flights.land(flight, "Error: sin conexión")
+    with pytest.raises(FlightError):
+        follower.result()
+    again, leader = flights.join_or_lead("hola")
+    assert leader and again is not flight
@@ -0,0 +1,22 @@
+import threading
+import sqlite_util
+
+def test_one_connection_per_thread(tmp_path):
+    local = threading.local()
+    path = str(tmp_path / "db.sqlite")
+    conn = sqlite_util.connection(local, path)
+    assert sqlite_util.connection(local, path) is conn
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    other = []
+    thread = threading.Thread(target=lambda: other.append(sqlite_util.connection(local, path)))
+    thread.start()
+    thread.join()
+    assert other[0] is not conn
+
+def test_new_connection_after_fork(tmp_path):
+    local = threading.local()
+    path = str(tmp_path / "db.sqlite")
+    conn = sqlite_util.connection(local, path, pragmas=("recursive_triggers=ON",))
+    assert conn.execute("PRAGMA recursive_triggers").fetchone()[0] == 1
+    local.pid = -1
+    assert sqlite_util.connection(local, path) is not conn